@@ -1,19 +1,21 @@
 import streamlit as st
-from youtube_agent import graph, graph_memory, continue_with_memory, memory
+# graph_memory는 처음 접근할 때 컴파일되므로, 요청이 들어왔을 때만 agent.graph_memory로 꺼내 씁니다.
+import youtube_agent as agent
+from youtube_agent import stream_summary, video_turn, reply_turn
+from ui_stream import StreamingPlaceholder
+from json_stream import JsonStreamError, loads_llm_json
+from instrumentation import span, start_metrics_server
+from resilience import with_deadline
 import uuid
-import json
+
+# METRICS_PORT가 설정되어 있으면 /metrics 서버를 한 번만 띄웁니다. (스크립트가 다시 실행돼도 재사용)
+start_metrics_server()
 
 def _clean_and_parse_json(content: str) -> dict:
     """LLM의 응답에서 마크다운을 제거하고 JSON으로 파싱합니다."""
-    if content.strip().startswith("```json"):
-        start_index = content.find('{')
-        end_index = content.rfind('}')
-        if start_index != -1 and end_index != -1:
-            content = content[start_index : end_index + 1]
-    
     try:
-        return json.loads(content)
-    except json.JSONDecodeError:
+        return loads_llm_json(content)
+    except JsonStreamError:
         # 파싱 실패 시 원본 텍스트나 에러 메시지를 포함한 객체를 반환할 수 있습니다.
         return {"original_content": content}
 
@@ -28,40 +30,41 @@ st.write(f"현재 thread_id: {st.session_state.thread_id}")
 
 st.title("YouTube 요약 에이전트 (스크립트 + 댓글)")
 
+def _stream_to_ui(state: dict, summary_key: str, title: str) -> dict:
+    """
+    graph_memory를 스트리밍으로 실행하며 요약 토큰을 도착하는 대로 화면에 그리고, 최종 상태를 반환합니다.
+    같은 thread_id의 체크포인트에서 이어서 실행하므로, 두 번째 턴은 댓글 분기만 실행됩니다.
+    """
+    view = StreamingPlaceholder(title)
+    final_state = {}
+    # 턴마다 마감 시각(REQUEST_DEADLINE_SECONDS)을 정해 하위 그래프의 LLM 호출까지 넘깁니다.
+    turn_config = with_deadline(config)
+    # 한 턴에서 실행된 노드들을 하나의 트레이스로 묶습니다.
+    with span("youtube_agent.turn", thread_id=config["configurable"]["thread_id"], summary=summary_key):
+        for kind, payload in stream_summary(agent.graph_memory, state, turn_config):
+            if kind == "token":
+                view.append(payload)
+            elif kind == "reset":
+                view.reset()
+            else:
+                final_state = payload
+    summary = final_state.get(summary_key)
+    view.finish(_clean_and_parse_json(summary) if summary else None)
+    return final_state
+
 # 1) URL 입력 받기
 url_input = st.text_input("YouTube 영상 URL을 입력하세요", "")
 
 if url_input:
-    initial_state = {"url": url_input}
-    
     if st.button("스크립트 요약 요청"):
-        with st.spinner("스크립트 요약 중..."):
-            step1_state = graph.invoke(initial_state, config=config)
-            script_summary = _clean_and_parse_json(step1_state.get("script_summary"))
-            if script_summary:
-                st.markdown("### 📄 스크립트 요약 결과")
-                st.json(script_summary)
-            else:
-                st.warning("스크립트 요약 결과가 없습니다.")
-            
-            # memory.set_state(step1_state, config)  # <-- 이 줄 삭제
+        _stream_to_ui(video_turn(url_input), "script_summary", "### 📄 스크립트 요약 결과")
     
     st.markdown("---")
     reply_input = st.text_input("댓글 요약을 원하시면 여기에 답변을 입력하세요 (예: 응, 네, 보여줘 등)")
 
     if reply_input:
-        previous_state = initial_state
-        
-        update_state = {"reply": reply_input, "url": previous_state.get("url")}
-        
         if st.button("댓글 요약 요청"):
-            with st.spinner("댓글 요약 중..."):
-                step2_state = continue_with_memory(graph, initial_state, config, update_state)
-                comment_summary = step2_state.get("comment_summary")
-                if comment_summary:
-                    st.markdown("### 💬 댓글 요약 결과")
-                    st.write(comment_summary)
-                else:
-                    st.warning("댓글 요약 결과가 없습니다.")
-
-print(dir(memory))
+            # 이 thread에서 같은 URL을 이미 요약했다면 URL/영상 ID/댓글은 체크포인트에서 이어받습니다.
+            previous_url = agent.graph_memory.get_state(config).values.get("url")
+            update = reply_turn(reply_input) if previous_url == url_input else reply_turn(reply_input, url_input)
+            _stream_to_ui(update, "comment_summary", "### 💬 댓글 요약 결과")
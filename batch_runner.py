@@ -0,0 +1,198 @@
+"""
+여러 유튜브 URL을 한 번에 요약하는 배치 실행기
+
+URL 목록 파일(한 줄에 하나, '#'으로 시작하는 줄은 무시)을 읽어
+script_agent_05 / comment_agent_05 그래프를 워커 풀에서 병렬로 실행하고,
+끝나는 순서대로 결과를 JSONL 파일에 한 줄씩 기록합니다.
+
+출력 파일이 곧 체크포인트입니다. 같은 출력 파일로 다시 실행하면
+이미 성공한 (URL, 작업) 조합은 건너뛰고 나머지만 이어서 처리합니다.
+
+실행 예시:
+    python batch_runner.py urls.txt -o results.jsonl --tasks script,comment --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+TASKS = {
+    "script": "script_summary",
+    "comment": "comment_summary",
+}
+
+
+# %%
+def read_urls(path: str) -> list:
+    """URL 목록 파일을 읽습니다. 빈 줄/주석/중복은 제외하고 순서는 유지합니다."""
+    urls, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            url = line.strip()
+            if not url or url.startswith("#") or url in seen:
+                continue
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def load_completed(output_path: str) -> set:
+    """
+    기존 출력 파일에서 이미 성공한 (url, task) 조합을 읽습니다.
+    실행 도중 종료되어 마지막 줄이 잘린 경우에도 해당 줄만 무시하고 이어서 진행합니다.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok":
+                completed.add((record["url"], record["task"]))
+    return completed
+
+
+def _ensure_trailing_newline(path: str):
+    """중단으로 마지막 줄이 잘린 파일에 이어 쓸 때, 새 레코드가 잘린 줄에 붙지 않도록 줄바꿈을 보충합니다."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def _load_graph(task: str):
+    if task == "script":
+        from script_agent_05 import graph
+    else:
+        from comment_agent_05 import graph
+    return graph
+
+
+def run_job(graphs: dict, url: str, task: str) -> dict:
+    """(url, task) 하나를 실행하고 JSONL에 기록할 결과 레코드를 반환합니다."""
+    from instrumentation import span
+    from resilience import with_deadline
+
+    started = time.perf_counter()
+    try:
+        with span(f"batch.{task}", url=url):  # 작업 하나의 노드들을 하나의 트레이스로 묶음
+            final_state = graphs[task].invoke({"url": url}, config=with_deadline())
+        error = final_state.get("error")
+        result = final_state.get(TASKS[task], "")
+        status = "error" if error else "ok"
+    except Exception as e:
+        error, result, status = f"ERROR: 그래프 실행 중 오류 발생 - {e}", "", "error"
+    return {
+        "url": url,
+        "task": task,
+        "status": status,
+        "result": result,
+        "error": error or None,
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class ProgressReporter:
+    """완료 건수, 성공/실패, 처리량(videos/s), 남은 시간을 주기적으로 출력합니다."""
+
+    def __init__(self, total: int, interval: float = 5.0):
+        self.total = total
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = 0.0
+        self.done = 0
+        self.ok = 0
+        self.failed = 0
+
+    def update(self, record: dict):
+        self.done += 1
+        if record["status"] == "ok":
+            self.ok += 1
+        else:
+            self.failed += 1
+        now = time.monotonic()
+        if now - self.last_report >= self.interval or self.done == self.total:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else float("inf")
+        print(
+            f"📊 [{self.done}/{self.total}] 성공 {self.ok} · 실패 {self.failed} · "
+            f"{rate:.2f} videos/s · 경과 {elapsed:.0f}s · 남은 시간 {eta:.0f}s",
+            flush=True,
+        )
+
+
+# %%
+def run_batch(urls: list, output_path: str, tasks: list, workers: int, progress_interval: float = 5.0) -> dict:
+    """URL 목록을 워커 풀에서 처리하고, 끝나는 순서대로 output_path에 기록합니다."""
+    completed = load_completed(output_path)
+    jobs = [(url, task) for url in urls for task in tasks if (url, task) not in completed]
+    skipped = len(urls) * len(tasks) - len(jobs)
+    print(f"🚀 작업 {len(jobs)}개 실행 (이미 완료되어 건너뜀: {skipped}개, 워커 {workers}개)")
+    if not jobs:
+        return {"done": 0, "ok": 0, "failed": 0, "skipped": skipped}
+
+    graphs = {task: _load_graph(task) for task in tasks}
+    _ensure_trailing_newline(output_path)
+    progress = ProgressReporter(len(jobs), progress_interval)
+
+    # 결과 기록은 메인 스레드 한 곳에서만 하므로 파일 잠금이 필요 없습니다.
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, graphs, url, task) for url, task in jobs]
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                progress.update(record)
+        except KeyboardInterrupt:
+            print("\n⏹️ 중단 요청을 받았습니다. 진행 중인 작업을 정리합니다. (다시 실행하면 이어서 처리합니다)")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    return {"done": progress.done, "ok": progress.ok, "failed": progress.failed, "skipped": skipped}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url_file", help="URL 목록 파일 (한 줄에 하나)")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="결과 JSONL 파일 (체크포인트 겸용)")
+    parser.add_argument("--tasks", default="script", help="실행할 작업: script, comment (쉼표로 구분)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="동시에 처리할 작업 수")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="진행 상황 출력 간격(초)")
+    parser.add_argument("--metrics-out", help="끝난 뒤 노드별 지표를 Prometheus 텍스트 형식으로 저장할 파일")
+    args = parser.parse_args(argv)
+
+    tasks = [task.strip() for task in args.tasks.split(",") if task.strip()]
+    unknown = [task for task in tasks if task not in TASKS]
+    if unknown:
+        parser.error(f"알 수 없는 작업: {', '.join(unknown)} (사용 가능: {', '.join(TASKS)})")
+
+    urls = read_urls(args.url_file)
+    summary = run_batch(urls, args.output, tasks, args.workers, args.progress_interval)
+    print(f"✅ 배치 완료: {summary}")
+
+    from instrumentation import print_node_report, render_prometheus
+    print_node_report()
+    if args.metrics_out:
+        with open(args.metrics_out, "w", encoding="utf-8") as f:
+            f.write(render_prometheus())
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+콜드 스타트(import 시간) 벤치마크
+
+새 파이썬 프로세스에서 `python -X importtime -c "import <모듈>"`을 여러 번 실행해
+모듈 import에 걸리는 시간(중앙값)을 재고, 기준값(--max-import-ms)을 넘으면 종료 코드 1로 끝납니다.
+오토스케일링으로 Streamlit 워커가 새로 뜰 때 app2.py가 youtube_agent를 import하는 시간에 해당합니다.
+
+--build를 주면 첫 요청에서 그래프(graph_memory)를 컴파일하는 데 걸리는 시간도 함께 측정합니다.
+(기준값 비교는 import 시간만 합니다. 그래프 컴파일은 첫 요청 때 한 번만 일어남)
+
+실행:
+    python benchmarks/bench_cold_start.py --repeat 5 --max-import-ms 150
+    python benchmarks/bench_cold_start.py --module youtube_agent --module comment_agent_05 --top 10 --build
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["youtube_agent"]
+DEFAULT_MAX_IMPORT_MS = 150.0
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+BUILD_SNIPPET = """
+import time
+started = time.perf_counter()
+import youtube_agent
+imported = time.perf_counter()
+youtube_agent.graph_memory
+built = time.perf_counter()
+print(f"{(imported - started) * 1000:.1f} {(built - imported) * 1000:.1f}")
+"""
+
+
+def _env() -> dict:
+    # 체크포인트 DB를 만들지 않도록 메모리 체크포인터를 쓰고, 실제 API 키 없이도 import/컴파일만 측정합니다.
+    env = dict(os.environ, CHECKPOINTER="memory", PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.setdefault("OPENAI_API_KEY", "bench")
+    return env
+
+
+def import_profile(module: str) -> list:
+    """새 프로세스에서 module을 import하고 (모듈 이름, 자체 시간 µs, 누적 시간 µs, 깊이) 목록을 반환합니다."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{module} import 실패:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def bench_import(module: str, repeat: int, top: int) -> float:
+    totals, slowest = [], {}
+    for _ in range(repeat):
+        rows = import_profile(module)
+        # -X importtime은 import가 끝난 순서로 출력하므로 대상 모듈은 마지막 최상위 줄입니다.
+        totals.append(next(cumulative for name, _, cumulative, depth in reversed(rows) if name == module) / 1000)
+        for name, self_us, _, _ in rows:
+            slowest.setdefault(name, []).append(self_us / 1000)
+    median = statistics.median(totals)
+    print(f"{module:<24} import 중앙값 {median:8.1f} ms | 최소 {min(totals):8.1f} ms | 최대 {max(totals):8.1f} ms ({repeat}회)")
+    if top:
+        ranked = sorted(slowest.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:top]
+        for name, samples in ranked:
+            print(f"    {statistics.median(samples):7.1f} ms  {name}")
+    return median
+
+
+def bench_build(repeat: int):
+    imports, builds = [], []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", BUILD_SNIPPET], cwd=ROOT, env=_env(), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"그래프 컴파일 실패:\n{result.stderr[-2000:]}")
+        imported_ms, built_ms = map(float, result.stdout.split()[-2:])
+        imports.append(imported_ms)
+        builds.append(built_ms)
+    print(
+        f"{'첫 요청 그래프 컴파일':<24} 중앙값 {statistics.median(builds):8.1f} ms "
+        f"(import {statistics.median(imports):.1f} ms 이후, {repeat}회)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="측정할 모듈 (여러 번 지정 가능, 기본: youtube_agent)")
+    parser.add_argument("--repeat", type=int, default=5, help="모듈마다 새 프로세스에서 반복할 횟수")
+    parser.add_argument("--max-import-ms", type=float, default=DEFAULT_MAX_IMPORT_MS, help="이 값을 넘으면 실패로 처리")
+    parser.add_argument("--top", type=int, default=0, help="자체 import 시간이 긴 모듈을 이 개수만큼 출력")
+    parser.add_argument("--build", action="store_true", help="첫 요청의 그래프 컴파일 시간도 측정")
+    args = parser.parse_args()
+
+    failed = []
+    for module in args.module or DEFAULT_MODULES:
+        median = bench_import(module, args.repeat, args.top)
+        if median > args.max_import_ms:
+            failed.append((module, median))
+    if args.build:
+        bench_build(args.repeat)
+
+    if failed:
+        for module, median in failed:
+            print(f"\n❌ {module} import {median:.1f} ms > 기준 {args.max_import_ms:g} ms")
+        sys.exit(1)
+    print(f"\n✅ 모든 모듈이 기준({args.max_import_ms:g} ms) 이내입니다.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+중복 댓글 정리(comment_dedup) 벤치마크
+
+인기 영상 댓글과 비슷한 분포(짧은 인사, 타임스탬프, 복붙 도배, 살짝 바꾼 문장, 고유한 댓글)로
+합성 댓글을 만들어 다음을 측정합니다.
+
+1. 토큰 절감: 기본 수집 한도(500개) 댓글을 정리하기 전/후 프롬프트 토큰 수
+2. 처리량: 10만 개 댓글을 정리하는 데 걸리는 시간 (comments/s)
+3. 프롬프트 크기: 댓글 수가 늘어도 중복 정리 + 임베딩 군집 대표 댓글의 토큰 수가 고정되는지
+   (로컬 해싱 임베딩을 사용하므로 API 호출 없음)
+
+실행: python benchmarks/bench_comment_dedup.py --comments 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comment_clustering import HashingEmbeddings, representative_comments  # noqa: E402
+from comment_dedup import cluster_comments, collapse_comments  # noqa: E402
+from token_budget import count_tokens  # noqa: E402
+
+GREETINGS = ["감사합니다!", "감사합니다!!", "감사해요", "최고에요 👍", "좋아요", "Thank you!", "thanks!!!", "구독하고 갑니다"]
+SPAM = [
+    "이 영상 보고 인생이 바뀌었어요 제 채널에도 놀러와 주세요 운동 브이로그 올립니다",
+    "지금 무료로 PT 상담 받아보세요 프로필 링크 확인해 주세요 선착순 100명 한정",
+]
+OPINIONS = [
+    "스쿼트 할 때 무릎이 아팠는데 알려주신 대로 하니까 훨씬 편해졌어요",
+    "매일 따라하고 있는데 한 달 만에 체력이 확실히 좋아졌습니다",
+    "초보자도 따라하기 쉽게 설명해 주셔서 너무 좋아요 다음 영상도 기대할게요",
+    "하체 운동 루틴 영상도 만들어 주시면 좋겠어요 부탁드립니다",
+    "허리가 안 좋은 사람도 해도 되는 동작인지 궁금합니다",
+]
+VARIATIONS = ["", "!", "!!", " ㅎㅎ", " ㅠㅠ", " 👍", " 진짜", "~"]
+WORDS = "운동 루틴 스쿼트 런지 플랭크 어깨 허리 무릎 하체 상체 코어 자세 호흡 반복 세트 휴식 강도 초보 중급 다이어트".split()
+
+
+def synthetic_comments(n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    comments = []
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.25:
+            comments.append(rng.choice(GREETINGS))
+        elif r < 0.35:
+            comments.append(f"{rng.randint(0, 12)}:{rng.randint(0, 59):02d} {rng.choice(['여기 레전드', '여기부터 보세요', ''])}".strip())
+        elif r < 0.45:
+            comments.append(rng.choice(SPAM))
+        elif r < 0.70:
+            comments.append(rng.choice(OPINIONS) + rng.choice(VARIATIONS))
+        else:
+            # 고유한 댓글 (묶이면 안 되는 댓글)
+            comments.append(" ".join(rng.choices(WORDS, k=rng.randint(6, 14))) + f" {rng.randint(0, 10**6)}")
+    return comments
+
+
+def bench_tokens(n: int):
+    comments = synthetic_comments(n, seed=7)
+    before = "\n- ".join(comments)
+    collapsed = collapse_comments(comments)
+    after = "\n- ".join(collapsed)
+    before_tokens, after_tokens = count_tokens(before), count_tokens(after)
+    print(
+        f"[토큰] 댓글 {len(comments)}개 -> {len(collapsed)}줄 | "
+        f"프롬프트 토큰 {before_tokens:,} -> {after_tokens:,} "
+        f"({(1 - after_tokens / before_tokens) * 100:.1f}% 절감)"
+    )
+
+
+def bench_throughput(n: int, repeat: int):
+    comments = synthetic_comments(n)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        clusters = cluster_comments(comments)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(
+        f"[처리량] 댓글 {n:,}개 -> 묶음 {len(clusters):,}개 | "
+        f"최소 {best:.2f}s ({n / best:,.0f} comments/s, {repeat}회 중 최소)"
+    )
+
+
+def bench_prompt_size(sizes):
+    embeddings = HashingEmbeddings()
+    for n in sizes:
+        comments = synthetic_comments(n, seed=n)
+        clusters = cluster_comments(comments)
+        started = time.perf_counter()
+        lines = representative_comments([c["text"] for c in clusters], [c["count"] for c in clusters], embeddings)
+        elapsed = time.perf_counter() - started
+        print(
+            f"[프롬프트] 댓글 {n:>6,}개 | 원본 {count_tokens(chr(10).join(comments)):>9,} 토큰 -> "
+            f"대표 {len(lines)}줄 {count_tokens(chr(10).join(lines)):>6,} 토큰 (군집화 {elapsed:.2f}s)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=100_000, help="처리량 측정에 쓸 댓글 수")
+    parser.add_argument("--prompt-comments", type=int, default=500, help="토큰 절감 측정에 쓸 댓글 수 (기본 수집 한도)")
+    parser.add_argument("--repeat", type=int, default=3, help="처리량 측정 반복 횟수")
+    parser.add_argument("--prompt-sizes", default="1000,5000,20000", help="프롬프트 크기를 측정할 댓글 수 (쉼표로 구분)")
+    args = parser.parse_args()
+
+    bench_tokens(args.prompt_comments)
+    bench_throughput(args.comments, args.repeat)
+    bench_prompt_size([int(n) for n in args.prompt_sizes.split(",") if n.strip()])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+그래프 처리량/지연 벤치마크 (오프라인)
+
+가짜 채팅 모델(지연/생성 속도 분포 설정 가능)과 가짜 YouTube 자막/댓글 백엔드를 끼워 넣고
+아래 그래프들을 동시 실행 수(concurrency)를 바꿔 가며 돌립니다.
+
+    script      script_agent_05.graph            (자막 -> 스크립트 요약)
+    comment     comment_agent_05.graph           (댓글 수집 -> 긍정 비율 -> 댓글 요약)
+    agent       youtube_agent 그래프 + 메모리 체크포인터 (URL 턴 -> "응" 답변 턴, 영상 1개 = 2턴)
+    tool_agent  etc_file/comment_analysis.graph  (도구 호출 에이전트)
+
+영상마다 처음 보는 ID를 쓰고 캐시는 임시 폴더를 쓰므로 캐시 적중 없이 매번 전체 경로를 실행합니다.
+출력: 그래프/동시 실행 수별 종단 간 p50/p95/p99, 초당 처리 영상 수, 오류 수, 노드별 p50/p95.
+
+실행:
+    python benchmarks/bench_graphs.py --videos 32 --concurrency 1,4,16
+    python benchmarks/bench_graphs.py --graph agent --time-scale 0.1 --ttft-ms 800 --ttft-sigma 1.0
+
+인기 영상처럼 같은 URL이 동시에 들어오는 경우(single_flight.py로 합쳐지는 호출 수) 확인:
+    python benchmarks/bench_graphs.py --graph script --graph comment --videos 32 --duplicates 8 --concurrency 16
+
+작은 모델 먼저 -> 검증 실패 시 큰 모델(model_cascade.py) 승격률과 절약한 비용/지연 확인:
+    python benchmarks/bench_graphs.py --graph script --graph comment --small-model-speedup 2 --small-invalid-rate 0.15
+
+복원력 계층(resilience.py) 확인: 가짜 LLM에 지연 꼬리/일시적 오류를 섞고, 켠 경우와 끈 경우를 나란히 비교합니다.
+    python benchmarks/bench_graphs.py --graph script --spike-rate 0.05 --spike-ms 8000 --error-rate 0.1 --compare-resilience
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import replace
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "etc_file"))
+
+GRAPHS = ["script", "comment", "agent", "tool_agent"]
+
+
+# %%
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _node_name(metadata: dict) -> str:
+    """하위 그래프의 노드는 "상위 노드/노드"로 표시합니다. (checkpoint_ns: "summarize_script:<id>|get_youtube_transcript:<id>")"""
+    namespace = metadata.get("langgraph_checkpoint_ns") or metadata.get("checkpoint_ns") or ""
+    parts = [part.split(":")[0] for part in namespace.split("|") if part]
+    return "/".join(parts) or metadata["langgraph_node"]
+
+
+def make_node_timer():
+    """노드(LangGraph 노드 실행 단위)별 실행 시간을 모으는 콜백 핸들러를 만듭니다."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class NodeTimer(BaseCallbackHandler):
+        def __init__(self):
+            self.samples = defaultdict(list)
+            self._started = {}
+            self._lock = threading.Lock()
+
+        def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs):
+            metadata = metadata or {}
+            if name is None or name != metadata.get("langgraph_node") or name.startswith("__"):
+                return
+            node = _node_name(metadata)
+            # RunnableLambda(name=노드 이름)로 감싼 노드는 같은 이름의 실행이 한 겹 더 있으므로 바깥쪽만 잽니다.
+            parent = self._started.get(parent_run_id)
+            if parent is None or parent[0] != node:
+                self._started[run_id] = (node, time.perf_counter())
+
+        def _finish(self, run_id):
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                with self._lock:
+                    self.samples[started[0]].append(time.perf_counter() - started[1])
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            self._finish(run_id)
+
+        def on_chain_error(self, error, *, run_id, **kwargs):
+            self._finish(run_id)
+
+    return NodeTimer()
+
+
+# %%
+def _load_workloads():
+    """그래프 이름 -> 영상 하나를 처리하는 함수(url, config) -> 오류 여부."""
+    import script_agent_05
+    import comment_agent_05
+    import youtube_agent
+    from langchain_core.messages import HumanMessage
+
+    def run_script(url, config):
+        return bool(script_agent_05.graph.invoke({"url": url}, config=config).get("error"))
+
+    def run_comment(url, config):
+        return bool(comment_agent_05.graph.invoke({"url": url}, config=config).get("error"))
+
+    def run_agent(url, config):
+        graph = youtube_agent.graph_memory
+        # 같은 영상을 여러 세션이 요청하는 경우(--duplicates)에도 세션마다 thread는 따로 씁니다.
+        config = dict(config, configurable={**config.get("configurable", {}), "thread_id": f"{url}#{uuid.uuid4().hex}"})
+        first = graph.invoke(youtube_agent.video_turn(url), config=config)
+        final = youtube_agent.resume_turn(graph, config, youtube_agent.reply_turn("응"))
+        return not (first.get("script_summary") and final.get("comment_summary"))
+
+    def run_tool_agent(url, config):
+        import comment_analysis
+        state = {"messages": [HumanMessage(content=f"{url} 이거 댓글 리포트 만들어줘")]}
+        messages = comment_analysis.graph.invoke(state, config=config)["messages"]
+        return any('"error"' in str(getattr(message, "content", "")) for message in messages)
+
+    return {"script": run_script, "comment": run_comment, "agent": run_agent, "tool_agent": run_tool_agent}
+
+
+def _resilience_line() -> str:
+    from instrumentation import metrics
+
+    return (
+        f"    복원력: 시도 {metrics.total('llm_attempts_total'):.0f} | 재시도 {metrics.total('llm_retries_total'):.0f} | "
+        f"헤지 {metrics.total('llm_hedges_total'):.0f} (헤지 승 {metrics.total('llm_hedges_total', winner='hedge'):.0f}) | "
+        f"서킷 열림 {metrics.total('llm_circuit_opened_total'):.0f} / 거절 {metrics.total('llm_circuit_rejections_total'):.0f} | "
+        f"마감 초과 {metrics.total('deadline_exceeded_total'):.0f}"
+    )
+
+
+def _single_flight_line() -> str:
+    from instrumentation import metrics
+
+    ops = ["transcript", "comments", "script_summary", "comment_summary"]
+    shared = " | ".join(
+        f"{op} {metrics.total('single_flight_shared_total', op=op):.0f}/{metrics.total('single_flight_leaders_total', op=op):.0f}"
+        for op in ops
+    )
+    return f"    합친 호출(합류/직접 실행): {shared}"
+
+
+def _cascade_lines() -> list:
+    from model_cascade import cascade_stats, model_cascade
+
+    if len(model_cascade.models) < 2:
+        return []
+    lines = []
+    for namespace in ("script", "comment"):
+        stats = cascade_stats(namespace)
+        if not stats["requests"]:
+            continue
+        saved = stats["cost_saved_usd"] / stats["baseline_cost_usd"] if stats["baseline_cost_usd"] else 0.0
+        latency = stats["latency_saved_seconds"]
+        latency_text = "표본 없음" if latency is None else f"{latency / stats['requests'] * 1000:.0f} ms/요청"
+        lines.append(
+            f"    모델 단계({namespace}): 승격 {stats['escalations']:.0f}/{stats['requests']:.0f} ({stats['escalation_rate']:.0%}) | "
+            f"추정 비용 ${stats['cost_usd']:.4f} / 큰 모델만 ${stats['baseline_cost_usd']:.4f} (절약 {saved:.0%}) | "
+            f"지연 절약 {latency_text}"
+        )
+    return lines
+
+
+def bench(
+    name: str, workload, concurrency: int, n_videos: int, run_no: int, show_nodes: bool,
+    deadline: float = 0.0, duplicates: int = 1,
+) -> list:
+    """
+    요청 n_videos개를 concurrency개씩 동시에 처리하고 결과 표의 줄 목록을 반환합니다.
+    duplicates > 1이면 연속된 요청 duplicates개가 같은 영상을 요청합니다. (인기 영상에 요청이 몰리는 경우)
+    """
+    from resilience import with_deadline
+
+    timer = make_node_timer()
+    config = {"callbacks": [timer]}
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(i: int):
+        nonlocal errors
+        url = f"https://www.youtube.com/watch?v=b{run_no:02d}{i // duplicates:08d}"
+        started = time.perf_counter()
+        try:
+            failed = workload(url, with_deadline(config, deadline))
+        except Exception as e:
+            print(f"🚨 {name} 실행 실패: {type(e).__name__} {e}", file=sys.stderr)
+            failed = True
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            errors += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(n_videos)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    lines = [
+        f"{name:<11} 동시 {concurrency:>3} | p50 {_percentile(latencies, 0.50) * 1000:8.1f} ms | "
+        f"p95 {_percentile(latencies, 0.95) * 1000:8.1f} ms | p99 {_percentile(latencies, 0.99) * 1000:8.1f} ms | "
+        f"{n_videos / wall:7.2f} 영상/s | 오류 {errors}/{n_videos}",
+        _resilience_line(),
+        *_cascade_lines(),
+    ]
+    if duplicates > 1:
+        lines.append(_single_flight_line())
+    if show_nodes:
+        for node, samples in sorted(timer.samples.items()):
+            samples.sort()
+            lines.append(
+                f"    {node:<48} {len(samples):>5}회 | p50 {_percentile(samples, 0.50) * 1000:8.1f} ms | "
+                f"p95 {_percentile(samples, 0.95) * 1000:8.1f} ms"
+            )
+    return lines
+
+
+# %%
+def _configure(args):
+    """모듈을 import하기 전에 캐시 경로/임베딩/체크포인터를 벤치마크용으로 바꾸고 가짜 백엔드를 끼워 넣습니다."""
+    cache_dir = tempfile.mkdtemp(prefix="bench_graphs_")
+    os.environ["TRANSCRIPT_CACHE_DIR"] = os.path.join(cache_dir, "transcripts")
+    os.environ["SUMMARY_CACHE_PATH"] = os.path.join(cache_dir, "summaries.sqlite3")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(cache_dir, "embeddings.sqlite3")
+    os.environ["COMMENT_EMBEDDER"] = "local"
+    os.environ["CHECKPOINTER"] = "memory"
+    # 기본 RPM/TPM 한도에서는 대기 시간이 결과를 좌우하므로, --rate-limit을 주지 않으면 제한기를 끕니다.
+    os.environ["RATE_LIMIT"] = "1" if args.rate_limit else "0"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("YOUTUBE_API_KEY", "bench")
+
+    from fakes import (
+        LatencyProfile, YouTubeBackendProfile,
+        fake_chat_model_factory, fake_transcript_fetcher, fake_youtube_client_factory,
+    )
+    from llm_factory import set_chat_model_factory
+    from transcript_cache import set_transcript_fetcher
+    from youtube_client import set_youtube_client_factory
+
+    llm_profile = LatencyProfile(
+        ttft_ms=args.ttft_ms, ttft_sigma=args.ttft_sigma,
+        tokens_per_second=args.tokens_per_second, rate_sigma=args.rate_sigma, time_scale=args.time_scale,
+        spike_rate=args.spike_rate, spike_ms=args.spike_ms, error_rate=args.error_rate,
+    )
+    # 모델 단계의 첫(작은) 모델은 첫 토큰 지연이 짧고 생성이 빠르지만, 가끔 형식을 지키지 못합니다.
+    from model_cascade import model_cascade
+    small_profile = replace(
+        llm_profile, ttft_ms=args.ttft_ms / args.small_model_speedup,
+        tokens_per_second=args.tokens_per_second * args.small_model_speedup,
+    )
+    small_models = model_cascade.tiers[:-1]
+    backend_profile = YouTubeBackendProfile(
+        comment_pages=args.comment_pages, page_ms=args.page_ms,
+        transcript_segments=args.transcript_segments, transcript_ms=args.transcript_ms,
+        time_scale=args.time_scale, seed=args.seed,
+    )
+    set_chat_model_factory(fake_chat_model_factory(
+        llm_profile, seed=args.seed,
+        model_profiles={model: small_profile for model in small_models},
+        invalid_rates={model: args.small_invalid_rate for model in small_models},
+    ))
+    set_youtube_client_factory(fake_youtube_client_factory(backend_profile))
+    set_transcript_fetcher(fake_transcript_fetcher(backend_profile))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", action="append", choices=GRAPHS, help="측정할 그래프 (여러 번 지정 가능, 기본: 전부)")
+    parser.add_argument("--videos", type=int, default=32, help="동시 실행 수마다 처리할 영상 수")
+    parser.add_argument("--concurrency", default="1,4,16", help="쉼표로 구분한 동시 실행 수 목록")
+    parser.add_argument("--ttft-ms", type=float, default=400.0, help="LLM 첫 토큰 지연 중앙값")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5, help="첫 토큰 지연의 로그정규 sigma (클수록 꼬리가 김)")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="LLM 생성 속도 중앙값")
+    parser.add_argument("--rate-sigma", type=float, default=0.3, help="생성 속도의 로그정규 sigma")
+    parser.add_argument("--duplicates", type=int, default=1, help="같은 영상을 동시에 요청하는 세션 수 (요청 수는 --videos 그대로)")
+    parser.add_argument("--spike-rate", type=float, default=0.0, help="LLM 호출이 spike-ms만큼 더 늦어질 확률 (지연 꼬리)")
+    parser.add_argument("--spike-ms", type=float, default=5000.0, help="지연 꼬리에 더할 시간")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="LLM 호출이 일시적 오류로 실패할 확률")
+    parser.add_argument("--deadline", type=float, default=0.0, help="영상 하나(요청 하나)의 마감 시간(초, 0이면 없음)")
+    parser.add_argument("--compare-resilience", action="store_true", help="복원력 계층을 끈 경우와 켠 경우를 둘 다 측정")
+    parser.add_argument("--small-model-speedup", type=float, default=2.0, help="작은 모델이 큰 모델보다 빠른 배율 (첫 토큰 지연/생성 속도)")
+    parser.add_argument("--small-invalid-rate", type=float, default=0.0, help="작은 모델이 JSON 필수 키를 빠뜨릴 확률")
+    parser.add_argument("--comment-pages", type=int, default=3, help="영상당 댓글 페이지 수 (페이지당 최대 100개)")
+    parser.add_argument("--page-ms", type=float, default=150.0, help="댓글 페이지 응답 지연 중앙값")
+    parser.add_argument("--transcript-segments", type=int, default=200, help="영상당 자막 조각 수")
+    parser.add_argument("--transcript-ms", type=float, default=400.0, help="자막 응답 지연 중앙값")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="모든 가짜 지연에 곱할 배율 (빠른 확인용: 0.1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate-limit", action="store_true", help="rate_limiter의 RPM/TPM/할당량 제한을 켠 채로 측정")
+    parser.add_argument("--no-nodes", action="store_true", help="노드별 지연 표를 출력하지 않음")
+    parser.add_argument("--verbose", action="store_true", help="그래프 노드의 진행 로그(print)를 그대로 출력")
+    args = parser.parse_args()
+
+    _configure(args)
+    workloads = _load_workloads()
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    import resilience
+    from instrumentation import metrics
+
+    modes = [("끔", False), ("켬", True)] if args.compare_resilience else [(None, resilience.policy.enabled)]
+    run_no = 0
+    for name in args.graph or GRAPHS:
+        for concurrency, (mode, enabled) in ((c, m) for c in levels for m in modes):
+            run_no += 1
+            # 실행마다 지연 표본/서킷 상태/지표를 비워 서로 영향을 주지 않게 합니다.
+            resilience.set_policy(resilience.ResiliencePolicy(enabled=enabled))
+            metrics.reset()
+            # 노드의 진행 로그(print)는 결과 표를 가리므로 --verbose가 아니면 버립니다.
+            stdout = sys.stdout
+            with open(os.devnull, "w") as devnull:
+                if not args.verbose:
+                    sys.stdout = devnull
+                try:
+                    lines = bench(name, workloads[name], concurrency, args.videos, run_no, not args.no_nodes, args.deadline, args.duplicates)
+                finally:
+                    sys.stdout = stdout
+            if mode is not None:
+                lines[0] += f" | 복원력 {mode}"
+            print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+YouTube Data API 클라이언트 재사용 마이크로 벤치마크
+
+로컬 HTTP 서버(keep-alive 지원)를 YouTube API 대신 띄워 놓고,
+요청마다 build()를 호출하던 기존 방식과 youtube_client 풀을 쓰는 방식의
+요청당 오버헤드를 비교합니다. 실제 API 할당량은 사용하지 않습니다.
+
+실행: python benchmarks/bench_youtube_client.py --requests 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from youtube_client import YouTubeClientPool  # noqa: E402
+
+RESPONSE_BODY = json.dumps({
+    "items": [
+        {"snippet": {"topLevelComment": {"snippet": {"textDisplay": f"댓글 {i}"}}}}
+        for i in range(100)
+    ]
+}).encode("utf-8")
+
+
+class FakeYouTubeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive 연결 유지
+    disable_nagle_algorithm = True  # 헤더/본문 분할 전송 시 지연(ACK 대기)이 측정에 섞이지 않도록
+    connections = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label, get_client, n_requests):
+    FakeYouTubeHandler.connections = set()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        youtube = get_client()
+        youtube.commentThreads().list(
+            part="snippet", videoId="sLe6jgHoYtk", maxResults=100, order="relevance"
+        ).execute()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(
+        f"{label:<28} 평균 {statistics.mean(latencies):7.2f} ms | "
+        f"p50 {latencies[len(latencies) // 2]:7.2f} ms | "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1]:7.2f} ms | "
+        f"{n_requests / elapsed:8.1f} req/s | TCP 연결 {len(FakeYouTubeHandler.connections)}개"
+    )
+    return statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="측정할 요청 수")
+    args = parser.parse_args()
+
+    import googleapiclient.discovery
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeYouTubeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    def build_every_time():
+        # 기존 방식: 호출할 때마다 디스커버리 문서 파싱 + 새 HTTP 연결
+        return googleapiclient.discovery.build(
+            "youtube", "v3", developerKey="bench", client_options={"api_endpoint": endpoint}
+        )
+
+    pool = YouTubeClientPool()
+
+    def pooled():
+        return pool.get(api_key="bench", api_endpoint=endpoint)
+
+    try:
+        before = run("build() per request", build_every_time, args.requests)
+        after = run("YouTubeClientPool", pooled, args.requests)
+        print(f"\n요청당 오버헤드 감소: {before - after:.2f} ms ({before / after:.1f}x), 풀 통계: {pool.stats()}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
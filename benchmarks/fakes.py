@@ -0,0 +1,374 @@
+"""
+벤치마크용 가짜 백엔드 (실제 OpenAI / YouTube 호출 없이 그래프 전체를 실행)
+
+- FakeChatModel: 첫 토큰 지연(TTFT)과 초당 토큰 수를 분포에서 뽑아 그만큼 기다린 뒤,
+  프롬프트 종류(스크립트 요약 / 구간 메모 / 댓글 요약 / 도구 호출)에 맞는 응답을 토큰 단위로 내보냅니다.
+  spike_rate / error_rate를 주면 가끔 긴 지연(꼬리)이나 일시적 오류(FakeAPITimeoutError)를 섞습니다.
+  invalid_rate를 주면 그 확률로 JSON 요약에서 필수 키 하나를 빼서 돌려줍니다. (model_cascade 승격 확인용)
+- FakeYouTubeClient: commentThreads().list(...).execute()를 흉내 내며 페이지마다 지연을 줍니다.
+- fake_transcript_fetcher: transcript_cache.set_transcript_fetcher에 넘길 자막 함수를 만듭니다.
+
+지연은 seed와 입력으로 정해지는 난수에서 뽑으므로, 같은 설정이면 실행할 때마다 같은 결과가 나옵니다.
+(지연 꼬리/오류는 같은 프롬프트를 몇 번째 보냈는지도 함께 써서, 다시 보낸 요청은 다른 결과를 뽑습니다)
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+CHARS_PER_TOKEN = 3  # 한국어 위주 응답의 대략적인 글자/토큰 비율
+_URL_RE = re.compile(r"https?://\S+")
+
+
+# %%
+@dataclass(frozen=True)
+class LatencyProfile:
+    """
+    지연 분포 설정입니다. (모든 시간은 time_scale을 곱해 적용)
+
+    - 첫 토큰 지연: 중앙값 ttft_ms, 로그정규분포 (ttft_sigma가 클수록 꼬리가 김)
+    - 생성 속도: 중앙값 tokens_per_second, 로그정규분포 (rate_sigma)
+    - 지연 꼬리: spike_rate 확률로 첫 토큰 지연에 spike_ms를 더함
+    - 일시적 오류: error_rate 확률로 첫 토큰 전이나 스트림 도중에 FakeAPITimeoutError 발생
+    """
+    ttft_ms: float = 400.0
+    ttft_sigma: float = 0.5
+    tokens_per_second: float = 60.0
+    rate_sigma: float = 0.3
+    time_scale: float = 1.0
+    spike_rate: float = 0.0
+    spike_ms: float = 5000.0
+    error_rate: float = 0.0
+
+    def sample(self, rng: random.Random) -> tuple:
+        """(첫 토큰까지 기다릴 초, 토큰 하나당 기다릴 초)를 뽑습니다."""
+        ttft = self.ttft_ms / 1000 * rng.lognormvariate(0, self.ttft_sigma)
+        rate = self.tokens_per_second * rng.lognormvariate(0, self.rate_sigma)
+        return ttft * self.time_scale, self.time_scale / max(rate, 1e-6)
+
+    def faults(self, rng: random.Random) -> tuple:
+        """(첫 토큰 지연에 더할 초, 오류를 낼 위치(응답 길이 대비 0~1) 또는 None)을 뽑습니다."""
+        spike = self.spike_ms / 1000 * self.time_scale if rng.random() < self.spike_rate else 0.0
+        error_at = rng.choice([0.0, rng.random()]) if rng.random() < self.error_rate else None
+        return spike, error_at
+
+
+class FakeAPITimeoutError(TimeoutError):
+    """openai.APITimeoutError 대신 내는 일시적 오류입니다. (resilience.is_transient가 재시도 대상으로 봄)"""
+
+
+_sent: dict = {}  # (모델, 프롬프트) -> 보낸 횟수
+_sent_lock = threading.Lock()
+
+
+def _send_no(model: str, text: str) -> int:
+    with _sent_lock:
+        key = (model, hashlib.sha256(text.encode("utf-8")).hexdigest())
+        _sent[key] = _sent.get(key, 0) + 1
+        return _sent[key]
+
+
+def _rng(seed: int, *parts: Any) -> random.Random:
+    digest = hashlib.sha256(repr((seed,) + parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _sleep_lognormal(rng: random.Random, median_ms: float, sigma: float, time_scale: float):
+    time.sleep(median_ms / 1000 * rng.lognormvariate(0, sigma) * time_scale)
+
+
+# %%
+# 프롬프트 종류별 응답
+def _script_summary(rng: random.Random) -> str:
+    moves = ["스쿼트", "런지", "플랭크", "브릿지", "버드독", "마운틴 클라이머", "캣카우", "사이드 플랭크"]
+    routine = [f"{i}. 💪 {move} - 천천히 호흡하며 {rng.randint(10, 20)}회 반복" for i, move in enumerate(rng.sample(moves, 4), 1)]
+    return json.dumps({
+        "요약": "하체와 코어를 함께 단련하는 전신 루틴입니다.\n초보자도 따라 하기 쉽게 동작마다 자세 포인트를 설명합니다.",
+        "운동 강도": rng.choice(["초급자용", "모든 레벨", "중급자용"]),
+        "운동 루틴": routine,
+        "자극 신체 부위": "허벅지, 엉덩이, 복부, 허리",
+        "질문": "영상에 대한 댓글 반응도 궁금하시다면 알려드릴게요!",
+    }, ensure_ascii=False, indent=2)
+
+
+def _map_note(rng: random.Random) -> str:
+    return (
+        "- 핵심: 준비 운동 후 하체 위주 동작을 이어서 진행합니다.\n"
+        f"- 동작: 스쿼트 - 무릎이 발끝을 넘지 않게, 런지 - {rng.randint(8, 15)}회씩 번갈아\n"
+        "- 강도: 초급~중급\n"
+        "- 부위: 허벅지, 엉덩이"
+    )
+
+
+def _comment_summary(rng: random.Random) -> str:
+    return json.dumps({
+        "overall_sentiment": {"description": "📝 따라 하기 쉽고 효과가 좋다는 반응이 많음"},
+        "key_topics": ["🏷️ 하체 운동", rng.choice(["🏷️ 자세 교정", "🏷️ 꾸준함"])],
+        "user_tips": ["💡 처음엔 횟수를 줄여서 시작", "💡 매트 위에서 하면 무릎 부담이 적음"],
+        "faq": ["❓ 매일 해도 되나요?", "❓ 몇 주면 효과가 있나요?"],
+    }, ensure_ascii=False, indent=2)
+
+
+def _drop_key(content: str, rng: random.Random) -> str:
+    """JSON 요약에서 키 하나를 뺍니다. (작은 모델이 형식을 지키지 못한 응답 흉내)"""
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        return content
+    parsed.pop(rng.choice(list(parsed)[:4]))
+    return json.dumps(parsed, ensure_ascii=False, indent=2)
+
+
+def _text_of(messages: Sequence[BaseMessage]) -> str:
+    return "\n".join(message.content for message in messages if isinstance(message.content, str))
+
+
+def fake_response(messages: Sequence[BaseMessage], rng: random.Random) -> str:
+    """프롬프트 내용을 보고 그래프가 기대하는 형식의 응답을 만듭니다."""
+    text = _text_of(messages)
+    if "[스크립트 구간" in text:
+        return _map_note(rng)
+    if "overall_sentiment" in text:
+        return _comment_summary(rng)
+    if "운동 루틴" in text:
+        return _script_summary(rng)
+    return "요청하신 댓글 리포트를 정리했습니다."
+
+
+def fake_tool_call(messages: Sequence[BaseMessage], tool_names: List[str]) -> Optional[dict]:
+    """
+    도구가 바인딩된 호출이면 다음에 부를 도구를 정합니다. (etc_file/comment_analysis.py의 도구 순서를 따름)
+    더 부를 도구가 없으면 None을 반환합니다. (최종 답변)
+    """
+    if "Route" in tool_names:  # with_structured_output(Route) - 라우터
+        return {"name": "Route", "args": {"target": "summarize_comment"}}
+    last = messages[-1]
+    if not isinstance(last, ToolMessage):
+        match = _URL_RE.search(_text_of(messages))
+        return {"name": "get_youtube_comments_for_url", "args": {"youtube_url": match.group() if match else ""}}
+    if last.name == "get_youtube_comments_for_url" and "generate_initial_summary_report" in tool_names:
+        try:
+            result = json.loads(last.content)
+        except (TypeError, ValueError):
+            return None
+        if "comments" not in result:
+            return None
+        return {"name": "generate_initial_summary_report", "args": {"comments": result["comments"], "video_id": result["video_id"]}}
+    return None
+
+
+# %%
+class FakeChatModel(BaseChatModel):
+    """지연 분포를 따르는 가짜 채팅 모델입니다. llm_factory.set_chat_model_factory로 끼워 넣습니다."""
+
+    model_name: str = "fake"
+    profile: LatencyProfile = LatencyProfile()
+    seed: int = 0
+    streaming: bool = False
+    invalid_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _plan(self, messages: List[BaseMessage], tools: Optional[list]) -> tuple:
+        """(응답 텍스트, 도구 호출 또는 None, 첫 토큰 지연, 토큰당 지연, 오류를 낼 토큰 위치 또는 None)을 정합니다."""
+        text = _text_of(messages)
+        rng = _rng(self.seed, self.model_name, text, len(messages))
+        ttft, per_token = self.profile.sample(rng)
+        fault_rng = _rng(self.seed, "fault", self.model_name, text, _send_no(self.model_name, text))
+        spike, error_at = self.profile.faults(fault_rng)
+        ttft += spike
+        tool_call = fake_tool_call(messages, [tool["function"]["name"] for tool in tools]) if tools else None
+        if tool_call is not None:
+            tool_call = dict(tool_call, id=f"call_{rng.getrandbits(48):012x}")
+            return "", tool_call, ttft, per_token, None if error_at is None else 0
+        content = fake_response(messages, rng)
+        if fault_rng.random() < self.invalid_rate:
+            content = _drop_key(content, fault_rng)
+        n_tokens = -(-len(content) // CHARS_PER_TOKEN)
+        return content, None, ttft, per_token, None if error_at is None else int(error_at * n_tokens)
+
+    @staticmethod
+    def _fail(position: int):
+        raise FakeAPITimeoutError(f"가짜 일시적 오류 ({position}번째 토큰)")
+
+    @staticmethod
+    def _tokens(content: str) -> Iterator[str]:
+        for i in range(0, len(content), CHARS_PER_TOKEN):
+            yield content[i:i + CHARS_PER_TOKEN]
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        content, tool_call, ttft, per_token, error_at = self._plan(messages, tools)
+        n_tokens = max(1, -(-len(content) // CHARS_PER_TOKEN))
+        if error_at is not None:
+            time.sleep(ttft + per_token * error_at)
+            self._fail(error_at)
+        time.sleep(ttft + per_token * n_tokens)
+        message = AIMessage(content=content, tool_calls=[tool_call] if tool_call else [])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        content, tool_call, ttft, per_token, error_at = self._plan(messages, tools)
+        time.sleep(ttft)
+        if error_at == 0:
+            self._fail(0)
+        if tool_call is not None:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": tool_call["name"], "args": json.dumps(tool_call["args"], ensure_ascii=False),
+                "id": tool_call["id"], "index": 0,
+            }]))
+            return
+        for position, token in enumerate(self._tokens(content)):
+            if position == error_at:
+                self._fail(position)
+            time.sleep(per_token)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        content, tool_call, ttft, per_token, error_at = self._plan(messages, tools)
+        await asyncio.sleep(ttft)
+        if error_at == 0:
+            self._fail(0)
+        if tool_call is not None:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": tool_call["name"], "args": json.dumps(tool_call["args"], ensure_ascii=False),
+                "id": tool_call["id"], "index": 0,
+            }]))
+            return
+        for position, token in enumerate(self._tokens(content)):
+            if position == error_at:
+                self._fail(position)
+            await asyncio.sleep(per_token)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def fake_chat_model_factory(
+    profile: LatencyProfile, seed: int = 0,
+    model_profiles: Optional[dict] = None, invalid_rates: Optional[dict] = None,
+):
+    """
+    llm_factory.set_chat_model_factory에 넘길 함수를 만듭니다.
+    model_profiles / invalid_rates로 모델별 지연 분포와 형식 오류 확률을 따로 줄 수 있습니다. (예: 작은 모델은 빠르지만 가끔 키를 빠뜨림)
+    """
+    def factory(model: str, **kwargs):
+        return FakeChatModel(
+            model_name=model, profile=(model_profiles or {}).get(model, profile), seed=seed,
+            streaming=kwargs.get("streaming", False), invalid_rate=(invalid_rates or {}).get(model, 0.0),
+        )
+    return factory
+
+
+# %%
+_COMMENT_TEMPLATES = [
+    "진짜 따라 하기 쉬워요 최고",
+    "이 루틴 매일 하고 있어요! 효과 좋아요",
+    "무릎이 좀 아픈데 괜찮을까요?",
+    "초보자한테 딱이네요 감사합니다",
+    "{n}주째 하는 중인데 허벅지가 단단해졌어요",
+    "자세 설명이 너무 좋아요",
+    "조금 힘들어서 별로였어요",
+    "3:25 이 동작 어떻게 하는 건가요?",
+    "This routine is great, thanks!",
+    "오늘도 완료 ✅",
+]
+
+
+@dataclass(frozen=True)
+class YouTubeBackendProfile:
+    """가짜 YouTube 백엔드 설정입니다. 지연은 로그정규분포(중앙값, sigma)를 따릅니다."""
+    comment_pages: int = 3
+    page_ms: float = 150.0
+    page_sigma: float = 0.4
+    transcript_segments: int = 200
+    transcript_ms: float = 400.0
+    transcript_sigma: float = 0.4
+    time_scale: float = 1.0
+    seed: int = 0
+
+
+class _FakeRequest:
+    def __init__(self, backend: "FakeYouTubeClient", kwargs: dict):
+        self.backend = backend
+        self.kwargs = kwargs
+
+    def execute(self):
+        return self.backend.page(**self.kwargs)
+
+
+class _FakeCommentThreads:
+    def __init__(self, backend: "FakeYouTubeClient"):
+        self.backend = backend
+
+    def list(self, **kwargs):
+        return _FakeRequest(self.backend, kwargs)
+
+
+class FakeYouTubeClient:
+    """commentThreads().list(...).execute()만 지원하는 가짜 YouTube Data API 클라이언트입니다."""
+
+    def __init__(self, profile: YouTubeBackendProfile):
+        self.profile = profile
+
+    def commentThreads(self):
+        return _FakeCommentThreads(self)
+
+    def page(self, videoId: str, maxResults: int = 100, pageToken: Optional[str] = None, **_) -> dict:
+        page_no = int(pageToken) if pageToken else 0
+        rng = _rng(self.profile.seed, "comments", videoId, page_no)
+        _sleep_lognormal(rng, self.profile.page_ms, self.profile.page_sigma, self.profile.time_scale)
+        items = []
+        for i in range(maxResults):
+            text = rng.choice(_COMMENT_TEMPLATES).format(n=rng.randint(1, 8))
+            items.append({"snippet": {"topLevelComment": {"snippet": {"textDisplay": text}}}})
+        response = {"items": items}
+        if page_no + 1 < self.profile.comment_pages:
+            response["nextPageToken"] = str(page_no + 1)
+        return response
+
+
+def fake_youtube_client_factory(profile: YouTubeBackendProfile):
+    """youtube_client.set_youtube_client_factory에 넘길 함수를 만듭니다."""
+    def factory(api_key, api_endpoint):
+        return FakeYouTubeClient(profile)
+    return factory
+
+
+def fake_transcript_fetcher(profile: YouTubeBackendProfile):
+    """transcript_cache.set_transcript_fetcher에 넘길 자막 함수를 만듭니다."""
+    lines = [
+        "안녕하세요 오늘은 하체 운동을 해볼게요",
+        "발을 어깨너비로 벌리고 천천히 앉아 주세요",
+        "무릎이 발끝을 넘지 않게 주의하세요",
+        "이번에는 런지 동작입니다 한 발을 앞으로 내딛어요",
+        "호흡은 내려갈 때 마시고 올라올 때 내쉬세요",
+        "코어에 힘을 주고 허리를 곧게 펴 주세요",
+    ]
+
+    def fetch(video_id: str, languages: Sequence[str]) -> List[dict]:
+        rng = _rng(profile.seed, "transcript", video_id)
+        _sleep_lognormal(rng, profile.transcript_ms, profile.transcript_sigma, profile.time_scale)
+        return [
+            {"text": rng.choice(lines), "start": i * 4.0, "duration": 4.0}
+            for i in range(profile.transcript_segments)
+        ]
+    return fetch
@@ -2,29 +2,46 @@
 # ## Node 기반 그래프 방식(수정)
 
 # %%
-import os
 import json
-from typing import TypedDict, List
+from typing import TypedDict, List, Optional
 from urllib.parse import urlparse, parse_qs
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langgraph.graph import StateGraph, START, END
+from summary_cache import summary_cache
+from comment_dedup import cluster_comments
+from comment_clustering import representative_comments
+from comment_sentiment import SentimentTally, score_comments, inject_sentiment
+from comment_fetcher import iter_comment_batches, aiter_comment_batches
+from youtube_client import get_youtube_client, get_async_session
+from comment_prefetch import comment_prefetcher, current_session, PREFETCH_SUMMARY
+from llm_factory import get_chat_model
+from instrumentation import instrument_node, span
+from single_flight import single_flight
+from model_cascade import model_cascade
+from json_stream import JsonStreamError, loads_llm_json, stream_json_with_retry, astream_json_with_retry
+from resilience import acall_llm, call_llm, cancellable
 
 
 # %%
 # 상태(state) 정의
 class CommentState(TypedDict):
     url: str
+    video_id: str
     comments: List[str]
+    sentiment: dict
     comment_summary: str
     error: str
 
 # %%
-# 환경 변수 로드 및 LLM 준비
+# 환경 변수 로드 및 LLM 준비 (모델은 처음 요약할 때 만듭니다)
+# 요약 모델은 model_cascade의 단계(작은 모델 먼저, 검증 실패 시 큰 모델)를 따르고, SUMMARY_MODEL은 가장 큰 모델입니다.
 load_dotenv()
-llm = ChatOpenAI(model="gpt-4o", streaming=True)
+SUMMARY_MODEL = "gpt-4o"
+
+def get_llm(model: str = SUMMARY_MODEL):
+    return get_chat_model(model, streaming=True)
 
 # %%
 # video_id 추출 함수 (내부용)
@@ -39,43 +56,118 @@ def extract_video_id(url: str) -> str:
 
 # %%
 # 노드 1: video_id로 댓글 수집
+def _require_video_id(url: str) -> str:
+    video_id = extract_video_id(url)
+    if not video_id:
+        raise ValueError("유효한 유튜브 URL에서 Video ID를 추출할 수 없습니다.")
+    print(f"✅ 영상 ID 추출 성공: {video_id}")
+    return video_id
+
+def _state_video_id(state: CommentState) -> str:
+    """상위 그래프(youtube_agent)가 넘겨준 영상 ID가 있으면 재사용하고, 없으면 URL에서 추출합니다."""
+    return state.get("video_id") or _require_video_id(state.get("url", ""))
+
+def _fetch_result(url: str, video_id: str, comments: List[str], sentiment: Optional[dict] = None) -> dict:
+    if not comments:
+        raise ValueError("댓글이 없습니다.")
+    print(f"✅ 1. 댓글 {len(comments)}개 수집 성공")
+    return {
+        "url": url, "video_id": video_id, "comments": comments, "sentiment": sentiment or {},
+        "comment_summary": "", "error": "",
+    }
+
+def _reuse_comments(state: CommentState) -> List[str]:
+    """같은 thread의 이전 턴(체크포인트)에서 이미 받아 둔 댓글이 있으면 다시 수집하지 않습니다."""
+    comments = state.get("comments") or []
+    if comments:
+        print(f"♻️ 이전 턴에서 받아 둔 댓글 {len(comments)}개를 재사용합니다.")
+    return comments
+
+def _fetch_error(url: str, e: Exception) -> dict:
+    error_message = f"ERROR: 댓글 수집 중 오류 발생 - {e}"
+    print(f"🚨 {error_message}")
+    return {"url": url, "comments": [], "comment_summary": "", "error": error_message}
+
+def _collect_comments(video_id: str, cancelled=None, tally: Optional[SentimentTally] = None) -> List[str]:
+    """
+    댓글을 페이지 단위로 모두 받아 옵니다. cancelled(threading.Event)가 설정되면 다음 페이지를 요청하지 않고 멈춥니다.
+    tally를 넘기면 다음 페이지를 기다리는 동안 받은 댓글의 긍정/부정 키워드를 미리 셉니다.
+    (중복 정리/군집은 전체 댓글을 서로 비교해야 하므로 수집이 끝난 뒤 요약 노드에서 합니다)
+    """
+    # 스레드별로 재사용되는 클라이언트 (디스커버리 문서/HTTP 연결을 매번 새로 만들지 않음)
+    youtube = get_youtube_client()
+    comments = []
+    for batch in iter_comment_batches(youtube, video_id, stop=cancelled):
+        if cancelled is not None and cancelled.is_set():
+            break
+        comments.extend(batch)
+        if tally is not None:
+            tally.add(batch)
+        print(f"📥 댓글 {len(comments)}개 수집 중...")
+    return comments
+
+def _collect_scored(video_id: str) -> tuple:
+    """(댓글 목록, 긍정 비율 계산 결과)를 반환합니다."""
+    tally = SentimentTally()
+    return _collect_comments(video_id, tally=tally), tally.result()
+
+async def _acollect_scored(video_id: str) -> tuple:
+    """_collect_scored의 비동기 버전입니다. aiohttp로 댓글 페이지를 받아 이벤트 루프를 막지 않습니다."""
+    session = await get_async_session()
+    comments, tally = [], SentimentTally()
+    async for batch in aiter_comment_batches(session, video_id):
+        comments.extend(batch)
+        tally.add(batch)  # 다음 페이지 요청이 진행되는 동안 채점
+        print(f"📥 댓글 {len(comments)}개 수집 중...")
+    return comments, tally.result()
+
+def _reused_sentiment(state: CommentState) -> Optional[dict]:
+    return state.get("sentiment") if state.get("comments") else None
+
 def fetch_comments(state: CommentState) -> dict:
-    import googleapiclient.discovery
     url = state.get("url", "")
     try:
-        video_id = extract_video_id(url)
-        if not video_id:
-            raise ValueError("유효한 유튜브 URL에서 Video ID를 추출할 수 없습니다.")
-        print(f"✅ 영상 ID 추출 성공: {video_id}")
-        api_key = os.getenv("YOUTUBE_API_KEY")
-        youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
-        request = youtube.commentThreads().list(
-            part="snippet", videoId=video_id, maxResults=100, order="relevance"
-        )
-        response = request.execute()
-        comments = [
-            item['snippet']['topLevelComment']['snippet']['textDisplay']
-            for item in response['items']
-        ]
-        if not comments:
-            raise ValueError("댓글이 없습니다.")
-        print(f"✅ 1. 댓글 {len(comments)}개 수집 성공")
-        return {"url": url, "comments": comments, "comment_summary": "", "error": ""}
+        video_id = _state_video_id(state)
+        if comments := _reuse_comments(state) or comment_prefetcher.take(video_id, session=current_session()):
+            return _fetch_result(url, video_id, comments, _reused_sentiment(state))
+        # 같은 영상의 댓글을 다른 요청이 이미 받고 있으면 그 결과를 함께 씁니다. (미리 받기는 따로 취소될 수 있어 합치지 않음)
+        comments, sentiment = single_flight.do("comments", video_id, lambda: _collect_scored(video_id))
+        return _fetch_result(url, video_id, comments, sentiment)
+    except Exception as e:
+        return _fetch_error(url, e)
+
+async def afetch_comments(state: CommentState) -> dict:
+    """fetch_comments의 비동기 버전입니다. aiohttp로 댓글 페이지를 받아 이벤트 루프를 막지 않습니다."""
+    url = state.get("url", "")
+    try:
+        video_id = _state_video_id(state)
+        if comments := _reuse_comments(state) or await comment_prefetcher.atake(video_id, session=current_session()):
+            return _fetch_result(url, video_id, comments, _reused_sentiment(state))
+        comments, sentiment = await single_flight.ado("comments", video_id, lambda: _acollect_scored(video_id))
+        return _fetch_result(url, video_id, comments, sentiment)
     except Exception as e:
-        error_message = f"ERROR: 댓글 수집 중 오류 발생 - {e}"
-        print(f"🚨 {error_message}")
-        return {"url": url, "comments": [], "comment_summary": "", "error": error_message}
+        return _fetch_error(url, e)
 
 # %%
-# 노드 2: 댓글 요약 생성
-def summarize_comments(state: CommentState) -> dict:
+# 노드 2: 긍정 비율 계산 (수집한 모든 댓글 대상, LLM 없이 로컬에서 계산)
+def score_sentiment(state: CommentState) -> dict:
     comments = state.get("comments", [])
-    url = state.get("url", "")
-    video_id = extract_video_id(url)
-    comments_str = "\n- ".join(comments)
-    prompt = PromptTemplate.from_template(
-        """당신은 주어진 유튜브 댓글들을 분석하여 요약내용을 JSON 형식으로 생성하는 AI 전문가입니다.
+    sentiment = state.get("sentiment") or {}
+    if sentiment.get("comments_scored") != len(comments):
+        # 수집하면서 세지 못한 경우(미리 받기 등)에만 다시 계산합니다.
+        sentiment = score_comments(comments)
+    print(
+        f"✅ 2. 긍정 비율 계산: {sentiment['positive_percentage']}% "
+        f"(긍정 {sentiment['positive_hits']} · 부정 {sentiment['negative_hits']}, 댓글 {sentiment['comments_scored']}개)"
+    )
+    return {"sentiment": sentiment}
+
+# %%
+# 댓글 요약 프롬프트 (프롬프트가 바뀌면 요약 캐시 키도 바뀌어 이전 결과를 쓰지 않습니다)
+# 긍정 비율(positive_percentage)은 LLM이 아니라 score_sentiment 결과로 채웁니다.
+comment_summary_template = """당신은 주어진 유튜브 댓글들을 분석하여 요약내용을 JSON 형식으로 생성하는 AI 전문가입니다.
         댓글은 한국어와 영어가 섞여 있을 수 있습니다. 영어가 있다면 내용을 파악하여 자연스러운 한국어 기반으로 번역하고 요약에 포함시켜야 합니다.
+        댓글 끝의 "(×N)"은 비슷한 댓글이 N개 있었다는 뜻입니다. 반응의 비중을 판단할 때 N개로 계산하세요.
 
         [분석할 댓글 내용]
         - {comments_str}
@@ -85,24 +177,134 @@ def summarize_comments(state: CommentState) -> dict:
 
         ## 아래 JSON 형식을 준수하여 응답해주세요:
         - "description"은 2문장이 넘어가지 않도록 핵심만을 담아 **개조식**으로 작성, **댓글 내용이 긍정적인지, 부정적인지는 말하지 않아도 됨**
-        - "positivie_percentage"는 긍정적인 키워드와 부정적인 키워드를 모두 분석해서 전체 키워드 중 긍정적인 키워드가 몇퍼센트인지 정확하게 분석해서 정수형으로 답변
         - "key_topics", "user_tips", "faq" 모두 핵심만을 담아 2개만 추출
         {{
-          "overall_sentiment": {{"description": "📝 전반적인 댓글 내용을 요약 서술", "positive_percentage": "👍 긍정 반응의 비율(%)"}},
+          "overall_sentiment": {{"description": "📝 전반적인 댓글 내용을 요약 서술"}},
           "key_topics": ["🏷️ 주요 키워드 1", "🏷️ 주요 키워드 2"],
           "user_tips": ["💡 사용자 팁 요약 1", "💡 사용자 팁 요약 2"],
           "faq": ["❓ 자주 묻는 질문 요약 1", "❓ 자주 묻는 질문 요약 2"]
         }}"""
-    )
+comment_prompt = PromptTemplate.from_template(comment_summary_template)
+
+# %%
+# 노드 3: 댓글 요약 생성
+def get_comment_chain(model: str = SUMMARY_MODEL):
+    return comment_prompt | get_llm(model) | StrOutputParser()
+
+def _comment_inputs(state: CommentState) -> tuple:
+    url = state.get("url", "")
+    video_id = state.get("video_id") or extract_video_id(url)
+    comments = state.get("comments", [])
+    # 거의 같은 댓글(인사, 타임스탬프, 복붙 도배)은 "대표 댓글 (×N)" 한 줄로 묶어 토큰을 줄입니다.
+    clusters = cluster_comments(comments)
+    if len(clusters) < len(comments):
+        print(f"🧹 중복 댓글 정리: {len(comments)}개 -> {len(clusters)}개")
+    # 그래도 많으면 임베딩 군집의 대표 댓글만 보내 프롬프트 크기를 고정합니다.
+    lines = representative_comments([c["text"] for c in clusters], [c["count"] for c in clusters])
+    comments_str = "\n- ".join(lines)
+    # 같은 영상 + 같은 댓글 + 같은 프롬프트 + 같은 모델이면 캐시된 요약을 그대로 사용
+    cache_args = ("comment", video_id, comments_str, comment_summary_template, model_cascade.label())
+    return url, video_id, comments_str, cache_args
+
+def _with_sentiment(state: CommentState, comment_summary: str) -> str:
+    sentiment = state.get("sentiment") or score_comments(state.get("comments", []))
+    return inject_sentiment(comment_summary, sentiment)
+
+def _summary_success(state: CommentState, cache_args: tuple, comment_summary: str) -> dict:
+    # 캐시에는 LLM 응답만 저장하고, 긍정 비율은 매번 현재 댓글 기준으로 채웁니다.
+    summary_cache.put(*cache_args, comment_summary)
+    print(f"✅ 3. 요약 생성 성공")
+    return {"url": state.get("url", ""), "comment_summary": _with_sentiment(state, comment_summary)}
+
+def _summary_error(url: str, e: Exception) -> dict:
+    error_message = f"ERROR: 요약 중 에러 발생 - {e}"
+    print(f"🚨 {error_message}")
+    return {"url": url, "comment_summary": "", "error": error_message}
+
+def _prompt_tokens(inputs: dict) -> int:
+    from token_budget import count_tokens
+    return count_tokens(comment_prompt.format(**inputs), SUMMARY_MODEL)
+
+def _complete_summary(inputs: dict) -> str:
+    """
+    JSON이 깨진 것이 보이면 생성을 멈추고 다시 요청합니다. (일시적 오류 재시도/헤지/마감 시각은 call_llm)
+    작은 모델의 결과가 스키마 검증을 통과하지 못하면 model_cascade가 큰 모델로 다시 요약합니다.
+    """
+    def complete(model: str) -> str:
+        return call_llm(model, lambda: stream_json_with_retry(
+            lambda: cancellable(get_comment_chain(model).stream(inputs))
+        ), name="comment.summary")
+    return model_cascade.run("comment", complete, _prompt_tokens(inputs))
+
+async def _acomplete_summary(inputs: dict) -> str:
+    """_complete_summary의 비동기 버전입니다."""
+    async def complete(model: str) -> str:
+        return await acall_llm(model, lambda: astream_json_with_retry(
+            lambda: get_comment_chain(model).astream(inputs)
+        ), name="comment.summary")
+    return await model_cascade.arun("comment", complete, _prompt_tokens(inputs))
+
+def summarize_comments(state: CommentState) -> dict:
+    url, video_id, comments_str, cache_args = _comment_inputs(state)
+    cached_summary = summary_cache.get(*cache_args)
+    if cached_summary is not None:
+        print("⚡ 요약 캐시 적중. LLM 호출을 건너뜁니다.")
+        return {"url": url, "comment_summary": _with_sentiment(state, cached_summary)}
+
+    try:
+        # 같은 입력의 요약을 다른 요청이 이미 만들고 있으면 그 결과를 함께 씁니다.
+        inputs = {"comments_str": comments_str, "video_id": video_id}
+        comment_summary = single_flight.do(
+            "comment_summary", summary_cache.make_key(*cache_args)[0], lambda: _complete_summary(inputs)
+        )
+        return _summary_success(state, cache_args, comment_summary)
+    except Exception as e:
+        return _summary_error(url, e)
+
+async def asummarize_comments(state: CommentState) -> dict:
+    """summarize_comments의 비동기 버전입니다. (chain.astream 사용)"""
+    url, video_id, comments_str, cache_args = _comment_inputs(state)
+    cached_summary = summary_cache.get(*cache_args)
+    if cached_summary is not None:
+        print("⚡ 요약 캐시 적중. LLM 호출을 건너뜁니다.")
+        return {"url": url, "comment_summary": _with_sentiment(state, cached_summary)}
+
     try:
-        chain = prompt | llm | StrOutputParser()
-        comment_summary = chain.invoke({"comments_str": comments_str, "video_id": video_id})
-        print(f"✅ 2. 요약 생성 성공")
-        return {"url": url, "comment_summary": comment_summary}
+        inputs = {"comments_str": comments_str, "video_id": video_id}
+        comment_summary = await single_flight.ado(
+            "comment_summary", summary_cache.make_key(*cache_args)[0], lambda: _acomplete_summary(inputs)
+        )
+        return _summary_success(state, cache_args, comment_summary)
     except Exception as e:
-        error_message = f"ERROR: 요약 중 에러 발생 - {e}"
-        print(f"🚨 {error_message}")
-        return {"url": url, "comment_summary": "", "error": error_message}
+        return _summary_error(url, e)
+
+# %%
+# 답변을 기다리는 동안 미리 실행할 작업 (youtube_agent.prepare_turn에서 시작)
+def prefetch_comments(url: str, video_id: str, cancelled) -> Optional[List[str]]:
+    """
+    댓글을 미리 받아 둡니다. PREFETCH_SUMMARY가 켜져 있으면 요약까지 만들어 요약 캐시에 넣어 두므로,
+    사용자가 "응"이라고 답하면 summarize_comments가 캐시 적중으로 바로 끝납니다.
+    """
+    # 그래프 밖(미리 받기 스레드)에서 실행되므로 별도의 노드 이름으로 계측합니다.
+    with span("comment.prefetch_comments", graph="comment", node="prefetch_comments", video_id=video_id):
+        comments = _collect_comments(video_id, cancelled)
+        if cancelled.is_set() or not comments:
+            return None
+        if PREFETCH_SUMMARY:
+            state = {"url": url, "video_id": video_id, "comments": comments}
+            state["sentiment"] = score_comments(comments)
+            summarize_comments(state)
+    print(f"🔮 댓글 미리 받기 완료: {video_id} ({len(comments)}개)")
+    return comments
+
+def start_comment_prefetch(url: str, video_id: str, session: Optional[str] = None) -> bool:
+    """session(기본값: 지금 실행 중인 thread_id)을 video_id 미리 받기 작업의 관심 세션으로 등록합니다."""
+    session = current_session() if session is None else session
+    return comment_prefetcher.start(video_id, lambda cancelled: prefetch_comments(url, video_id, cancelled), session)
+
+def cancel_comment_prefetch(video_id: str, session: Optional[str] = None) -> bool:
+    """session이 거절했음을 알립니다. 같은 영상을 기다리는 다른 세션이 없을 때만 작업을 멈춥니다."""
+    return comment_prefetcher.cancel(video_id, current_session() if session is None else session)
 
 # %%
 # 에러 분기 함수
@@ -112,19 +314,23 @@ def route_after_fetch(state: CommentState) -> str:
         return END
     else:
         print("✅ 댓글 수집 성공. 요약 단계로 이동합니다.")
-        return "summarize_comments"
+        return "score_sentiment"
 
 # %%
 # 그래프(graph) 생성
 builder = StateGraph(CommentState)
-builder.add_node("fetch_comments", fetch_comments)
-builder.add_node("summarize_comments", summarize_comments)
+# 동기(graph.invoke)와 비동기(graph.ainvoke / astream) 실행 모두 지원하도록 두 구현을 함께 등록
+# 노드마다 실행 시간/LLM 토큰/API 호출/캐시 적중을 기록합니다. (instrumentation.py)
+builder.add_node("fetch_comments", instrument_node("comment", "fetch_comments", fetch_comments, afetch_comments))
+builder.add_node("score_sentiment", instrument_node("comment", "score_sentiment", score_sentiment))
+builder.add_node("summarize_comments", instrument_node("comment", "summarize_comments", summarize_comments, asummarize_comments))
 
 builder.add_edge(START, "fetch_comments")
 builder.add_conditional_edges("fetch_comments", route_after_fetch, {
-    "summarize_comments": "summarize_comments",
+    "score_sentiment": "score_sentiment",
     END: END
 })
+builder.add_edge("score_sentiment", "summarize_comments")
 builder.add_edge("summarize_comments", END)
 
 graph = builder.compile()
@@ -133,16 +339,7 @@ graph
 
 # %%
 # 결과 출력 함수
-def run_agent(url: str):
-    """
-    에이전트를 실행하고 최종 결과를 출력합니다.
-    - 초기 입력을 'url' 필드에 담아 전달합니다.
-    - 최종 결과는 'comment_summary' 필드에서 가져옵니다.
-    - 'error' 필드를 확인하여 오류를 처리합니다.
-    """
-    inputs = {"url": url}
-    final_state = graph.invoke(inputs)
-
+def _print_final_state(final_state: dict):
     if final_state.get("error"):
         print("\n" + "="*30)
         print("❌ 최종 실행 중 오류 발생:")
@@ -160,20 +357,26 @@ def run_agent(url: str):
         print("⚠️ 요약 결과가 비어 있습니다. content 값:", repr(content))
         return
 
-    # LLM 응답에서 마크다운 코드 블록 제거
-    if content.strip().startswith("```json"):
-        start_index = content.find('{')
-        end_index = content.rfind('}')
-        if start_index != -1 and end_index != -1:
-            content = content[start_index : end_index + 1]
-
     try:
-        parsed_json = json.loads(content)
+        parsed_json = loads_llm_json(content)
         print(json.dumps(parsed_json, indent=2, ensure_ascii=False))
-    except json.JSONDecodeError:
+    except JsonStreamError:
         print("⚠️ JSON 파싱 실패. 원본 content 출력:")
         print(content)
 
+def run_agent(url: str):
+    """
+    에이전트를 실행하고 최종 결과를 출력합니다.
+    - 초기 입력을 'url' 필드에 담아 전달합니다.
+    - 최종 결과는 'comment_summary' 필드에서 가져옵니다.
+    - 'error' 필드를 확인하여 오류를 처리합니다.
+    """
+    _print_final_state(graph.invoke({"url": url}))
+
+async def arun_agent(url: str):
+    """run_agent의 비동기 버전입니다. 하나의 이벤트 루프에서 여러 영상을 동시에 요약할 수 있습니다."""
+    _print_final_state(await graph.ainvoke({"url": url}))
+
 # %%
 # 테스트 실행 예시
 if __name__ == "__main__":
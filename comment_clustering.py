@@ -0,0 +1,181 @@
+# %%
+import hashlib
+import os
+import re
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedEmbeddings
+
+# %%
+# 댓글이 이 개수보다 많으면 군집화해서 대표 댓글만 LLM에 보냅니다. (프롬프트 크기가 댓글 수와 무관하게 고정됨)
+MAX_REPRESENTATIVES = int(os.getenv("COMMENT_MAX_REPRESENTATIVES", "150"))
+MAX_REPRESENTATIVE_CHARS = 300  # 대표 댓글 1개가 프롬프트에서 차지할 수 있는 최대 글자 수
+# "openai": text-embedding-3-large, "local": 네트워크 없이 동작하는 해싱 임베딩 (오프라인/테스트용)
+COMMENT_EMBEDDER = os.getenv("COMMENT_EMBEDDER", "openai")
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-large"
+KMEANS_MAX_ITER = 50
+KMEANS_SEED = 0
+
+_TOKEN_RE = re.compile(r"[0-9a-z가-힣]+")
+
+
+# %%
+class HashingEmbeddings(Embeddings):
+    """
+    API 호출 없이 동작하는 로컬 임베딩입니다.
+    단어와 문자 2/3-gram을 고정 크기 벡터에 해싱한 뒤 L2 정규화합니다. (오프라인 실행, 벤치마크용)
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        text = unicodedata.normalize("NFKC", text).lower()
+        words = _TOKEN_RE.findall(text)
+        compact = "".join(words)
+        grams = [compact[i:i + n] for n in (2, 3) for i in range(max(0, len(compact) - n + 1))]
+        return [f"w:{word}" for word in words] + grams
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if (value >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+
+def get_comment_embeddings(kind: str = COMMENT_EMBEDDER) -> CachedEmbeddings:
+    """설정에 맞는 임베딩 모델을 캐시로 감싸 반환합니다."""
+    if kind == "local":
+        local = HashingEmbeddings()
+        return CachedEmbeddings(local, f"local-hashing-{local.dim}")
+    from llm_factory import get_embeddings
+    return CachedEmbeddings(get_embeddings(OPENAI_EMBEDDING_MODEL), OPENAI_EMBEDDING_MODEL)
+
+
+# %%
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def kmeans(vectors: np.ndarray, k: int, weights: Optional[np.ndarray] = None,
+           max_iter: int = KMEANS_MAX_ITER, seed: int = KMEANS_SEED) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    코사인 거리 기반 k-means (k-means++ 초기화). 모든 거리 계산은 행렬 곱 한 번으로 처리합니다.
+
+    Args:
+        vectors: (n, d) L2 정규화된 벡터
+        weights: 각 벡터가 대표하는 댓글 수 (중복 댓글 묶음 크기)
+
+    Returns:
+        (labels: (n,) 군집 번호, centers: (k, d) 군집 중심)
+    """
+    n = len(vectors)
+    k = min(k, n)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+
+    # k-means++: 이미 고른 중심에서 먼 점일수록(가중치가 클수록) 다음 중심으로 뽑힐 확률이 높음
+    centers = np.empty((k, vectors.shape[1]), dtype=vectors.dtype)
+    centers[0] = vectors[rng.choice(n, p=weights / weights.sum())]
+    closest = np.maximum(1.0 - vectors @ centers[0], 0.0).astype(np.float64)
+    for c in range(1, k):
+        scores = closest * weights
+        total = scores.sum()
+        index = rng.choice(n, p=scores / total) if total > 0 else rng.integers(n)
+        centers[c] = vectors[index]
+        closest = np.minimum(closest, np.maximum(1.0 - vectors @ centers[c], 0.0))
+
+    labels = np.full(n, -1)
+    for _ in range(max_iter):
+        new_labels = np.argmax(vectors @ centers.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, vectors * weights[:, None].astype(vectors.dtype))
+        sizes = np.bincount(labels, weights=weights, minlength=k)
+        empty = sizes == 0
+        if empty.any():
+            # 빈 군집은 현재 중심에서 가장 먼 점으로 다시 채움
+            similarity = np.max(vectors @ centers.T, axis=1)
+            sums[empty] = vectors[np.argsort(similarity)[:empty.sum()]]
+        centers = _normalize_rows(sums)
+    return labels, centers
+
+
+def medoid_indices(vectors: np.ndarray, labels: np.ndarray, centers: np.ndarray) -> List[int]:
+    """각 군집에서 중심과 가장 가까운 실제 댓글(medoid)의 인덱스를 반환합니다."""
+    similarity = np.einsum("ij,ij->i", vectors, centers[labels])
+    medoids = []
+    for cluster in np.unique(labels):
+        members = np.flatnonzero(labels == cluster)
+        medoids.append(int(members[np.argmax(similarity[members])]))
+    return medoids
+
+
+# %%
+def _shorten(text: str, limit: int = MAX_REPRESENTATIVE_CHARS) -> str:
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def _with_count(text: str, count: int) -> str:
+    return f"{text} (×{count})" if count > 1 else text
+
+
+def representative_comments(
+    comments: Sequence[str],
+    counts: Optional[Sequence[int]] = None,
+    embeddings: Optional[Embeddings] = None,
+    k: int = MAX_REPRESENTATIVES,
+) -> List[str]:
+    """
+    댓글을 임베딩 공간에서 k개 군집으로 나누고, 군집마다 대표 댓글 1개를 "댓글 (×N)" 형태로 반환합니다.
+    댓글 수가 k 이하이면 그대로 반환합니다. 결과는 큰 군집부터 정렬됩니다.
+
+    Args:
+        comments: 댓글 목록 (중복 정리 후의 대표 댓글이어도 됨)
+        counts: 각 댓글이 대표하는 댓글 수 (없으면 모두 1)
+        embeddings: 사용할 임베딩 (없으면 COMMENT_EMBEDDER 설정에 따라 생성)
+    """
+    counts = [1] * len(comments) if counts is None else list(counts)
+    if len(comments) <= k:
+        return [_with_count(comment, count) for comment, count in zip(comments, counts)]
+
+    try:
+        embeddings = embeddings or get_comment_embeddings()
+        if isinstance(embeddings, CachedEmbeddings):
+            vectors = embeddings.embed_array(list(comments))
+        else:
+            vectors = np.asarray(embeddings.embed_documents(list(comments)), dtype=np.float32)
+    except Exception as e:
+        # 임베딩을 못 쓰면 앞쪽(관련도/반복 횟수가 높은) 댓글 k개만 사용
+        print(f"⚠️ 댓글 임베딩 실패, 앞쪽 {k}개 댓글만 사용합니다 - {e}")
+        return [_with_count(comment, count) for comment, count in zip(comments[:k], counts[:k])]
+    vectors = _normalize_rows(vectors.astype(np.float32, copy=False))
+
+    weights = np.asarray(counts, dtype=np.float32)
+    labels, centers = kmeans(vectors, k, weights)
+    cluster_sizes = np.bincount(labels, weights=weights).astype(int)
+
+    representatives = []
+    for index in medoid_indices(vectors, labels, centers):
+        size = cluster_sizes[labels[index]]
+        representatives.append((size, index, _with_count(_shorten(comments[index]), size)))
+    representatives.sort(key=lambda item: (-item[0], item[1]))
+    print(f"🧭 댓글 군집화: {int(weights.sum())}개 -> 대표 댓글 {len(representatives)}개")
+    return [text for _, _, text in representatives]
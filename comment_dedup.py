@@ -0,0 +1,199 @@
+# %%
+import hashlib
+import re
+import unicodedata
+from typing import List, Sequence
+
+import numpy as np
+
+# %%
+SHINGLE_SIZE = 3          # 문자 3-gram (띄어쓰기가 불규칙한 한국어 댓글에 단어 단위보다 안정적)
+MAX_HAMMING_DISTANCE = 6  # SimHash 64비트 중 이 개수 이하로 다르면 같은 의견으로 묶음 ("ㅎㅎ" 등 덧붙임은 4~6, 다른 문장은 9 이상)
+MIN_SIMHASH_CHARS = 6     # 이보다 짧은 댓글은 정확히 같은 경우에만 묶음 (짧은 글은 SimHash가 불안정)
+BANDS = 8                 # LSH 밴드 수 (64비트 / 8 = 8비트씩, 비둘기집 원리로 거리 7 이하는 반드시 후보가 됨)
+_BAND_BITS = 64 // BANDS
+_POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+_SHINGLE_CHUNK = 200_000  # 비트 집계 시 한 번에 처리할 shingle 수 (메모리 사용량 제한)
+_PAIR_CHUNK = 1 << 22     # LSH 버킷 안에서 한 번에 거리를 계산할 최대 쌍 수 (약 50MB)
+MAX_BUCKET_COMPARE = 4096 # 버킷이 이보다 크면(도배, 비슷한 짧은 댓글 폭주) 지문 순으로 정렬해 이웃한 이만큼끼리만 비교
+
+_TIMESTAMP_RE = re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\b")
+_STRIP_RE = re.compile(r"[^0-9a-z가-힣ㄱ-ㅎㅏ-ㅣᄀ-ᇿ<> ]+")
+_REPEAT_RE = re.compile(r"(.)\1{2,}")
+_SYMBOL_REPEAT_RE = re.compile(r"(.)\1+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+# %%
+def _symbol_key(text: str) -> str:
+    """이모지/기호만 있는 댓글의 비교 키 (공백 제거, 반복 축약: "👍👍👍" -> "👍")"""
+    text = _SPACE_RE.sub("", unicodedata.normalize("NFKC", text))
+    return _SYMBOL_REPEAT_RE.sub(r"\1", text)
+
+
+def normalize_comment(text: str) -> str:
+    """
+    비교용으로 댓글을 정규화합니다.
+    (NFKC, 소문자화, 타임스탬프 -> <ts>, 구두점/이모지 제거, 3번 이상 반복되는 문자 축약)
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _TIMESTAMP_RE.sub("<ts>", text)
+    text = _STRIP_RE.sub(" ", text)
+    text = _REPEAT_RE.sub(r"\1\1", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class _ShingleHasher:
+    """shingle 문자열 -> 64비트 해시. 같은 shingle이 반복되므로 결과를 기억해 둡니다. (실행마다 같은 값)"""
+
+    def __init__(self):
+        self._cache = {}
+
+    def __call__(self, shingle: str) -> int:
+        value = self._cache.get(shingle)
+        if value is None:
+            value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+            self._cache[shingle] = value
+        return value
+
+
+def simhash_fingerprints(texts: Sequence[str], shingle_size: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    정규화된 텍스트 목록의 64비트 SimHash 지문을 한 번에 계산합니다.
+    모든 shingle 해시를 하나의 배열로 펼친 뒤, 비트별로 np.bincount로 집계합니다.
+    """
+    hasher = _ShingleHasher()
+    owners, hashes = [], []
+    for i, text in enumerate(texts):
+        compact = text.replace(" ", "")
+        shingles = [compact[j:j + shingle_size] for j in range(max(1, len(compact) - shingle_size + 1))]
+        owners.extend([i] * len(shingles))
+        hashes.extend(hasher(shingle) for shingle in shingles)
+
+    n = len(texts)
+    owners = np.asarray(owners, dtype=np.int64)
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    shingle_counts = np.bincount(owners, minlength=n)
+    bit_counts = np.zeros((n, 64), dtype=np.int64)
+    for start in range(0, len(hashes), _SHINGLE_CHUNK):
+        chunk_owners = owners[start:start + _SHINGLE_CHUNK]
+        chunk_hashes = hashes[start:start + _SHINGLE_CHUNK]
+        for bit in range(64):
+            ones = ((chunk_hashes >> np.uint64(bit)) & np.uint64(1)).astype(np.int64)
+            bit_counts[:, bit] += np.bincount(chunk_owners, weights=ones, minlength=n).astype(np.int64)
+
+    # 절반 이상의 shingle에서 1인 비트를 1로 설정
+    bits = (bit_counts * 2 > shingle_counts[:, None]).astype(np.uint64)
+    return (bits << np.arange(64, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+
+
+def _close_pairs(fingerprints: np.ndarray, max_distance: int):
+    """
+    같은 LSH 버킷에 든 지문들 중 해밍 거리가 max_distance 이하인 (i, j) 쌍(i < j)을 만들어 냅니다.
+    거리 행렬을 한 번에 만들지 않고 행 묶음 단위로 계산해 메모리를 제한하고,
+    MAX_BUCKET_COMPARE보다 큰 버킷은 (정렬된 순서에서) 가까운 이웃끼리만 비교합니다.
+    """
+    n = len(fingerprints)
+    window = min(n, MAX_BUCKET_COMPARE)
+    rows = max(1, _PAIR_CHUNK // window)
+    for start in range(0, n, rows):
+        stop = min(n, start + rows)
+        cols_stop = n if n <= MAX_BUCKET_COMPARE else min(n, stop + window)
+        # 16비트 단위 popcount 표로 64비트 해밍 거리를 한 번에 계산
+        xor = (fingerprints[start:stop, None] ^ fingerprints[None, start:cols_stop]).view(np.uint16)
+        distances = _POPCOUNT16[xor].reshape(stop - start, cols_stop - start, 4).sum(axis=2, dtype=np.uint8)
+        # 행/열이 모두 start부터 시작하므로 대각선 위쪽(k=1)만 남기면 i < j 쌍만 남습니다.
+        rows_idx, cols_idx = np.nonzero(np.triu(distances <= max_distance, k=1))
+        yield from zip((rows_idx + start).tolist(), (cols_idx + start).tolist())
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # 먼저 등장한(더 관련도 높은) 댓글이 대표가 되도록 작은 인덱스를 루트로 둡니다.
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+# %%
+def cluster_comments(comments: Sequence[str], max_distance: int = MAX_HAMMING_DISTANCE) -> List[dict]:
+    """
+    댓글을 (1) 정규화 후 정확히 같은 것끼리, (2) SimHash 거리가 가까운 것끼리 묶습니다.
+
+    Returns:
+        [{"text": 대표 댓글(원문), "count": 묶인 댓글 수, "members": 원래 인덱스 목록}, ...]
+        많이 반복된 의견부터, 같은 수면 먼저 등장한 순서로 정렬됩니다.
+    """
+    # 1) 정확히 같은 댓글 (정규화 기준)
+    unique_index = {}
+    exact_groups: List[List[int]] = []
+    unique_texts: List[str] = []
+    for i, comment in enumerate(comments):
+        key = normalize_comment(comment)
+        if not key:
+            # 이모지/기호만 있는 댓글은 정규화하면 비지만 반응으로서 의미가 있으므로, 같은 기호끼리 따로 묶습니다.
+            # (\0을 앞에 붙여 일반 댓글과 섞이지 않게 하고, SimHash 비교 대상에서도 뺌)
+            symbols = _symbol_key(comment)
+            if not symbols:
+                continue
+            key = "\0" + symbols
+        group_id = unique_index.get(key)
+        if group_id is None:
+            unique_index[key] = len(exact_groups)
+            exact_groups.append([i])
+            unique_texts.append(key)
+        else:
+            exact_groups[group_id].append(i)
+
+    # 2) 비슷한 댓글: SimHash + LSH 밴드로 후보를 좁힌 뒤 해밍 거리로 확인
+    uf = _UnionFind(len(unique_texts))
+    candidates = [
+        i for i, text in enumerate(unique_texts)
+        if not text.startswith("\0") and len(text.replace(" ", "")) >= MIN_SIMHASH_CHARS
+    ]
+    if len(candidates) > 1:
+        fingerprints = simhash_fingerprints([unique_texts[i] for i in candidates])
+        for band in range(BANDS):
+            band_values = (fingerprints >> np.uint64(band * _BAND_BITS)) & np.uint64((1 << _BAND_BITS) - 1)
+            order = np.argsort(band_values, kind="stable")
+            boundaries = np.flatnonzero(np.diff(band_values[order])) + 1
+            for bucket in np.split(order, boundaries):
+                if len(bucket) < 2:
+                    continue
+                if len(bucket) > MAX_BUCKET_COMPARE:
+                    bucket = bucket[np.argsort(fingerprints[bucket], kind="stable")]
+                # 같은 밴드 값을 가진 후보끼리 해밍 거리로 확인
+                for a, b in _close_pairs(fingerprints[bucket], max_distance):
+                    uf.union(candidates[bucket[a]], candidates[bucket[b]])
+
+    clusters = {}
+    for group_id, members in enumerate(exact_groups):
+        clusters.setdefault(uf.find(group_id), []).extend(members)
+
+    result = []
+    for members in clusters.values():
+        members.sort()
+        result.append({"text": comments[members[0]], "count": len(members), "members": members})
+    result.sort(key=lambda cluster: (-cluster["count"], cluster["members"][0]))
+    return result
+
+
+def collapse_comments(comments: Sequence[str], max_distance: int = MAX_HAMMING_DISTANCE) -> List[str]:
+    """
+    비슷한 댓글 묶음을 "대표 댓글 (×N)" 한 줄로 바꾼 목록을 반환합니다.
+    LLM은 여전히 각 의견이 얼마나 많았는지 알 수 있습니다.
+    """
+    clusters = cluster_comments(comments, max_distance)
+    return [
+        f"{cluster['text']} (×{cluster['count']})" if cluster["count"] > 1 else cluster["text"]
+        for cluster in clusters
+    ]
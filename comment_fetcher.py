@@ -0,0 +1,197 @@
+# %%
+import asyncio
+import html
+import os
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List, Optional
+
+from instrumentation import record_api_call
+from rate_limiter import acquire_youtube, aacquire_youtube
+
+# %%
+# 수집 한도 설정 (환경 변수로 덮어쓸 수 있음)
+DEFAULT_MAX_COMMENTS = int(os.getenv("COMMENT_FETCH_MAX_COMMENTS", "500"))
+DEFAULT_MAX_BYTES = int(os.getenv("COMMENT_FETCH_MAX_BYTES", str(512 * 1024)))
+DEFAULT_TIME_BUDGET_SECONDS = float(os.getenv("COMMENT_FETCH_TIME_BUDGET_SECONDS", "10"))
+PAGE_SIZE = 100  # commentThreads.list의 maxResults 최대값
+COMMENT_THREADS_URL = "https://www.googleapis.com/youtube/v3/commentThreads"
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+# %%
+def clean_comment(text_display: str) -> str:
+    """textDisplay의 HTML 태그/엔티티를 제거하고 공백을 정리합니다."""
+    text = _TAG_RE.sub(" ", text_display.replace("<br>", "\n"))
+    text = html.unescape(text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class _PageBudget:
+    """페이지별 응답을 정리하면서 개수/용량/시간 한도를 추적합니다. (동기/비동기 수집기 공용)"""
+
+    def __init__(self, max_comments: int, max_bytes: Optional[int], time_budget: Optional[float]):
+        self.max_comments = max_comments
+        self.max_bytes = max_bytes
+        self.time_budget = time_budget
+        self.started = time.monotonic()
+        self.collected = 0
+        self.collected_bytes = 0
+        self.page_no = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.max_comments - self.collected
+
+    def consume(self, response: dict):
+        """응답 한 페이지를 정리해 (댓글 배치, 다음 페이지 토큰 또는 None)을 반환합니다."""
+        self.page_no += 1
+        batch, page_bytes = [], 0
+        for item in response.get("items", [])[: self.remaining]:
+            text = clean_comment(item["snippet"]["topLevelComment"]["snippet"]["textDisplay"])
+            if text:
+                batch.append(text)
+                page_bytes += len(text.encode("utf-8"))
+        self.collected += len(batch)
+        self.collected_bytes += page_bytes
+        record_api_call("youtube.commentThreads", page_bytes)
+
+        next_page_token = response.get("nextPageToken")
+        stop_reason = None
+        if not next_page_token:
+            stop_reason = "마지막 페이지"
+        elif self.collected >= self.max_comments:
+            stop_reason = f"최대 {self.max_comments}개 도달"
+        elif self.max_bytes is not None and self.collected_bytes >= self.max_bytes:
+            stop_reason = f"용량 한도 {self.max_bytes} bytes 도달"
+        elif self.time_budget is not None and time.monotonic() - self.started >= self.time_budget:
+            stop_reason = f"시간 한도 {self.time_budget}초 도달"
+
+        if stop_reason is not None:
+            print(f"⏹️ 댓글 수집 종료 ({stop_reason}, 페이지 {self.page_no}, 댓글 {self.collected}개)")
+            return batch, None
+        return batch, next_page_token
+
+
+# %%
+# googleapiclient의 http 객체는 스레드 안전하지 않으므로 같은 클라이언트의 요청은 한 번에 하나만 보냅니다.
+# (소비하는 쪽이 일찍 멈춰 끝나기를 기다리지 않은 요청이, 같은 스레드의 다음 수집 요청과 겹치지 않도록)
+_client_locks: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_client_locks_lock = threading.Lock()
+
+
+def _client_lock(youtube) -> threading.Lock:
+    with _client_locks_lock:
+        lock = _client_locks.get(youtube)
+        if lock is None:
+            lock = _client_locks[youtube] = threading.Lock()
+        return lock
+
+
+def iter_comment_batches(
+    youtube,
+    video_id: str,
+    max_comments: int = DEFAULT_MAX_COMMENTS,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+    time_budget: Optional[float] = DEFAULT_TIME_BUDGET_SECONDS,
+    order: str = "relevance",
+    stop: Optional[threading.Event] = None,
+) -> Iterator[List[str]]:
+    """
+    commentThreads().list를 nextPageToken으로 이어 호출하면서 페이지 단위로 댓글을 yield 합니다.
+
+    - 다음 페이지 요청은 현재 페이지를 정리/전달하는 동안 백그라운드에서 미리 보냅니다.
+    - max_comments개를 채우거나, 누적 텍스트가 max_bytes를 넘거나,
+      time_budget(초)이 지나거나, 다음 페이지가 없으면 중단합니다.
+    - 소비하는 쪽에서 반복을 멈추거나 stop(threading.Event)이 설정되면 아직 보내지 않은 페이지는 요청하지 않고,
+      이미 보낸 요청이 끝나기를 기다리지 않고 바로 반환합니다.
+    """
+    budget = _PageBudget(max_comments, max_bytes, time_budget)
+    closed = threading.Event()
+    lock = _client_lock(youtube)
+
+    def stopped() -> bool:
+        return closed.is_set() or (stop is not None and stop.is_set())
+
+    def request_page(page_token: Optional[str]) -> Optional[dict]:
+        if stopped():
+            return None
+        acquire_youtube("commentThreads.list")  # 할당량이 모자라면 실패 대신 찰 때까지 기다립니다.
+        with lock:
+            if stopped():  # 할당량/앞선 요청을 기다리는 동안 멈췄으면 요청하지 않음
+                return None
+            return youtube.commentThreads().list(
+                part="snippet",
+                videoId=video_id,
+                maxResults=min(PAGE_SIZE, budget.remaining),
+                order=order,
+                pageToken=page_token,
+            ).execute()
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        pending = executor.submit(request_page, None)
+        while pending is not None:
+            response = pending.result()
+            if response is None:
+                return
+            batch, next_page_token = budget.consume(response)
+            # 현재 배치를 내보내기 전에 다음 페이지 요청을 먼저 시작합니다.
+            pending = executor.submit(request_page, next_page_token) if next_page_token else None
+            if batch:
+                yield batch
+    finally:
+        closed.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_comment_batches(
+    session,
+    video_id: str,
+    api_key: Optional[str] = None,
+    max_comments: int = DEFAULT_MAX_COMMENTS,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+    time_budget: Optional[float] = DEFAULT_TIME_BUDGET_SECONDS,
+    order: str = "relevance",
+    endpoint: str = COMMENT_THREADS_URL,
+) -> AsyncIterator[List[str]]:
+    """
+    iter_comment_batches의 비동기 버전입니다. aiohttp 세션으로 REST 엔드포인트를 직접 호출하므로
+    이벤트 루프 하나에서 여러 영상의 댓글을 동시에 수집할 수 있습니다.
+    """
+    budget = _PageBudget(max_comments, max_bytes, time_budget)
+    api_key = api_key or os.getenv("YOUTUBE_API_KEY")
+
+    async def request_page(page_token: Optional[str]) -> dict:
+        params = {
+            "part": "snippet",
+            "videoId": video_id,
+            "maxResults": str(min(PAGE_SIZE, budget.remaining)),
+            "order": order,
+            "key": api_key or "",
+        }
+        if page_token:
+            params["pageToken"] = page_token
+        await aacquire_youtube("commentThreads.list")
+        async with session.get(endpoint, params=params) as response:
+            payload = await response.json(content_type=None)
+            if response.status >= 400:
+                message = payload.get("error", {}).get("message", response.reason)
+                raise RuntimeError(f"YouTube API 오류 ({response.status}): {message}")
+            return payload
+
+    pending = asyncio.ensure_future(request_page(None))
+    try:
+        while pending is not None:
+            batch, next_page_token = budget.consume(await pending)
+            pending = asyncio.ensure_future(request_page(next_page_token)) if next_page_token else None
+            if batch:
+                yield batch
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
@@ -0,0 +1,195 @@
+# %%
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+# %%
+# 스크립트 요약 턴에 URL이 들어오면, 사용자의 답변을 기다리는 동안 댓글을 미리 받아 둡니다.
+PREFETCH_ENABLED = os.getenv("COMMENT_PREFETCH", "1") != "0"
+# 댓글 요약까지 미리 만들어 요약 캐시에 넣어 둘지 여부 (거절하면 LLM 비용이 낭비되므로 기본은 끔)
+PREFETCH_SUMMARY = os.getenv("COMMENT_PREFETCH_SUMMARY", "0") == "1"
+PREFETCH_TTL_SECONDS = float(os.getenv("COMMENT_PREFETCH_TTL_SECONDS", "600"))  # 이 시간이 지나면 결과를 버림
+PREFETCH_WAIT_SECONDS = float(os.getenv("COMMENT_PREFETCH_WAIT_SECONDS", "15"))  # 아직 진행 중일 때 기다릴 최대 시간
+PREFETCH_MAX_WORKERS = int(os.getenv("COMMENT_PREFETCH_MAX_WORKERS", "4"))
+PREFETCH_MAX_ENTRIES = int(os.getenv("COMMENT_PREFETCH_MAX_ENTRIES", "64"))
+
+
+# %%
+def current_session() -> str:
+    """지금 실행 중인 그래프 config의 thread_id를 반환합니다. (미리 받기 작업을 기다리는 세션 구분용, 없으면 "")"""
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    config = var_child_runnable_config.get() or {}
+    return str((config.get("configurable") or {}).get("thread_id") or "")
+
+
+class _Prefetch:
+    __slots__ = ("future", "cancelled", "started_at", "sessions")
+
+    def __init__(self, future: Future, cancelled: threading.Event):
+        self.future = future
+        self.cancelled = cancelled
+        self.started_at = time.monotonic()
+        self.sessions: Set[str] = set()  # 결과를 기다리는 세션(thread_id)
+
+
+class CommentPrefetcher:
+    """
+    영상 ID별로 백그라운드 작업(댓글 수집, 선택적으로 요약)을 미리 시작해 두고 결과를 보관합니다.
+
+    - 같은 영상의 작업은 한 번만 시작하고, 여러 세션이 결과를 함께 사용합니다.
+      작업마다 관심 있는 세션(thread_id)을 세어 두고, 결과를 가져가거나 거절한 세션은 목록에서 뺍니다.
+    - 사용자가 거절하면 cancel()로 그 세션을 빼고, 기다리는 세션이 하나도 남지 않았을 때만 작업을 멈추고 결과를 버립니다.
+    - 결과는 ttl_seconds가 지나면 만료되고, 보관 개수가 max_entries를 넘으면 오래된 것부터 버립니다.
+    - 작업 함수는 취소 여부를 알려 주는 threading.Event를 인자로 받아, 중간중간 확인해야 합니다.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = PREFETCH_TTL_SECONDS,
+        max_workers: int = PREFETCH_MAX_WORKERS,
+        max_entries: int = PREFETCH_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="comment-prefetch")
+        self._entries: Dict[str, _Prefetch] = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.expired = 0
+
+    def _expired(self, entry: _Prefetch, now: float) -> bool:
+        return now - entry.started_at > self.ttl_seconds
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key)
+        entry.cancelled.set()
+        entry.future.cancel()
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if self._expired(entry, now)]:
+            self._discard(key)
+            self.expired += 1
+        # dict는 삽입 순서를 유지하므로 앞쪽이 가장 오래된 작업입니다.
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+            self.expired += 1
+
+    def start(self, key: str, job: Callable[[threading.Event], Any], session: str = "") -> bool:
+        """
+        key에 대한 작업이 없으면 백그라운드에서 시작합니다. 새로 시작했으면 True를 반환합니다.
+        이미 진행 중이면 session만 관심 목록에 더합니다.
+        """
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.sessions.add(session)
+                return False
+            cancelled = threading.Event()
+            entry = self._entries[key] = _Prefetch(self._executor.submit(job, cancelled), cancelled)
+            entry.sessions.add(session)
+            self.started += 1
+        print(f"🔮 댓글 미리 받기 시작: {key}")
+        return True
+
+    def _claim(self, key: str, session: Optional[str]) -> Optional[Future]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, time.monotonic()):
+                self._discard(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            if session is not None:
+                entry.sessions.discard(session)  # 결과를 가져간 세션은 더 이상 기다리지 않음
+            return entry.future
+
+    def _finish(self, key: str, future: Future, result):
+        with self._lock:
+            if result is not None:
+                self.hits += 1
+                return result
+            self.misses += 1
+            # 실패한 작업은 다음 턴에서 다시 시작할 수 있도록 지웁니다.
+            entry = self._entries.get(key)
+            if entry is not None and entry.future is future and future.done():
+                del self._entries[key]
+        return None
+
+    def take(self, key: str, timeout: float = PREFETCH_WAIT_SECONDS, session: Optional[str] = None):
+        """
+        미리 받아 둔 결과를 반환합니다. 진행 중이면 timeout초까지 기다리고, 없거나 실패하면 None입니다.
+        session을 주면 그 세션을 관심 목록에서 뺍니다. (결과는 다른 세션을 위해 TTL까지 남겨 둠)
+        """
+        future = self._claim(key, session)
+        if future is None:
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except (Exception, CancelledError) as e:  # 시간 초과/작업 실패/취소 시 호출한 쪽에서 평소처럼 직접 수집
+            print(f"⚠️ 미리 받은 댓글을 쓸 수 없어 직접 수집합니다: {key} - {type(e).__name__} {e}")
+            result = None
+        return self._finish(key, future, result)
+
+    async def atake(self, key: str, timeout: float = PREFETCH_WAIT_SECONDS, session: Optional[str] = None):
+        """take의 비동기 버전입니다. 기다리는 동안 이벤트 루프를 막지 않습니다."""
+        import asyncio
+
+        future = self._claim(key, session)
+        if future is None:
+            return None
+        try:
+            # shield: 기다리기를 그만둬도 다른 세션이 쓸 수 있도록 백그라운드 작업은 취소하지 않습니다.
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except CancelledError:
+            if not future.cancelled():  # 호출한 태스크 자체가 취소된 경우
+                raise
+            result = None
+        except Exception as e:
+            print(f"⚠️ 미리 받은 댓글을 쓸 수 없어 직접 수집합니다: {key} - {type(e).__name__} {e}")
+            result = None
+        return self._finish(key, future, result)
+
+    def cancel(self, key: str, session: str = "") -> bool:
+        """
+        session이 거절했음을 알립니다. 같은 작업을 기다리는 다른 세션이 없으면 작업을 멈추고 결과를 버리고 True를,
+        다른 세션이 아직 기다리고 있으면 session만 빼고 False를 반환합니다.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            entry.sessions.discard(session)
+            if entry.sessions:
+                return False
+            self._discard(key)
+            self.cancelled += 1
+        print(f"🗑️ 댓글 미리 받기 취소: {key}")
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            used = self.hits + self.misses
+            return {
+                "pending": sum(not entry.future.done() for entry in self._entries.values()),
+                "entries": len(self._entries),
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "cancelled": self.cancelled,
+                "expired": self.expired,
+                "hit_rate": self.hits / used if used else 0.0,
+            }
+
+
+# %%
+comment_prefetcher = CommentPrefetcher()
@@ -0,0 +1,142 @@
+# %%
+import json
+import re
+import unicodedata
+from typing import Optional, Sequence
+
+import numpy as np
+
+from json_stream import JsonStreamError, loads_llm_json
+
+# %%
+# 긍정/부정 키워드 어간
+POSITIVE_TERMS = (
+    "좋", "감사", "고마", "최고", "짱", "대박", "추천", "도움", "효과", "쉽", "재밌", "재미있",
+    "사랑", "힐링", "멋지", "멋있", "굿", "편해", "편하", "개운", "시원", "ㄱㅅ",
+    "good", "great", "love", "thank", "amazing", "awesome", "helpful", "best", "nice", "perfect",
+    "👍", "❤", "😍", "🔥",
+)
+NEGATIVE_TERMS = (
+    "싫", "별로", "최악", "아프", "아파", "아팠", "통증", "힘들", "어렵", "어려", "실망", "지루",
+    "사기", "부상", "다쳤", "다치", "광고",
+    "bad", "worst", "hate", "boring", "pain", "hurt", "useless", "difficult",
+    "👎",
+)
+# 긍정 어간을 포함하지만 부정의 뜻인 표현: 긍정이 아니라 부정 1회로 셉니다.
+NEGATED_POSITIVE_PHRASES = (
+    "안 좋", "안좋", "좋지 않", "좋지않", "별로 안 좋", "도움이 안", "도움 안", "효과 없", "효과가 없",
+    "not good", "not great", "not helpful",
+)
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+# %%
+def _normalize(text: str) -> str:
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def _alternation(terms: Sequence[str]) -> str:
+    # 긴 표현부터 시도해야 "좋지 않"이 "좋"보다 먼저 매칭됩니다.
+    return "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+
+
+# 부정된 긍정 표현을 먼저 매칭하므로 그 안의 긍정 어간은 따로 세지 않습니다.
+_TERM_RE = re.compile(
+    f"(?P<negated>{_alternation(NEGATED_POSITIVE_PHRASES)})"
+    f"|(?P<positive>{_alternation(POSITIVE_TERMS)})"
+    f"|(?P<negative>{_alternation(NEGATIVE_TERMS)})"
+)
+
+
+def _count_terms(comments: Sequence[str]) -> tuple:
+    """
+    (긍정 횟수, 부정 횟수) 배열을 댓글별로 반환합니다.
+    모든 댓글을 한 문자열로 이어 정규식을 한 번만 돌리고, 매칭 위치를 np.searchsorted로 댓글에 배정합니다.
+    """
+    normalized = [_normalize(comment) for comment in comments]
+    lengths = np.fromiter((len(text) + 1 for text in normalized), dtype=np.int64, count=len(normalized))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    positions, kinds = [], []
+    for match in _TERM_RE.finditer("\n".join(normalized)):
+        positions.append(match.start())
+        kinds.append(match.lastgroup != "positive")  # 부정 표현과 부정된 긍정 표현은 모두 부정으로 셈
+    owners = np.searchsorted(starts, np.asarray(positions, dtype=np.int64), side="right") - 1
+    kinds = np.asarray(kinds, dtype=bool)
+    positive = np.bincount(owners[~kinds], minlength=len(comments))
+    negative = np.bincount(owners[kinds], minlength=len(comments))
+    return positive, negative
+
+
+class SentimentTally:
+    """
+    댓글을 배치 단위로 받아 score_comments와 같은 결과를 누적 계산합니다.
+    댓글 수집기가 다음 페이지를 받는 동안 이미 받은 페이지를 채점해, 수집이 끝나면 긍정 비율도 바로 나오게 합니다.
+    """
+
+    def __init__(self):
+        self.positive_hits = 0
+        self.negative_hits = 0
+        self.positive_comments = 0
+        self.negative_comments = 0
+        self.neutral_comments = 0
+        self.comments_scored = 0
+
+    def add(self, comments: Sequence[str]):
+        if not comments:
+            return
+        positive, negative = _count_terms(comments)
+        self.positive_hits += int(positive.sum())
+        self.negative_hits += int(negative.sum())
+        self.positive_comments += int((positive > negative).sum())
+        self.negative_comments += int((negative > positive).sum())
+        self.neutral_comments += int((positive == negative).sum())
+        self.comments_scored += len(comments)
+
+    def result(self) -> dict:
+        total_hits = self.positive_hits + self.negative_hits
+        return {
+            "positive_percentage": round(self.positive_hits / total_hits * 100) if total_hits else None,
+            "positive_hits": self.positive_hits,
+            "negative_hits": self.negative_hits,
+            "positive_comments": self.positive_comments,
+            "negative_comments": self.negative_comments,
+            "neutral_comments": self.neutral_comments,
+            "comments_scored": self.comments_scored,
+        }
+
+
+def score_comments(comments: Sequence[str]) -> dict:
+    """
+    수집한 모든 댓글의 긍정/부정 키워드를 세어 긍정 비율을 계산합니다. (LLM 호출 없음, 실행마다 같은 결과)
+
+    Returns:
+        {
+            "positive_percentage": 긍정 키워드 / 전체 감성 키워드 × 100 (정수, 감성 키워드가 없으면 None),
+            "positive_hits", "negative_hits": 키워드 등장 횟수,
+            "positive_comments", "negative_comments", "neutral_comments": 댓글 단위 분류 결과,
+            "comments_scored": 채점한 댓글 수,
+        }
+    """
+    tally = SentimentTally()
+    tally.add(comments)
+    return tally.result()
+
+
+def inject_sentiment(summary: str, sentiment: dict) -> str:
+    """
+    LLM이 만든 댓글 요약 JSON의 overall_sentiment.positive_percentage를 로컬 계산 값으로 채웁니다.
+    JSON으로 읽을 수 없는 응답은 그대로 반환합니다.
+    """
+    try:
+        parsed = loads_llm_json(summary)
+    except JsonStreamError:
+        return summary
+    if not isinstance(parsed, dict):
+        return summary
+
+    overall: Optional[dict] = parsed.get("overall_sentiment")
+    if not isinstance(overall, dict):
+        overall = parsed["overall_sentiment"] = {}
+    overall["positive_percentage"] = sentiment.get("positive_percentage")
+    return json.dumps(parsed, ensure_ascii=False, indent=2)
@@ -0,0 +1,156 @@
+# %%
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from instrumentation import record_api_call, record_cache
+
+# %%
+# 캐시 설정 (환경 변수로 덮어쓸 수 있음)
+DEFAULT_DB_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+# %%
+class EmbeddingCache:
+    """
+    댓글 임베딩을 SQLite에 저장하는 캐시입니다.
+
+    키는 (임베딩 모델 이름, 댓글 텍스트 해시)입니다.
+    - 벡터는 float32 바이트로 저장해 용량을 줄입니다.
+    - 항목 수가 max_entries를 넘으면 가장 오래 사용되지 않은 항목부터 삭제합니다.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_accessed ON embeddings (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """텍스트 목록의 캐시된 벡터를 반환합니다. 없는 항목은 None입니다."""
+        hashes = [_sha256(text) for text in texts]
+        found = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # SQLite 변수 개수 제한을 넘지 않도록 나눠서 조회
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                found.update({text_hash: np.frombuffer(vector, dtype=np.float32) for text_hash, vector in rows})
+                conn.execute(
+                    f"UPDATE embeddings SET accessed_at = ? WHERE model = ? AND text_hash IN ({placeholders})",
+                    [now, model, *chunk],
+                )
+            conn.commit()
+            result = [found.get(text_hash) for text_hash in hashes]
+            self.hits += sum(vector is not None for vector in result)
+            self.misses += sum(vector is None for vector in result)
+            return result
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """벡터를 저장하고, 항목 수가 넘치면 오래된 항목을 삭제합니다."""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((model, _sha256(text), len(array), array.tobytes(), now))
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                """DELETE FROM embeddings WHERE rowid IN (
+                       SELECT rowid FROM embeddings ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                   )""",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def stats(self) -> dict:
+        """hit/miss 카운터와 현재 저장된 항목 수를 반환합니다."""
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
+
+
+# %%
+embedding_cache = EmbeddingCache()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    다른 Embeddings 구현을 감싸, 캐시에 없는 텍스트만 한 번에 모아 임베딩합니다.
+    같은 댓글은 영상/실행이 달라도 다시 임베딩하지 않습니다.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache = embedding_cache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        """임베딩을 (텍스트 수, 차원) float32 배열로 반환합니다. (군집화에서 리스트 변환 없이 사용)"""
+        vectors = self.cache.get_many(self.model_name, texts)
+        missing = sorted({text for text, vector in zip(texts, vectors) if vector is None})
+        misses = sum(vector is None for vector in vectors)
+        record_cache("embedding", hits=len(vectors) - misses, misses=misses)
+        if missing:
+            record_api_call(f"embeddings.{self.model_name}", sum(len(text.encode("utf-8")) for text in missing))
+            fresh = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self.cache.put_many(self.model_name, missing, [fresh[text] for text in missing])
+            vectors = [vector if vector is not None else np.asarray(fresh[text], dtype=np.float32)
+                       for text, vector in zip(texts, vectors)]
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
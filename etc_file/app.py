@@ -1,7 +1,9 @@
 import streamlit as st
 import os
+import time
 from dotenv import load_dotenv
-from etc_file.llm import get_ai_message_v2
+from etc_file.llm import stream_ai_message
+from ui_stream import StreamingPlaceholder
 
 st.set_page_config(
     page_title="유튜브 분석 챗봇",
@@ -25,10 +27,24 @@ if user_question := st.chat_input(placeholder="유튜브 URL을 입력하거나
         st.write(user_question)
     st.session_state.message_list.append({"role": "user", "content": user_question})
 
-    with st.spinner("AI가 답변을 생성하는 중입니다..."):
-        ai_response_stream = get_ai_message_v2(user_question)
-        ai_message = ""
-        for chunk in ai_response_stream:
-            ai_message = chunk  # 마지막 chunk만 저장 (스트림이지만 대부분 1회)
-            st.write(ai_message)
-        st.session_state.message_list.append({"role": "ai", "content": ai_message})
\ No newline at end of file
+    # 작업(스크립트/댓글)마다 자리를 만들어 두고, 토큰이 도착하는 대로 이어 붙여 보여 줍니다.
+    titles = {"script_summary": "#### 📄 스크립트 요약", "comment_summary": "#### 💬 댓글 요약"}
+    with st.chat_message("ai"):
+        views, ai_message = {}, {}
+        started = time.perf_counter()
+        for event in stream_ai_message(user_question):
+            if event["type"] == "error":
+                st.write(event["message"])
+                ai_message = event["message"]
+                break
+            key = event["key"]
+            if key not in views:
+                views[key] = StreamingPlaceholder(titles.get(key), started)
+            if event["type"] == "token":
+                views[key].append(event["text"])
+            elif event["type"] == "reset":
+                views[key].reset()
+            else:
+                ai_message.update(event["value"])
+                views[key].finish(event["value"][key])
+    st.session_state.message_list.append({"role": "ai", "content": ai_message})
@@ -1,19 +1,24 @@
 # %%
-import os
 from typing import List
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from llm_factory import get_chat_model
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from urllib.parse import urlparse, parse_qs
 from dotenv import load_dotenv
-import googleapiclient.discovery
+from youtube_client import get_youtube_client
+from rate_limiter import acquire_youtube
+from comment_dedup import cluster_comments
+from comment_clustering import get_comment_embeddings, representative_comments
+from comment_sentiment import score_comments, inject_sentiment
+from instrumentation import instrument_node
+from resilience import call_llm
 
 # %%
 load_dotenv()
-llm = ChatOpenAI(model="gpt-4o", streaming=True)
-small_llm = ChatOpenAI(model="gpt-4o-mini", streaming=True)
-embedding = OpenAIEmbeddings(model="text-embedding-3-large")
+llm = get_chat_model("gpt-4o", streaming=True)
+small_llm = get_chat_model("gpt-4o-mini", streaming=True)
+embedding = get_comment_embeddings()  # 임베딩 캐시를 거침 (COMMENT_EMBEDDER=local이면 오프라인 임베딩)
 
 # %%
 @tool
@@ -35,8 +40,8 @@ def get_youtube_comments_for_url(youtube_url: str, max_results: int = 30) -> dic
         return {"error": "유효한 유튜브 URL이 아닙니다."}
     
     try:
-        api_key = os.getenv("YOUTUBE_API_KEY")
-        youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
+        youtube = get_youtube_client()
+        acquire_youtube("commentThreads.list")
         request = youtube.commentThreads().list(
             part="snippet", videoId=video_id, maxResults=100, order="relevance"
         )
@@ -67,12 +72,17 @@ if __name__ == "__main__":
 @tool
 def generate_initial_summary_report(comments: List[str], video_id: str) -> str:
     """수집된 댓글 목록을 바탕으로 영상에 대한 초기 요약 리포트를 JSON 형식으로 생성합니다."""
-    # 댓글 목록을 하나의 문자열로 합침
+    # 긍정 비율은 모든 댓글을 대상으로 로컬에서 계산 (LLM은 서술만 작성)
+    sentiment = score_comments(comments)
+    # 중복 댓글을 묶고, 댓글이 많으면 임베딩 군집의 대표 댓글만 남겨 프롬프트 크기를 고정
+    clusters = cluster_comments(comments)
+    comments = representative_comments([c["text"] for c in clusters], [c["count"] for c in clusters], embedding)
     comments_str = "\n- ".join(comments)
     
     prompt = PromptTemplate.from_template(
         """당신은 주어진 유튜브 댓글들을 분석하여 전문적인 요약 리포트를 JSON 형식으로만 생성하는 AI 전문가입니다.
         댓글은 한국어와 영어가 섞여 있을 수 있습니다. 영어가 있다면 내용을 파악하여 한국어 기반으로 분석에 포함시켜야 합니다.
+        댓글 끝의 "(×N)"은 비슷한 댓글이 N개 있었다는 뜻입니다. 반응의 비중을 판단할 때 N개로 계산하세요.
 
         [분석할 댓글 내용]
         - {comments_str}
@@ -82,14 +92,15 @@ def generate_initial_summary_report(comments: List[str], video_id: str) -> str:
 
         ## 반드시 아래 JSON 형식을 준수하여 응답해주세요:
         {{
-          "overall_sentiment": {{"description": "전반적인 댓글 반응을 요약 서술", "positive_percentage": "긍정 반응의 비율 (정수만, 예: 85)"}},
+          "overall_sentiment": {{"description": "전반적인 댓글 반응을 요약 서술"}},
           "key_topics": ["주요 키워드 1", "주요 키워드 2", "주요 키워드 3", "주요 키워드 4"],
           "user_tips": ["사용자 팁 요약 1", "사용자 팁 요약 2"],
           "faq": ["자주 묻는 질문 요약 1", "자주 묻는 질문 요약 2"]
         }}"""
     )
     chain = prompt | llm | StrOutputParser()
-    return chain.invoke({"comments_str": comments_str, "video_id": video_id})
+    report = call_llm("gpt-4o", lambda: chain.invoke({"comments_str": comments_str, "video_id": video_id}), name="comment_analysis.report")
+    return inject_sentiment(report, sentiment)
 
 # %%
 from langgraph.prebuilt import ToolNode
@@ -118,7 +129,8 @@ def agent(state: AgentState) -> AgentState:
         "필요할 때는 get_youtube_comments_for_url, generate_initial_summary_report 도구를 적절히 사용해. "
         "질문이 URL과 관련된 경우 반드시 댓글을 수집하고, 요약 리포트를 만들어줘.")
     messages = [system_msg] + state["messages"]
-    response = llm_with_tools.invoke(messages)
+    # 재시도 / 마감 시각(stream_ai_message의 작업별 제한 시간)은 call_llm이 맡습니다.
+    response = call_llm("gpt-4o", lambda: llm_with_tools.invoke(messages), name="comment_analysis.agent")
     return {"messages": state["messages"] + [response]}
 
 # %%
@@ -126,8 +138,8 @@ def agent(state: AgentState) -> AgentState:
 from langgraph.graph import MessagesState
 
 graph_builder = StateGraph(MessagesState)
-graph_builder.add_node('agent', agent)
-graph_builder.add_node('tools', tool_node)
+graph_builder.add_node('agent', instrument_node("comment_analysis", "agent", agent))
+graph_builder.add_node('tools', instrument_node("comment_analysis", "tools", tool_node))
 
 graph_builder.add_edge(START, 'agent')
 graph_builder.add_conditional_edges('agent', tools_condition)
@@ -139,10 +151,11 @@ graph
 
 # %%
 # 실행 예시
-query = "https://www.youtube.com/watch?v=itJE4neqDJw 이거 댓글 리포트 만들어줘"
-init_state = {"messages": [HumanMessage(content=query)]}
+if __name__ == "__main__":
+    query = "https://www.youtube.com/watch?v=itJE4neqDJw 이거 댓글 리포트 만들어줘"
+    init_state = {"messages": [HumanMessage(content=query)]}
 
-for chunk in graph.stream(init_state, stream_mode='values'):
-    chunk['messages'][-1].pretty_print()
+    for chunk in graph.stream(init_state, stream_mode='values'):
+        chunk['messages'][-1].pretty_print()
 
 
@@ -6,7 +6,7 @@ answer_examples = [
     {
         "input": "댓글 내용을 요약해줘",
         "answer": """{
-        "overall_sentiment": {"description": "전반적으로 긍정적인 반응", "positive_percentage": "90"},
+        "overall_sentiment": {"description": "전반적으로 긍정적인 반응", "positive_percentage": 90},
         "key_topics": ["운동", "스트레칭", "효과", "자세"],
         "user_tips": ["자세를 천천히 따라하세요", "호흡을 신경쓰세요"],
         "faq": ["이 운동은 초보자도 할 수 있나요?", "운동 시간은 얼마나 되나요?"]
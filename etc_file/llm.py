@@ -1,8 +1,14 @@
+import os
 import re
-import json
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from etc_file.comment_agent import graph as comment_agent
 from script_agent_04 import graph as script_agent
 from langchain_core.messages import HumanMessage
+from json_stream import JsonStreamError, loads_llm_json
+from resilience import with_deadline
 
 def extract_youtube_url(text):
     """텍스트에서 유튜브 URL을 추출합니다."""
@@ -11,50 +17,161 @@ def extract_youtube_url(text):
 
 def _clean_and_parse_json(content: str) -> dict:
     """LLM의 응답에서 마크다운을 제거하고 JSON으로 파싱합니다."""
-    if content.strip().startswith("```json"):
-        start_index = content.find('{')
-        end_index = content.rfind('}')
-        if start_index != -1 and end_index != -1:
-            content = content[start_index : end_index + 1]
-    
     try:
-        return json.loads(content)
-    except json.JSONDecodeError:
+        return loads_llm_json(content)
+    except JsonStreamError:
         # 파싱 실패 시 원본 텍스트나 에러 메시지를 포함한 객체를 반환할 수 있습니다.
         return {"error": "JSON 파싱에 실패했습니다.", "original_content": content}
 
-def get_ai_message_v2(user_message: str):
+# 두 에이전트를 동시에 실행하기 위한 공용 스레드 풀과 작업별 제한 시간(초)
+BRANCH_TIMEOUT_SECONDS = {
+    "script_summary": float(os.getenv("SCRIPT_BRANCH_TIMEOUT_SECONDS", "120")),
+    "comment_summary": float(os.getenv("COMMENT_BRANCH_TIMEOUT_SECONDS", "120")),
+}
+_branch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-branch")
+
+# 작업별로 최종 답변을 만드는 노드 (이 노드의 토큰만 화면에 스트리밍)
+STREAM_NODES = {
+    "script_summary": "summarize_transcript",
+    "comment_summary": "agent",
+}
+
+class _BranchCancelled(Exception):
+    pass
+
+def _stream_agent(key: str, agent, youtube_url: str, events: queue.Queue, cancelled: threading.Event, timeout: float) -> dict:
     """
-    [스트리밍 버전] 사용자 메시지를 분석하여,
-    완료되는 작업의 결과를 순차적으로 yield 합니다.
+    에이전트를 stream_mode="messages"로 실행하면서 최종 답변 노드의 토큰을 events 큐에 넣고, 최종 상태를 반환합니다.
+    cancelled가 설정되면(소비자 중단) 다음 토큰에서 실행을 멈춥니다.
+    토큰이 더 오지 않는 멈춘 스트림은 토큰 사이에서 확인할 수 없으므로, 제한 시간을 resilience 마감 시각으로 넘겨
+    call_llm을 거치는 LLM 호출이 그 시각에 기다림을 끝내고 이 스레드를 돌려주게 합니다.
+    """
+    final_state, message_id = {}, None
+    agent_input = {"messages": [HumanMessage(content=youtube_url)]}
+    config = with_deadline(None, timeout)
+    for mode, chunk in agent.stream(agent_input, config=config, stream_mode=["messages", "values"]):
+        if cancelled.is_set():
+            raise _BranchCancelled()
+        if mode == "values":
+            final_state = chunk
+            continue
+        message, metadata = chunk
+        if metadata.get("langgraph_node") != STREAM_NODES[key] or not isinstance(message.content, str) or not message.content:
+            continue
+        if message.id != message_id:
+            # 도구 호출 앞의 중간 답변 등, 새 메시지가 시작되면 화면의 이전 내용을 지웁니다.
+            message_id = message.id
+            events.put({"type": "reset", "key": key})
+        events.put({"type": "token", "key": key, "text": message.content})
+    return final_state
+
+def _run_script_branch(youtube_url: str, events: queue.Queue, cancelled: threading.Event, timeout: float) -> dict:
+    print("🤖 스크립트 요약을 시작합니다...")
+    result = {}
+    try:
+        final_script_state = _stream_agent("script_summary", script_agent, youtube_url, events, cancelled, timeout)
+        script_content = final_script_state['messages'][-1].content
+        result['script_summary'] = _clean_and_parse_json(script_content)
+    except _BranchCancelled:
+        raise
+    except Exception as e:
+        result['script_summary'] = {"error": f"스크립트 에이전트 실행 중 오류 발생: {e}"}
+    return result
+
+def _run_comment_branch(youtube_url: str, events: queue.Queue, cancelled: threading.Event, timeout: float) -> dict:
+    print("🤖 댓글 요약을 시작합니다...")
+    result = {}
+    try:
+        final_comment_state = _stream_agent("comment_summary", comment_agent, youtube_url, events, cancelled, timeout)
+        comment_content = final_comment_state['messages'][-1].content
+        result['comment_summary'] = comment_content
+    except _BranchCancelled:
+        raise
+    except Exception as e:
+        result['comment_summary'] = f"댓글 에이전트 실행 중 오류 발생: {e}"
+    return result
+
+def _timeout_result(key: str, timeout: float) -> dict:
+    message = f"{timeout:g}초 안에 응답을 받지 못해 작업을 취소했습니다."
+    if key == "script_summary":
+        return {key: {"error": message}}
+    return {key: message}
+
+def _branch_worker(key: str, run_branch, youtube_url: str, events: queue.Queue, cancelled: threading.Event, timeout: float):
+    try:
+        result = run_branch(youtube_url, events, cancelled, timeout)
+    except _BranchCancelled:
+        return
+    events.put({"type": "result", "key": key, "value": result})
+
+def stream_ai_message(user_message: str, timeouts: dict = None):
+    """
+    [토큰 스트리밍 버전] 사용자 메시지를 분석해 작업을 동시에 실행하고, 이벤트를 도착하는 대로 yield 합니다.
+
+    Yields:
+        {"type": "token", "key": 작업 키, "text": 토큰}  - 최종 답변 노드의 LLM 토큰
+        {"type": "reset", "key": 작업 키}                 - 새 메시지 시작 (이전 토큰 지우기)
+        {"type": "result", "key": 작업 키, "value": {작업 키: 결과}} - 작업 완료 또는 제한 시간 초과
+        {"type": "error", "message": 메시지}              - 요청 자체를 처리할 수 없을 때
     """
     youtube_url = extract_youtube_url(user_message)
     if not youtube_url:
-        yield {"error": "메시지에서 유튜브 URL을 찾을 수 없습니다."}
+        yield {"type": "error", "message": "메시지에서 유튜브 URL을 찾을 수 없습니다."}
         return
 
-    # 1. 스크립트 요약 처리 및 결과 반환
+    timeouts = {**BRANCH_TIMEOUT_SECONDS, **(timeouts or {})}
+    branches = []
     if "스크립트" in user_message:
-        print("🤖 스크립트 요약을 시작합니다...")
-        result = {}
-        try:
-            script_input = {"messages": [HumanMessage(content=youtube_url)]}
-            final_script_state = script_agent.invoke(script_input)
-            script_content = final_script_state['messages'][-1].content
-            result['script_summary'] = _clean_and_parse_json(script_content)
-        except Exception as e:
-            result['script_summary'] = {"error": f"스크립트 에이전트 실행 중 오류 발생: {e}"}
-        yield result
-
-    # 2. 댓글 요약 처리 및 결과 반환
+        branches.append(("script_summary", _run_script_branch))
     if "댓글" in user_message:
-        print("🤖 댓글 요약을 시작합니다...")
-        result = {}
-        try:
-            comment_input = {"messages": [HumanMessage(content=youtube_url)]}
-            final_comment_state = comment_agent.invoke(comment_input)
-            comment_content = final_comment_state['messages'][-1].content
-            result['comment_summary'] = comment_content
-        except Exception as e:
-            result['comment_summary'] = f"댓글 에이전트 실행 중 오류 발생: {e}"
-        yield result
\ No newline at end of file
+        branches.append(("comment_summary", _run_comment_branch))
+
+    events: queue.Queue = queue.Queue()
+    started = time.monotonic()
+    deadlines = {key: started + timeouts[key] for key, _ in branches}
+    cancelled = {key: threading.Event() for key, _ in branches}
+    futures = {
+        key: _branch_executor.submit(_branch_worker, key, run_branch, youtube_url, events, cancelled[key], timeouts[key])
+        for key, run_branch in branches
+    }
+    pending = set(futures)
+    try:
+        while pending:
+            next_deadline = min(deadlines[key] for key in pending)
+            try:
+                event = events.get(timeout=max(0.0, next_deadline - time.monotonic()))
+            except queue.Empty:
+                event = None
+            if event is not None and event["key"] in pending:
+                if event["type"] == "result":
+                    pending.discard(event["key"])
+                yield event
+
+            now = time.monotonic()
+            for key in [k for k in pending if deadlines[k] <= now]:
+                # 실행 중인 작업은 다음 토큰이나 마감 시각에 멈추고, 아직 시작 전이면 실행 자체를 취소합니다.
+                cancelled[key].set()
+                futures[key].cancel()
+                pending.discard(key)
+                print(f"⏱️ {key} 작업이 제한 시간({timeouts[key]}초)을 넘겨 취소되었습니다.")
+                yield {"type": "result", "key": key, "value": _timeout_result(key, timeouts[key])}
+    finally:
+        # 화면이 다시 그려지는 등 소비자가 중간에 멈추면 남은 작업을 취소합니다.
+        for key in pending:
+            cancelled[key].set()
+            futures[key].cancel()
+
+def get_ai_message_v2(user_message: str, timeouts: dict = None):
+    """
+    [스트리밍 버전] 사용자 메시지를 분석하여,
+    완료되는 작업의 결과를 순차적으로 yield 합니다.
+
+    스크립트 요약과 댓글 요약을 모두 요청하면 두 에이전트를 동시에 실행하고,
+    먼저 끝난 결과부터 yield 합니다. 작업별 제한 시간(timeouts, 기본값 BRANCH_TIMEOUT_SECONDS)을
+    넘긴 작업은 취소하고 오류 결과를 yield 합니다. 토큰 단위로 받으려면 stream_ai_message를 사용하세요.
+    """
+    for event in stream_ai_message(user_message, timeouts):
+        if event["type"] == "error":
+            yield {"error": event["message"]}
+        elif event["type"] == "result":
+            yield event["value"]
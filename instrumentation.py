@@ -0,0 +1,490 @@
+# %%
+# 그래프 노드 계측: 노드별 실행 시간, LLM 토큰, 외부 API 호출 수/응답 크기, 캐시 적중을 한곳에 모읍니다.
+#
+# - 노드는 instrument_node()로 감싸 등록합니다. 노드가 실행되는 동안의 LLM 호출/API 호출/캐시 조회는
+#   contextvars로 현재 노드(span)에 자동으로 귀속됩니다. (LangGraph/LangChain 워커 스레드도 context를 복사해 실행)
+# - render_prometheus() / start_metrics_server()로 Prometheus 텍스트 형식 지표를,
+#   TRACE_FILE 환경 변수로 OTLP JSON(한 줄에 ExportTraceServiceRequest 하나) 트레이스 파일을 내보냅니다.
+# - Streamlit 워커 import 시간을 늘리지 않도록 이 모듈은 표준 라이브러리만 import합니다.
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# %%
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION", "1") != "0"
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # 비어 있으면 트레이스 파일을 쓰지 않음
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0이면 /metrics 서버를 띄우지 않음
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "youtube_agent")
+METRIC_PREFIX = "youtube_agent"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_HELP = {
+    "node_duration_seconds": ("histogram", "노드 실행 시간(초)"),
+    "node_runs_total": ("counter", "노드 실행 횟수 (status=ok|error)"),
+    "llm_calls_total": ("counter", "LLM 호출 수"),
+    "llm_tokens_total": ("counter", "LLM 토큰 수 (type=prompt|completion)"),
+    "api_calls_total": ("counter", "외부 API 호출 수"),
+    "api_payload_bytes_total": ("counter", "외부 API 응답 크기(바이트)"),
+    "cache_requests_total": ("counter", "캐시 조회 수 (result=hit|miss)"),
+    "rate_limit_available": ("gauge", "버킷에 남아 있는 토큰 (요청 수/토큰/할당량 단위)"),
+    "rate_limit_capacity": ("gauge", "버킷 최대 용량"),
+    "rate_limit_waits_total": ("counter", "한도 때문에 대기한 호출 수"),
+    "rate_limit_wait_seconds_total": ("counter", "한도 때문에 대기한 누적 시간(초)"),
+    "llm_attempts_total": ("counter", "LLM 호출 시도 수 (재시도 포함, 헤지 제외)"),
+    "llm_retries_total": ("counter", "일시적 오류로 다시 보낸 LLM 호출 수"),
+    "llm_hedges_total": ("counter", "헤지 요청을 보낸 LLM 호출 수 (winner=primary|hedge|none)"),
+    "llm_hedges_skipped_total": ("counter", "헤지 예산을 넘어 헤지하지 않은 호출 수"),
+    "llm_circuit_state": ("gauge", "모델별 서킷 상태 (0=closed, 1=half_open, 2=open)"),
+    "llm_circuit_opened_total": ("counter", "서킷이 열린 횟수"),
+    "llm_circuit_rejections_total": ("counter", "서킷이 열려 있어 바로 실패시킨 호출 수"),
+    "deadline_exceeded_total": ("counter", "요청 마감 시각을 넘겨 중단한 호출 수"),
+    "single_flight_leaders_total": ("counter", "같은 키의 진행 중 호출이 없어 직접 실행한 호출 수"),
+    "single_flight_shared_total": ("counter", "진행 중인 같은 호출에 합류해 아낀 호출 수"),
+    "single_flight_inflight": ("gauge", "작업별 진행 중인 키 수"),
+    "model_cascade_requests_total": ("counter", "모델 단계로 처리한 요약 요청 수 (model=최종 채택 모델)"),
+    "model_cascade_escalations_total": ("counter", "검증 실패/오류로 다음 모델로 승격한 횟수 (reason=사유)"),
+    "model_cascade_model_calls_total": ("counter", "모델 단계 안에서 모델별 호출 수"),
+    "model_cascade_model_seconds_total": ("counter", "모델 단계 안에서 모델별 호출 누적 시간(초)"),
+    "model_cascade_seconds_total": ("counter", "모델 단계 요청의 누적 처리 시간(초, 승격 포함)"),
+    "model_cascade_cost_usd_total": ("counter", "추정 비용(USD) (kind=actual: 실제, baseline: 가장 큰 모델만 썼을 때)"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+# %%
+class Metrics:
+    """Prometheus 형식으로 내보낼 카운터/히스토그램 저장소입니다. (스레드 안전)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], list] = {}  # [버킷별 개수..., 합계, 개수]
+        self._collectors: List[Callable[[], list]] = []  # 내보낼 때마다 현재 값을 읽는 게이지
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> Tuple[str, Labels]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not value:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def total(self, name: str, **labels) -> float:
+        """name 카운터 중 labels를 모두 가진 항목의 합계를 반환합니다. (벤치마크/리포트용)"""
+        wanted = set(self._key(name, labels)[1])
+        with self._lock:
+            return sum(value for (key, key_labels), value in self._counters.items() if key == name and wanted <= set(key_labels))
+
+    def register_collector(self, collector: Callable[[], list]):
+        """render()할 때마다 호출해 [(이름, 라벨 dict, 값), ...] 게이지를 읽어 올 함수를 등록합니다."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def node_summary(self) -> List[dict]:
+        """노드별 실행 횟수/누적 시간/평균/전체 대비 비중을 누적 시간이 긴 순서로 반환합니다."""
+        with self._lock:
+            rows = [
+                {**dict(labels), "runs": hist[-1], "total_seconds": hist[-2]}
+                for (name, labels), hist in self._histograms.items() if name == "node_duration_seconds"
+            ]
+        total = sum(row["total_seconds"] for row in rows) or 1.0
+        for row in rows:
+            row["mean_seconds"] = row["total_seconds"] / row["runs"] if row["runs"] else 0.0
+            row["share"] = row["total_seconds"] / total
+        return sorted(rows, key=lambda row: row["total_seconds"], reverse=True)
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self) -> str:
+        """Prometheus 텍스트 노출 형식(0.0.4)으로 모든 지표를 반환합니다."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(hist)) for key, hist in self._histograms.items())
+            collectors = list(self._collectors)
+        gauges = sorted(
+            self._key(name, labels) + (value,) for collector in collectors for name, labels, value in collector()
+        )
+        lines, declared = [], set()
+
+        def declare(name: str):
+            if name not in declared:
+                declared.add(name)
+                kind, help_text = _HELP.get(name, ("counter" if name.endswith("_total") else "histogram", name))
+                lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name)
+            lines.append(f"{METRIC_PREFIX}_{name}{self._format_labels(labels)} {value:g}")
+        for name, labels, value in gauges:
+            declare(name)
+            lines.append(f"{METRIC_PREFIX}_{name}{self._format_labels(labels)} {value:g}")
+        for (name, labels), hist in histograms:
+            declare(name)
+            metric = f"{METRIC_PREFIX}_{name}"
+            for bound, count in zip(self.buckets, hist):
+                lines.append(f"{metric}_bucket{self._format_labels(labels, (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{metric}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {hist[-1]}")
+            lines.append(f"{metric}_sum{self._format_labels(labels)} {hist[-2]:.6f}")
+            lines.append(f"{metric}_count{self._format_labels(labels)} {hist[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# %%
+class Span:
+    """노드 실행 하나(또는 여러 노드를 묶는 턴 하나)의 기록입니다. OTLP JSON span으로 내보낼 수 있습니다."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "graph", "node", "attributes",
+                 "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, graph: str, node: str, parent: Optional["Span"], attributes: dict):
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.graph = graph
+        self.node = node
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error: Optional[str] = None
+
+    def add(self, key: str, value: float):
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    @staticmethod
+    def _otel_value(value) -> dict:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def to_otel(self) -> dict:
+        attributes = dict(self.attributes, **{"graph": self.graph, "node": self.node})
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": k, "value": self._otel_value(v)} for k, v in attributes.items() if v is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("instrumentation_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+# %%
+class _TraceWriter:
+    """span을 OTLP JSON 파일 형식(한 줄에 resourceSpans 하나)으로 덧붙여 씁니다."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, span: Span):
+        record = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "youtube_agent.instrumentation"}, "spans": [span.to_otel()]}],
+        }]}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+
+_trace_writer: Optional[_TraceWriter] = _TraceWriter(TRACE_FILE) if TRACE_FILE else None
+
+
+def set_trace_file(path: Optional[str]):
+    """트레이스 파일 경로를 바꿉니다. (None이나 빈 문자열이면 트레이스를 쓰지 않음)"""
+    global _trace_writer
+    _trace_writer = _TraceWriter(path) if path else None
+
+
+# %%
+@contextmanager
+def span(name: str, graph: str = "", node: str = "", **attributes):
+    """
+    span을 시작하고 현재 context의 span으로 설정합니다. 안쪽에서 시작한 span은 이 span의 자식이 됩니다.
+    node가 있으면 노드 실행 시간/횟수 지표도 남깁니다. (app2의 턴처럼 여러 노드를 묶을 때는 node 없이 사용)
+    """
+    if not INSTRUMENTATION_ENABLED:
+        yield None
+        return
+    current = Span(name, graph, node, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        if node:
+            metrics.observe("node_duration_seconds", current.duration, graph=graph, node=node)
+            metrics.inc("node_runs_total", graph=graph, node=node, status="error" if current.error else "ok")
+        if _trace_writer is not None:
+            _trace_writer.write(current)
+
+
+def _node_error(result) -> Optional[str]:
+    # 이 저장소의 노드는 예외 대신 {"error": "..."}를 반환하므로 결과도 함께 확인합니다.
+    if isinstance(result, dict) and result.get("error"):
+        return str(result["error"])
+    return None
+
+
+def instrument_node(graph: str, name: str, func, afunc: Optional[Callable] = None):
+    """
+    노드 함수(동기 func, 선택적으로 비동기 afunc)나 Runnable(ToolNode 등)을 span으로 감싼 RunnableLambda를 반환합니다.
+    graph_builder.add_node(name, instrument_node("script", name, func, afunc)) 형태로 등록합니다.
+    """
+    from langchain_core.runnables import RunnableLambda
+
+    if not INSTRUMENTATION_ENABLED:
+        return func if hasattr(func, "invoke") else RunnableLambda(func, afunc=afunc, name=name)
+
+    def run(call, *args, **kwargs):
+        with span(f"{graph}.{name}", graph=graph, node=name) as current:
+            result = call(*args, **kwargs)
+            current.error = _node_error(result)
+            return result
+
+    async def arun(call, *args, **kwargs):
+        with span(f"{graph}.{name}", graph=graph, node=name) as current:
+            result = await call(*args, **kwargs)
+            current.error = _node_error(result)
+            return result
+
+    if hasattr(func, "invoke"):  # Runnable (ToolNode 등): config를 그대로 넘겨야 하므로 config를 받는 함수로 감쌉니다.
+        runnable = func
+
+        def invoke(state, config):
+            return run(runnable.invoke, state, config)
+
+        async def ainvoke(state, config):
+            return await arun(runnable.ainvoke, state, config)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=name)
+
+    # functools.wraps: RunnableLambda가 원래 함수의 시그니처(config 인자 여부 등)를 보도록 합니다.
+    @functools.wraps(func)
+    def sync(*args, **kwargs):
+        return run(func, *args, **kwargs)
+
+    wrapped_async = None
+    if afunc is not None:
+        @functools.wraps(afunc)
+        async def wrapped_async(*args, **kwargs):
+            return await arun(afunc, *args, **kwargs)
+    return RunnableLambda(sync, afunc=wrapped_async, name=name)
+
+
+# %%
+# 노드 안에서 호출하는 기록 함수 (현재 span이 없으면 graph/node 라벨이 빈 값으로 남음: 미리 받기 등 백그라운드 작업)
+def _labels(current: Optional[Span]) -> dict:
+    return {"graph": current.graph, "node": current.node} if current is not None else {"graph": "", "node": ""}
+
+
+def record_llm_usage(model: str, prompt_tokens: int, completion_tokens: int, current: Optional[Span] = None):
+    if not INSTRUMENTATION_ENABLED:
+        return
+    current = current or _current_span.get()
+    labels = _labels(current)
+    metrics.inc("llm_calls_total", model=model, **labels)
+    metrics.inc("llm_tokens_total", prompt_tokens, model=model, type="prompt", **labels)
+    metrics.inc("llm_tokens_total", completion_tokens, model=model, type="completion", **labels)
+    if current is not None:
+        current.add("llm.calls", 1)
+        current.add("llm.prompt_tokens", prompt_tokens)
+        current.add("llm.completion_tokens", completion_tokens)
+
+
+def record_api_call(api: str, payload_bytes: int = 0, calls: int = 1):
+    if not INSTRUMENTATION_ENABLED:
+        return
+    current = _current_span.get()
+    labels = _labels(current)
+    metrics.inc("api_calls_total", calls, api=api, **labels)
+    metrics.inc("api_payload_bytes_total", payload_bytes, api=api, **labels)
+    if current is not None:
+        current.add(f"api.{api}.calls", calls)
+        current.add(f"api.{api}.bytes", payload_bytes)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    if not INSTRUMENTATION_ENABLED:
+        return
+    current = _current_span.get()
+    labels = _labels(current)
+    metrics.inc("cache_requests_total", hits, cache=cache, result="hit", **labels)
+    metrics.inc("cache_requests_total", misses, cache=cache, result="miss", **labels)
+    if current is not None:
+        current.add(f"cache.{cache}.hits", hits)
+        current.add(f"cache.{cache}.misses", misses)
+
+
+# %%
+_llm_usage_handler = None
+
+
+def llm_usage_callback():
+    """
+    LLM 호출마다 토큰 수를 현재 노드에 기록하는 콜백 핸들러를 반환합니다. (llm_factory가 모델을 만들 때 붙임)
+    응답에 사용량(usage_metadata)이 없으면(스트리밍에서 사용량을 받지 못한 경우 등) token_budget으로 추정합니다.
+    """
+    global _llm_usage_handler
+    if _llm_usage_handler is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMUsageHandler(BaseCallbackHandler):
+            def __init__(self):
+                self._runs: Dict[uuid.UUID, tuple] = {}
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, metadata=None, **kwargs):
+                params = invocation_params or {}
+                model = (
+                    (metadata or {}).get("ls_model_name") or params.get("model") or params.get("model_name")
+                    or (serialized or {}).get("name", "")
+                )
+                # 콜백은 다른 스레드에서 끝날 수 있으므로 시작할 때의 span을 잡아 둡니다.
+                self._runs[run_id] = (_current_span.get(), model, messages)
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                run = self._runs.pop(run_id, None)
+                if run is None:
+                    return
+                current, model, messages = run
+                prompt_tokens = completion_tokens = None
+                for generations in response.generations:
+                    for generation in generations:
+                        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                        if usage:
+                            prompt_tokens = (prompt_tokens or 0) + usage.get("input_tokens", 0)
+                            completion_tokens = (completion_tokens or 0) + usage.get("output_tokens", 0)
+                if prompt_tokens is None:
+                    from token_budget import count_tokens
+                    prompt_tokens = sum(
+                        count_tokens(m.content if isinstance(m.content, str) else str(m.content))
+                        for batch in messages for m in batch
+                    )
+                    completion_tokens = sum(count_tokens(g.text) for gens in response.generations for g in gens)
+                record_llm_usage(model, prompt_tokens, completion_tokens, current)
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                self._runs.pop(run_id, None)
+
+        _llm_usage_handler = LLMUsageHandler()
+    return _llm_usage_handler
+
+
+# %%
+def render_prometheus() -> str:
+    return metrics.render()
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """/metrics로 Prometheus 지표를 제공하는 HTTP 서버를 백그라운드에서 띄웁니다. (port가 0이면 아무것도 하지 않음)"""
+    global _metrics_server
+    if not port or not INSTRUMENTATION_ENABLED:
+        return None
+    with _metrics_server_lock:  # Streamlit처럼 스크립트가 여러 번 실행돼도 서버는 한 번만 띄웁니다.
+        if _metrics_server is not None:
+            return _metrics_server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"📈 Prometheus 지표 서버 시작: http://{host}:{port}/metrics")
+        return _metrics_server
+
+
+def print_node_report(top: int = 15):
+    """누적 시간이 긴 노드부터 출력합니다. (어느 단계가 지연을 좌우하는지 확인용)"""
+    rows = metrics.node_summary()[:top]
+    if not rows:
+        return
+    print("⏱️ 노드별 누적 시간")
+    for row in rows:
+        print(
+            f"    {row['graph'] + '.' + row['node']:<40} {row['runs']:>6}회 | 누적 {row['total_seconds']:9.2f}s "
+            f"({row['share'] * 100:5.1f}%) | 평균 {row['mean_seconds'] * 1000:8.1f} ms"
+        )
@@ -7,7 +7,7 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langgraph.graph import START
 from langgraph.prebuilt import ToolNode, tools_condition
-from youtube_transcript_api import YouTubeTranscriptApi
+from transcript_cache import fetch_transcript
 
 # %%
 load_dotenv()
@@ -44,7 +44,7 @@ def get_youtube_transcript(video_url: str, max_transcript_chars: int = 10000) ->
             return {"error": "유효한 유튜브 URL에서 Video ID를 추출할 수 없습니다."}
 
         # 자막 추출
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['ko', 'en'])
+        transcript_list = fetch_transcript(video_id, languages=['ko', 'en'])
         full_transcript = " ".join([item['text'] for item in transcript_list])
 
         # 자막 길이 제한
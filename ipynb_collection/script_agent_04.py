@@ -4,7 +4,7 @@ from langgraph.graph import MessagesState, StateGraph, START, END
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
-from youtube_transcript_api import YouTubeTranscriptApi
+from transcript_cache import fetch_transcript
 import json
 
 # %%
@@ -48,7 +48,7 @@ def get_youtube_transcript(state: AgentState) -> dict:
             raise ValueError("유효한 유튜브 URL에서 Video ID를 추출할 수 없습니다.")
 
         print(f"✅ 영상 ID 추출 성공: {video_id}")
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['ko', 'en'])
+        transcript_list = fetch_transcript(video_id, languages=['ko', 'en'])
         transcript_text = " ".join([item['text'] for item in transcript_list])
 
         if len(transcript_text) < 100:
@@ -0,0 +1,291 @@
+# %%
+import copy
+import json
+import os
+import re
+from typing import Any, AsyncIterable, Callable, Iterable, List, Tuple
+
+# %%
+# 생성 도중 JSON이 깨진 것이 보이면 생성을 멈추고 다시 요청할 최대 횟수 (첫 시도 포함)
+JSON_MAX_ATTEMPTS = int(os.getenv("JSON_MAX_ATTEMPTS", "2"))
+# 코드 블록 시작줄(```json)이 이 길이를 넘도록 줄바꿈이 없으면 JSON이 아닌 것으로 봅니다.
+MAX_FENCE_LINE_LENGTH = 20
+
+_WHITESPACE = " \t\r\n"
+_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_CHARS_RE = re.compile(r"[-+.\deE]*")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+# 파서 상태
+_PREAMBLE, _VALUE, _KEY, _COLON, _COMMA, _DONE = range(6)
+
+Path = Tuple[Any, ...]
+
+
+class JsonStreamError(ValueError):
+    """LLM 출력이 JSON 형식이 아닐 때 발생합니다. (생성이 끝나기 전에도 발생할 수 있음)"""
+
+
+# %%
+class _Frame:
+    __slots__ = ("value", "path", "key")
+
+    def __init__(self, value, path: Path):
+        self.value = value
+        self.path = path
+        self.key = None  # 객체에서 값을 기다리는 키
+
+    @property
+    def is_object(self) -> bool:
+        return isinstance(self.value, dict)
+
+
+class JsonStreamParser:
+    """
+    LLM 토큰을 받는 대로 JSON을 읽어, 값이 하나 완성될 때마다 (경로, 값)을 알려 주는 파서입니다.
+
+    - feed(토큰)은 이번 토큰으로 완성된 값 목록을 반환합니다.
+      예: [(("요약",), "..."), (("운동 루틴", 0), "1. ..."), (("운동 루틴",), [...]), ((), {...})]
+    - partial()은 지금까지 완성된 값만 담은 결과 사본입니다. (배열/객체는 채워지는 중인 상태로 포함)
+    - 앞쪽의 ```json 코드 블록 줄은 건너뛰고, JSON이 끝난 뒤의 내용은 무시합니다.
+    - JSON이 아닌 문자가 나오면 그 자리에서 바로 JsonStreamError를 발생시키므로,
+      모델이 끝까지 생성하기 전에 잘못된 출력을 알아챌 수 있습니다.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._offset = 0  # 지금까지 소비한 글자 수 (오류 위치 표시용)
+        self._state = _PREAMBLE
+        self._stack: List[_Frame] = []
+        self._root = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    @property
+    def started(self) -> bool:
+        return self._state != _PREAMBLE
+
+    def partial(self):
+        """지금까지 완성된 부분만 담은 결과의 사본을 반환합니다. 아직 시작 전이면 None입니다."""
+        return copy.deepcopy(self._root)
+
+    def close(self):
+        """출력이 끝났을 때 호출합니다. 완성된 JSON 값을 반환하고, 중간에 끊겼으면 JsonStreamError를 발생시킵니다."""
+        if not self.done:
+            raise JsonStreamError(f"JSON이 끝나기 전에 출력이 끝났습니다. ({self._offset + len(self._buf)}번째 글자)")
+        return self._root
+
+    def _error(self, i: int, reason: str):
+        snippet = self._buf[max(0, i - 20): i + 20].replace("\n", "\\n")
+        raise JsonStreamError(f"{reason} ({self._offset + i}번째 글자 근처: {snippet!r})")
+
+    def feed(self, text: str) -> List[Tuple[Path, Any]]:
+        self._buf += text
+        completed: List[Tuple[Path, Any]] = []
+        i = self._consume(completed)
+        self._buf = self._buf[i:]
+        self._offset += i
+        return completed
+
+    def _consume(self, completed: list) -> int:
+        buf, i, n = self._buf, 0, len(self._buf)
+        while i < n:
+            if self._state == _DONE:
+                return n
+            ch = buf[i]
+            if ch in _WHITESPACE:
+                i += 1
+                continue
+
+            if self._state == _PREAMBLE:
+                if ch == "`":
+                    end = buf.find("\n", i)
+                    if end == -1:
+                        if n - i > MAX_FENCE_LINE_LENGTH:
+                            self._error(i, "코드 블록 시작줄이 올바르지 않습니다")
+                        return i
+                    i = end + 1
+                    continue
+                if ch not in "{[":
+                    self._error(i, "JSON이 아닌 내용으로 시작합니다")
+                self._open(ch)
+                i += 1
+                continue
+
+            frame = self._stack[-1]
+            if self._state == _COMMA:
+                if ch == ",":
+                    self._state = _KEY if frame.is_object else _VALUE
+                elif ch == ("}" if frame.is_object else "]"):
+                    self._close(completed)
+                else:
+                    self._error(i, "',' 또는 닫는 괄호가 와야 합니다")
+                i += 1
+                continue
+
+            if self._state == _COLON:
+                if ch != ":":
+                    self._error(i, "키 뒤에 ':'가 와야 합니다")
+                self._state = _VALUE
+                i += 1
+                continue
+
+            if self._state == _KEY:
+                if ch == "}" and not frame.value:
+                    self._close(completed)
+                    i += 1
+                    continue
+                if ch != '"':
+                    self._error(i, "객체의 키(문자열)가 와야 합니다")
+                match = _STRING_RE.match(buf, i)
+                if match is None:
+                    return i
+                frame.key = json.loads(match.group(), strict=False)
+                self._state = _COLON
+                i = match.end()
+                continue
+
+            # _VALUE
+            if ch == "]" and not frame.is_object and not frame.value:
+                self._close(completed)
+                i += 1
+                continue
+            if ch in "{[":
+                self._open(ch)
+                i += 1
+                continue
+            if ch == '"':
+                match = _STRING_RE.match(buf, i)
+                if match is None:
+                    return i
+                self._add(json.loads(match.group(), strict=False), completed)
+                i = match.end()
+                continue
+            if ch in "-0123456789" and _NUMBER_CHARS_RE.match(buf, i).end() == n:
+                return i  # 숫자가 다음 토큰에서 이어질 수 있음
+            match = _NUMBER_RE.match(buf, i)
+            if match is not None:
+                self._add(json.loads(match.group()), completed)
+                i = match.end()
+                continue
+            word = next((w for w in _LITERALS if buf.startswith(w, i)), None)
+            if word is not None:
+                self._add(_LITERALS[word], completed)
+                i += len(word)
+                continue
+            if any(w.startswith(buf[i:]) for w in _LITERALS):
+                return i
+            self._error(i, "JSON 값이 와야 합니다")
+        return i
+
+    def _child_path(self) -> Path:
+        if not self._stack:
+            return ()
+        frame = self._stack[-1]
+        return frame.path + ((frame.key,) if frame.is_object else (len(frame.value),))
+
+    def _attach(self, value):
+        if not self._stack:
+            self._root = value
+            return
+        frame = self._stack[-1]
+        if frame.is_object:
+            frame.value[frame.key] = value
+        else:
+            frame.value.append(value)
+
+    def _open(self, ch: str):
+        value = {} if ch == "{" else []
+        path = self._child_path()
+        self._attach(value)  # 채워지는 중인 배열/객체도 partial()에 보이도록 미리 붙여 둡니다.
+        self._stack.append(_Frame(value, path))
+        self._state = _KEY if ch == "{" else _VALUE
+
+    def _close(self, completed: list):
+        frame = self._stack.pop()
+        completed.append((frame.path, frame.value))
+        self._after_value()
+
+    def _add(self, value, completed: list):
+        completed.append((self._child_path(), value))
+        self._attach(value)
+        self._after_value()
+
+    def _after_value(self):
+        self._state = _COMMA if self._stack else _DONE
+
+
+# %%
+def loads_llm_json(content: str):
+    """
+    LLM 응답 전체를 JSON으로 읽습니다. (```json 코드 블록과 JSON 뒤의 군더더기는 무시)
+    JSON이 아니면 JsonStreamError(ValueError)를 발생시킵니다.
+    """
+    parser = JsonStreamParser()
+    parser.feed(content)
+    return parser.close()
+
+
+def stream_json_with_retry(
+    stream: Callable[[], Iterable[str]], max_attempts: int = JSON_MAX_ATTEMPTS
+) -> str:
+    """
+    stream()이 내보내는 토큰을 파싱하며 모읍니다. JSON이 깨진 것이 보이면 그 자리에서 생성을 멈추고
+    (스트림을 닫아 모델도 생성을 멈춤) 처음부터 다시 요청합니다.
+    마지막 시도는 깨지더라도 끝까지 받아서 그대로 반환하므로, 호출한 쪽의 기존 실패 처리가 그대로 동작합니다.
+    """
+    for attempt in range(1, max_attempts + 1):
+        parser, chunks = JsonStreamParser(), []
+        chunk_iter = iter(stream())
+        try:
+            for chunk in chunk_iter:
+                chunks.append(chunk)
+                parser.feed(chunk)
+            parser.close()
+            return "".join(chunks)
+        except JsonStreamError as e:
+            if attempt < max_attempts:
+                print(f"🔁 JSON 형식이 깨진 출력을 감지해 다시 생성합니다. ({attempt}/{max_attempts}) - {e}")
+                _close_iterator(chunk_iter)
+                continue
+            print(f"⚠️ JSON 형식이 아닌 출력입니다. 원본을 그대로 사용합니다. - {e}")
+            chunks.extend(chunk_iter)
+            return "".join(chunks)
+
+
+async def astream_json_with_retry(
+    stream: Callable[[], AsyncIterable[str]], max_attempts: int = JSON_MAX_ATTEMPTS
+) -> str:
+    """stream_json_with_retry의 비동기 버전입니다."""
+    for attempt in range(1, max_attempts + 1):
+        parser, chunks = JsonStreamParser(), []
+        chunk_iter = stream().__aiter__()
+        try:
+            async for chunk in chunk_iter:
+                chunks.append(chunk)
+                parser.feed(chunk)
+            parser.close()
+            return "".join(chunks)
+        except JsonStreamError as e:
+            if attempt < max_attempts:
+                print(f"🔁 JSON 형식이 깨진 출력을 감지해 다시 생성합니다. ({attempt}/{max_attempts}) - {e}")
+                await _aclose_iterator(chunk_iter)
+                continue
+            print(f"⚠️ JSON 형식이 아닌 출력입니다. 원본을 그대로 사용합니다. - {e}")
+            chunks.extend([chunk async for chunk in chunk_iter])
+            return "".join(chunks)
+
+
+def _close_iterator(iterator):
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+async def _aclose_iterator(iterator):
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
@@ -0,0 +1,168 @@
+# %%
+import os
+import threading
+from typing import Callable, Optional
+
+# %%
+# 요청 하나의 HTTP 제한 시간(초). 스트리밍에서는 다음 조각을 기다리는 시간에도 적용되므로,
+# 토큰이 더 오지 않고 멈춘 스트림도 이 시간 뒤에는 오류(일시적 오류로 재시도 대상)로 끝나 스레드를 돌려줍니다. (0이면 SDK 기본값)
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+
+# 채팅 모델 클라이언트는 처음 필요할 때 만들고, 같은 설정이면 프로세스 전체에서 재사용합니다.
+# (langchain_openai / openai 패키지 import와 클라이언트 생성에 수백 ms가 걸리므로 모듈 import 시점에는 만들지 않음)
+_chat_models: dict = {}
+_factory: Optional[Callable] = None
+_embeddings: dict = {}
+_embeddings_factory: Optional[Callable] = None
+_lock = threading.Lock()
+
+
+def _default_factory(model: str, **kwargs):
+    from dotenv import load_dotenv
+    from langchain_openai import ChatOpenAI
+
+    load_dotenv()
+    # 스트리밍 응답에도 토큰 사용량이 포함되도록 합니다. (instrumentation의 토큰 집계용)
+    kwargs.setdefault("stream_usage", True)
+    # 재시도는 resilience.call_llm이 마감 시각을 보며 맡으므로, SDK 자체 재시도는 끕니다. (재시도가 곱으로 늘지 않도록)
+    if os.getenv("LLM_RESILIENCE", "1") != "0":
+        kwargs.setdefault("max_retries", 0)
+    if LLM_REQUEST_TIMEOUT_SECONDS > 0:
+        kwargs.setdefault("timeout", LLM_REQUEST_TIMEOUT_SECONDS)
+    return ChatOpenAI(model=model, **kwargs)
+
+
+def _with_callbacks(chat_model):
+    """모든 모델에 RPM/TPM 제한(rate_limiter)과 토큰 집계(instrumentation) 콜백을 붙입니다."""
+    from instrumentation import INSTRUMENTATION_ENABLED, llm_usage_callback
+    from rate_limiter import RATE_LIMIT_ENABLED, async_rate_limit_callback, rate_limit_callback
+
+    callbacks = list(chat_model.callbacks or [])
+    if RATE_LIMIT_ENABLED:
+        # 동기 호출은 rate_limit_callback이, ainvoke/astream은 이벤트 루프에서 기다리는 비동기 핸들러가 맡습니다.
+        callbacks += [rate_limit_callback(), async_rate_limit_callback()]
+    if INSTRUMENTATION_ENABLED:
+        callbacks.append(llm_usage_callback())
+    chat_model.callbacks = callbacks
+    return chat_model
+
+
+def get_chat_model(model: str, **kwargs):
+    """model과 옵션(streaming 등)에 해당하는 채팅 모델을 반환합니다. 처음 호출될 때만 새로 만듭니다."""
+    key = (model, tuple(sorted(kwargs.items())))
+    chat_model = _chat_models.get(key)
+    if chat_model is not None:
+        return chat_model
+    with _lock:
+        chat_model = _chat_models.get(key)
+        if chat_model is None:
+            chat_model = (_factory or _default_factory)(model, **kwargs)
+            chat_model = _chat_models[key] = _with_callbacks(chat_model)
+    return chat_model
+
+
+def set_chat_model_factory(factory: Optional[Callable]):
+    """
+    채팅 모델을 만드는 함수를 바꿉니다. (벤치마크/테스트에서 가짜 모델을 쓰는 용도, None이면 기본값으로 복원)
+    factory(model, **kwargs)는 BaseChatModel을 반환해야 하며, 이미 만들어 둔 모델은 버립니다.
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _chat_models.clear()
+
+
+# %%
+# 임베딩 모델도 채팅 모델과 같은 RPM/TPM 버킷(rate_limiter)과 재시도/서킷 브레이커(resilience.call_llm)를 거칩니다.
+# 임베딩 호출에는 LangChain 콜백이 없으므로 embed_documents / aembed_documents를 직접 감쌉니다.
+EMBEDDING_BATCH_SIZE = 1000  # OpenAIEmbeddings가 요청 하나에 보내는 텍스트 수 (chunk_size 기본값)
+
+
+def _default_embeddings_factory(model: str, **kwargs):
+    from dotenv import load_dotenv
+    from langchain_openai import OpenAIEmbeddings
+
+    load_dotenv()
+    if os.getenv("LLM_RESILIENCE", "1") != "0":
+        kwargs.setdefault("max_retries", 0)
+    if LLM_REQUEST_TIMEOUT_SECONDS > 0:
+        kwargs.setdefault("timeout", LLM_REQUEST_TIMEOUT_SECONDS)
+    return OpenAIEmbeddings(model=model, **kwargs)
+
+
+_guarded_class = None
+
+
+def _guarded(embeddings, model: str):
+    """embeddings의 요청마다 모델별 RPM/TPM 버킷에서 요청 수와 토큰 수를 꺼내고, call_llm 아래에서 실행합니다."""
+    global _guarded_class
+    if _guarded_class is None:
+        from langchain_core.embeddings import Embeddings
+
+        class GuardedEmbeddings(Embeddings):
+            def __init__(self, embeddings, model: str):
+                self.embeddings = embeddings
+                self.model = model
+
+            def _cost(self, texts):
+                from token_budget import count_tokens_batch
+
+                requests = max(1, -(-len(texts) // EMBEDDING_BATCH_SIZE))
+                return sum(count_tokens_batch(texts, self.model)), requests
+
+            def embed_documents(self, texts):
+                from rate_limiter import RATE_LIMIT_ENABLED, acquire_openai
+                from resilience import call_llm
+
+                tokens, requests = self._cost(texts) if RATE_LIMIT_ENABLED else (0, 0)
+
+                def attempt():
+                    if RATE_LIMIT_ENABLED:
+                        acquire_openai(self.model, tokens, requests)
+                    return self.embeddings.embed_documents(texts)
+
+                return call_llm(self.model, attempt, name="embeddings")
+
+            async def aembed_documents(self, texts):
+                from rate_limiter import RATE_LIMIT_ENABLED, aacquire_openai
+                from resilience import acall_llm
+
+                tokens, requests = self._cost(texts) if RATE_LIMIT_ENABLED else (0, 0)
+
+                async def attempt():
+                    if RATE_LIMIT_ENABLED:
+                        await aacquire_openai(self.model, tokens, requests)
+                    return await self.embeddings.aembed_documents(texts)
+
+                return await acall_llm(self.model, attempt, name="embeddings")
+
+            def embed_query(self, text):
+                return self.embed_documents([text])[0]
+
+            async def aembed_query(self, text):
+                return (await self.aembed_documents([text]))[0]
+
+        _guarded_class = GuardedEmbeddings
+    return _guarded_class(embeddings, model)
+
+
+def get_embeddings(model: str, **kwargs):
+    """model에 해당하는 임베딩 모델을 반환합니다. 처음 호출될 때만 새로 만들고, 제한기/재시도 계층으로 감쌉니다."""
+    key = (model, tuple(sorted(kwargs.items())))
+    embeddings = _embeddings.get(key)
+    if embeddings is not None:
+        return embeddings
+    with _lock:
+        embeddings = _embeddings.get(key)
+        if embeddings is None:
+            raw = (_embeddings_factory or _default_embeddings_factory)(model, **kwargs)
+            embeddings = _embeddings[key] = _guarded(raw, model)
+    return embeddings
+
+
+def set_embeddings_factory(factory: Optional[Callable]):
+    """임베딩 모델을 만드는 함수를 바꿉니다. (set_chat_model_factory와 같은 용도, None이면 기본값으로 복원)"""
+    global _embeddings_factory
+    with _lock:
+        _embeddings_factory = factory
+        _embeddings.clear()
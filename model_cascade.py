@@ -0,0 +1,247 @@
+# %%
+# 요약 노드의 모델 단계(cascade): 작은 모델로 먼저 요약하고, 결과가 기대한 JSON 형식이 아니거나
+# 확신이 낮아 보일 때만 큰 모델로 다시 요약합니다.
+#
+# - 단계는 SUMMARY_MODEL_TIERS(기본 "gpt-4o-mini,gpt-4o")로 정하고, MODEL_CASCADE=0이면 마지막(가장 큰) 모델만 씁니다.
+# - 검증: 필수 키와 값 형식(스키마) + 확신 검사(빈 값, 핵심 요약 문장의 "알 수 없음" 같은 표현, 너무 짧은 요약)
+#   마지막 단계의 결과는 검증하지 않고 그대로 씁니다. (기존 실패 처리 흐름을 그대로 따름)
+# - 승격 횟수, 모델별 호출 시간, 큰 모델만 썼을 때와 비교한 비용(토큰 수 추정 x MODEL_PRICES)을 지표로 남기고,
+#   cascade_stats()로 승격률과 절약한 비용/지연을 계산합니다.
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from instrumentation import metrics
+from json_stream import JsonStreamError, loads_llm_json
+
+# %%
+MODEL_CASCADE_ENABLED = os.getenv("MODEL_CASCADE", "1") != "0"
+SUMMARY_MODEL_TIERS = [m.strip() for m in os.getenv("SUMMARY_MODEL_TIERS", "gpt-4o-mini,gpt-4o").split(",") if m.strip()]
+# 모델별 가격: "모델=입력:출력" (USD / 100만 토큰)
+MODEL_PRICES = os.getenv("MODEL_PRICES", "gpt-4o=2.5:10,gpt-4o-mini=0.15:0.6")
+# 작은 모델이 내용을 확신하지 못할 때 자주 쓰는 표현 (이런 값이 핵심 요약 문장에 있으면 큰 모델로 승격)
+# "운동 강도": "언급되지 않음"처럼 영상에 정말 없는 정보를 알려 주는 항목은 검사하지 않습니다. (SummarySchema.confidence_fields)
+LOW_CONFIDENCE_MARKERS = ("알 수 없", "확인할 수 없", "정보가 없", "정보 없음", "언급되지 않", "N/A")
+
+
+def _parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        model, values = item.split("=", 1)
+        prompt_price, completion_price = values.split(":")
+        prices[model.strip()] = (float(prompt_price), float(completion_price))
+    return prices
+
+
+_prices = _parse_prices(MODEL_PRICES)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """토큰 수로 호출 비용(USD)을 추정합니다. 가격을 모르는 모델은 0입니다."""
+    prompt_price, completion_price = _prices.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+# %%
+@dataclass(frozen=True)
+class SummarySchema:
+    """요약 JSON의 기대 형식입니다."""
+    required: Dict[str, type]  # 필수 키 -> 값 형식
+    nested: Dict[str, Tuple[str, ...]] = field(default_factory=dict)  # dict 값 안에 있어야 할 키
+    min_items: Dict[str, int] = field(default_factory=dict)  # 목록 값의 최소 항목 수
+    min_chars: Dict[str, int] = field(default_factory=dict)  # 문자열 값의 최소 길이 (확신 검사)
+    may_be_empty: Tuple[str, ...] = ()  # 키와 형식만 맞으면 비어 있어도 되는 항목 (예: 팁/질문이 없는 댓글)
+    confidence_fields: Tuple[Tuple[str, ...], ...] = ()  # LOW_CONFIDENCE_MARKERS를 검사할 핵심 문장의 경로
+
+
+SCHEMAS = {
+    "script": SummarySchema(
+        required={"요약": str, "운동 강도": str, "운동 루틴": list, "자극 신체 부위": str},
+        min_items={"운동 루틴": 1},
+        min_chars={"요약": 20},
+        confidence_fields=(("요약",),),
+    ),
+    "comment": SummarySchema(
+        required={"overall_sentiment": dict, "key_topics": list, "user_tips": list, "faq": list},
+        nested={"overall_sentiment": ("description",)},
+        min_items={"key_topics": 1},
+        may_be_empty=("user_tips", "faq"),
+        confidence_fields=(("overall_sentiment", "description"),),
+    ),
+}
+
+
+def _texts(value) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _texts(item)]
+    if isinstance(value, list):
+        return [text for item in value for text in _texts(item)]
+    return []
+
+
+def validate_summary(namespace: str, content: str) -> Optional[str]:
+    """요약이 namespace의 스키마와 확신 검사를 통과하면 None을, 아니면 승격 사유를 반환합니다."""
+    schema = SCHEMAS[namespace]
+    try:
+        parsed = loads_llm_json(content)
+    except JsonStreamError:
+        return "JSON 아님"
+    if not isinstance(parsed, dict):
+        return "JSON 객체 아님"
+    for key, expected in schema.required.items():
+        value = parsed.get(key)
+        if value is None:
+            return f"'{key}' 없음"
+        if not isinstance(value, expected):
+            return f"'{key}' 형식 오류"
+        if key in schema.may_be_empty:
+            continue
+        if not _texts(value) or not any(text.strip() for text in _texts(value)):
+            return f"'{key}' 비어 있음"
+    for key, sub_keys in schema.nested.items():
+        for sub_key in sub_keys:
+            if not str(parsed[key].get(sub_key) or "").strip():
+                return f"'{key}.{sub_key}' 없음"
+    for key, count in schema.min_items.items():
+        if len(parsed[key]) < count:
+            return f"'{key}' 항목 부족"
+    # 확신 검사
+    for key, chars in schema.min_chars.items():
+        if len(parsed[key].strip()) < chars:
+            return f"확신 낮음: '{key}' 너무 짧음"
+    for path in schema.confidence_fields:
+        value = parsed
+        for part in path:
+            value = value.get(part) if isinstance(value, dict) else None
+        if any(marker in text for text in _texts(value) for marker in LOW_CONFIDENCE_MARKERS):
+            return f"확신 낮음: '{'.'.join(path)}'"
+    return None
+
+
+# %%
+class ModelCascade:
+    """작은 모델부터 차례로 요약을 시도하고, 검증을 통과한 첫 결과를 반환합니다."""
+
+    def __init__(self, tiers: Optional[List[str]] = None, enabled: bool = MODEL_CASCADE_ENABLED):
+        self.tiers = list(tiers or SUMMARY_MODEL_TIERS)
+        self.enabled = enabled
+
+    @property
+    def models(self) -> List[str]:
+        return self.tiers if self.enabled else self.tiers[-1:]
+
+    @property
+    def first_model(self) -> str:
+        """검증할 JSON이 없는 중간 단계(map 메모 등)에 쓸 모델입니다."""
+        return self.models[0]
+
+    def label(self) -> str:
+        """요약 캐시 키에 넣을 모델 이름입니다. (단계 구성이 바뀌면 캐시도 새로 만듦)"""
+        return ">".join(self.models)
+
+    def _record_call(self, namespace: str, model: str, prompt_tokens: int, content: str, elapsed: float) -> float:
+        from token_budget import count_tokens
+
+        cost = estimate_cost(model, prompt_tokens, count_tokens(content or "", model))
+        metrics.inc("model_cascade_model_calls_total", namespace=namespace, model=model)
+        metrics.inc("model_cascade_model_seconds_total", elapsed, namespace=namespace, model=model)
+        metrics.inc("model_cascade_cost_usd_total", cost, namespace=namespace, kind="actual")
+        return cost
+
+    def _escalate(self, namespace: str, model: str, next_model: str, reason: str):
+        metrics.inc("model_cascade_escalations_total", namespace=namespace, model=model, reason=reason.split(":")[0])
+        print(f"⬆️ {model} 요약이 검증을 통과하지 못했습니다({reason}). {next_model}로 다시 요약합니다.")
+
+    def _finish(self, namespace: str, model: str, prompt_tokens: int, content: str, started: float):
+        from token_budget import count_tokens
+
+        # 기준: 처음부터 가장 큰 모델로 같은 길이의 응답을 받았을 때의 비용
+        largest = self.tiers[-1]
+        baseline = estimate_cost(largest, prompt_tokens, count_tokens(content or "", largest))
+        metrics.inc("model_cascade_requests_total", namespace=namespace, model=model)
+        metrics.inc("model_cascade_seconds_total", time.monotonic() - started, namespace=namespace)
+        metrics.inc("model_cascade_cost_usd_total", baseline, namespace=namespace, kind="baseline")
+
+    def _check(self, namespace: str, models: List[str], i: int, content: str) -> Optional[str]:
+        return None if i == len(models) - 1 else validate_summary(namespace, content)
+
+    @staticmethod
+    def _can_escalate(error: Exception) -> bool:
+        # 마감 시각이 지났으면 큰 모델로 다시 시도할 시간도 없습니다.
+        from resilience import DeadlineExceeded
+        return not isinstance(error, DeadlineExceeded)
+
+    def run(self, namespace: str, call: Callable[[str], str], prompt_tokens: int) -> str:
+        """
+        call(모델 이름) -> 요약 텍스트를 단계별 모델로 호출합니다.
+        검증에 실패하거나 작은 모델 호출이 실패(서킷 열림 등)하면 다음 모델로 승격합니다.
+        """
+        models, started = self.models, time.monotonic()
+        for i, model in enumerate(models):
+            call_started = time.monotonic()
+            try:
+                content = call(model)
+            except Exception as e:
+                if i == len(models) - 1 or not self._can_escalate(e):
+                    raise
+                self._escalate(namespace, model, models[i + 1], f"오류: {type(e).__name__}")
+                continue
+            self._record_call(namespace, model, prompt_tokens, content, time.monotonic() - call_started)
+            reason = self._check(namespace, models, i, content)
+            if reason is None:
+                self._finish(namespace, model, prompt_tokens, content, started)
+                return content
+            self._escalate(namespace, model, models[i + 1], reason)
+
+    async def arun(self, namespace: str, acall: Callable[[str], Awaitable[str]], prompt_tokens: int) -> str:
+        """run의 비동기 버전입니다."""
+        models, started = self.models, time.monotonic()
+        for i, model in enumerate(models):
+            call_started = time.monotonic()
+            try:
+                content = await acall(model)
+            except Exception as e:
+                if i == len(models) - 1 or not self._can_escalate(e):
+                    raise
+                self._escalate(namespace, model, models[i + 1], f"오류: {type(e).__name__}")
+                continue
+            self._record_call(namespace, model, prompt_tokens, content, time.monotonic() - call_started)
+            reason = self._check(namespace, models, i, content)
+            if reason is None:
+                self._finish(namespace, model, prompt_tokens, content, started)
+                return content
+            self._escalate(namespace, model, models[i + 1], reason)
+
+
+# %%
+model_cascade = ModelCascade()
+
+
+def cascade_stats(namespace: str) -> dict:
+    """
+    namespace("script" / "comment")의 승격률과, 가장 큰 모델만 썼을 때와 비교한 비용/지연 절약 추정치를 반환합니다.
+    지연 절약은 (큰 모델 호출 평균 시간 x 요청 수) - 실제 걸린 시간이며, 큰 모델 표본이 없으면 None입니다.
+    """
+    requests = metrics.total("model_cascade_requests_total", namespace=namespace)
+    escalations = metrics.total("model_cascade_escalations_total", namespace=namespace)
+    actual = metrics.total("model_cascade_cost_usd_total", namespace=namespace, kind="actual")
+    baseline = metrics.total("model_cascade_cost_usd_total", namespace=namespace, kind="baseline")
+    largest = model_cascade.tiers[-1]
+    largest_calls = metrics.total("model_cascade_model_calls_total", namespace=namespace, model=largest)
+    largest_seconds = metrics.total("model_cascade_model_seconds_total", namespace=namespace, model=largest)
+    elapsed = metrics.total("model_cascade_seconds_total", namespace=namespace)
+    latency_saved = largest_seconds / largest_calls * requests - elapsed if largest_calls else None
+    return {
+        "requests": requests,
+        "escalations": escalations,
+        "escalation_rate": escalations / requests if requests else 0.0,
+        "cost_usd": actual,
+        "baseline_cost_usd": baseline,
+        "cost_saved_usd": baseline - actual,
+        "latency_saved_seconds": latency_saved,
+    }
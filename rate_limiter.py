@@ -0,0 +1,535 @@
+# %%
+# YouTube Data API 할당량과 OpenAI RPM/TPM 한도를 지키기 위한 공용 토큰 버킷 제한기
+#
+# - 한도에 걸린 호출은 실패시키지 않고, 토큰이 찰 때까지 기다렸다가(큐에 줄 세워) 실행합니다.
+# - 기본 저장소는 프로세스 메모리이고, RATE_LIMIT_BACKEND=sqlite이면 같은 서버의 여러 프로세스
+#   (Streamlit 워커, batch_runner 등)가 SQLite 파일 하나로 버킷을 함께 씁니다.
+# - 버킷별 남은 양(headroom)은 instrumentation 지표(rate_limit_available / rate_limit_capacity)로 내보냅니다.
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import metrics
+
+# %%
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT", "1") != "0"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", os.path.join(".cache", "rate_limits.sqlite3"))
+# 한 호출이 기다릴 수 있는 최대 시간 (0이면 토큰이 찰 때까지 계속 기다림)
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "0"))
+MAX_POLL_SECONDS = 1.0  # 다른 프로세스가 토큰을 돌려줄 수 있으므로 이 간격보다 오래 자지 않습니다.
+
+# YouTube Data API: 하루 할당량(기본 10,000 units)을 하루에 고르게 나눠 채우고, 순간적으로는 BURST까지 허용
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+YOUTUBE_QUOTA_BURST = int(os.getenv("YOUTUBE_QUOTA_BURST", "300"))
+# 메서드별 할당량 비용 (https://developers.google.com/youtube/v3/determine_quota_cost)
+YOUTUBE_QUOTA_COSTS = {
+    "commentThreads.list": 1,
+    "comments.list": 1,
+    "videos.list": 1,
+    "channels.list": 1,
+    "captions.list": 50,
+    "search.list": 100,
+}
+
+# OpenAI: "모델=RPM:TPM" 목록 (조직 등급에 맞게 환경 변수로 조정)
+OPENAI_RATE_LIMITS = os.getenv(
+    "OPENAI_RATE_LIMITS", "gpt-4o=500:30000,gpt-4o-mini=500:200000,text-embedding-3-large=3000:1000000"
+)
+OPENAI_DEFAULT_RATE_LIMIT = (500, 30000)  # 목록에 없는 모델
+# 요청 전에는 응답 길이를 모르므로 이만큼 미리 잡아 두고, 응답을 받은 뒤 실제 사용량으로 정산합니다.
+OPENAI_EXPECTED_COMPLETION_TOKENS = int(os.getenv("OPENAI_EXPECTED_COMPLETION_TOKENS", "600"))
+
+
+class RateLimitTimeout(RuntimeError):
+    """RATE_LIMIT_MAX_WAIT_SECONDS 안에 토큰을 얻지 못했을 때 발생합니다."""
+
+
+@dataclass(frozen=True)
+class BucketSpec:
+    capacity: float
+    refill_per_second: float
+
+
+# %%
+class MemoryBucketStore:
+    """프로세스 안에서만 공유하는 버킷 저장소입니다."""
+
+    def __init__(self):
+        self._state: Dict[str, List[float]] = {}  # 이름 -> [남은 토큰, 마지막 갱신 시각]
+        self._lock = threading.Lock()
+
+    def _refill(self, name: str, spec: BucketSpec, now: float) -> List[float]:
+        state = self._state.get(name)
+        if state is None:
+            state = self._state[name] = [spec.capacity, now]
+        state[0] = min(spec.capacity, state[0] + (now - state[1]) * spec.refill_per_second)
+        state[1] = now
+        return state
+
+    def take(self, name: str, spec: BucketSpec, amount: float) -> float:
+        """amount만큼 꺼내고 0을 반환합니다. 모자라면 꺼내지 않고, 다시 시도할 때까지 기다릴 초를 반환합니다."""
+        with self._lock:
+            state = self._refill(name, spec, time.time())
+            if state[0] >= amount:
+                state[0] -= amount
+                return 0.0
+            return (amount - state[0]) / spec.refill_per_second
+
+    def give(self, name: str, spec: BucketSpec, amount: float):
+        """토큰을 돌려줍니다. amount가 음수면 더 가져갑니다. (0 아래로 내려가면 다음 호출이 그만큼 더 기다림)"""
+        with self._lock:
+            state = self._refill(name, spec, time.time())
+            state[0] = min(spec.capacity, state[0] + amount)
+
+    def available(self, name: str, spec: BucketSpec) -> float:
+        with self._lock:
+            return self._refill(name, spec, time.time())[0]
+
+
+class SqliteBucketStore:
+    """
+    SQLite 파일 하나로 여러 프로세스가 함께 쓰는 버킷 저장소입니다.
+    읽기-갱신을 BEGIN IMMEDIATE 트랜잭션으로 묶어, 동시에 꺼내도 토큰이 중복으로 나가지 않습니다.
+    """
+
+    def __init__(self, db_path: str = RATE_LIMIT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            # isolation_level=None: 트랜잭션을 직접 BEGIN IMMEDIATE로 시작합니다.
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._conn = conn
+        return self._conn
+
+    def _update(self, name: str, spec: BucketSpec, change) -> Tuple[float, float]:
+        """버킷을 채운 뒤 change(남은 토큰) -> (새 토큰 수, 반환값)을 적용합니다."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+                tokens = spec.capacity if row is None else min(spec.capacity, row[0] + (now - row[1]) * spec.refill_per_second)
+                tokens, result = change(tokens)
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)", (name, tokens, now)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return tokens, result
+
+    def take(self, name: str, spec: BucketSpec, amount: float) -> float:
+        def change(tokens):
+            if tokens >= amount:
+                return tokens - amount, 0.0
+            return tokens, (amount - tokens) / spec.refill_per_second
+        return self._update(name, spec, change)[1]
+
+    def give(self, name: str, spec: BucketSpec, amount: float):
+        self._update(name, spec, lambda tokens: (min(spec.capacity, tokens + amount), None))
+
+    def available(self, name: str, spec: BucketSpec) -> float:
+        return self._update(name, spec, lambda tokens: (tokens, None))[0]
+
+
+def make_store(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "memory":
+        return MemoryBucketStore()
+    if backend == "sqlite":
+        return SqliteBucketStore()
+    raise ValueError(f"알 수 없는 제한기 저장소: {backend} (사용 가능: memory, sqlite)")
+
+
+# %%
+class _WaitQueue:
+    """
+    버킷 하나를 기다리는 호출의 줄입니다. 스레드(acquire)와 asyncio 태스크(aacquire)가 같은 줄에 서서
+    먼저 온 순서대로 차례를 받습니다. 차례가 끝나면 다음 대기자에게 바로 넘겨 줍니다. (중간에 끼어들 수 없음)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()  # threading.Event 또는 (이벤트 루프, asyncio.Future)
+        self._busy = False
+
+    def _enter(self, waiter) -> bool:
+        """바로 차례를 받으면 True, 줄을 섰으면 False를 반환합니다."""
+        with self._lock:
+            if not self._busy and not self._waiters:
+                self._busy = True
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _leave(self, waiter) -> bool:
+        """기다리기를 그만둡니다. 그 사이에 이미 차례를 넘겨받았으면 False를 반환합니다. (이때는 release 필요)"""
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                return True
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        event = threading.Event()
+        if self._enter(event) or event.wait(timeout) or not self._leave(event):
+            return True
+        return False
+
+    async def aacquire(self, timeout: Optional[float] = None) -> bool:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        if self._enter(waiter):
+            return True
+        try:
+            # shield: 기다리다 취소되어도 넘겨받은 차례를 놓치지 않도록 원래 future는 그대로 둡니다.
+            await asyncio.wait_for(asyncio.shield(waiter[1]), timeout)
+            return True
+        except BaseException as e:
+            if not self._leave(waiter):
+                self.release()  # 이미 넘겨받은 차례는 다음 대기자에게 넘김
+            if isinstance(e, (TimeoutError, asyncio.TimeoutError)):
+                return False
+            raise
+
+    def release(self):
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._busy = False
+                    return
+                waiter = self._waiters.popleft()
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+                return
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+                return
+            except RuntimeError:  # 대기자의 이벤트 루프가 이미 닫힘 -> 다음 대기자에게
+                continue
+
+
+# %%
+class RateLimiter:
+    """
+    이름별 토큰 버킷 모음입니다. acquire()는 토큰이 찰 때까지 기다렸다가 꺼냅니다.
+
+    - 같은 버킷을 기다리는 호출은 동기/비동기 구분 없이 한 줄로 세워(버킷별 _WaitQueue) 먼저 온 호출부터 처리합니다.
+      (큰 요청이 작은 요청들에 계속 밀려 굶는 일이 없도록)
+    - 버킷 용량보다 큰 요청은 용량만큼으로 줄여서 처리합니다. (영원히 기다리지 않도록)
+    """
+
+    def __init__(self, store=None, max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS, enabled: bool = RATE_LIMIT_ENABLED):
+        self.store = store or make_store()
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self._specs: Dict[str, BucketSpec] = {}
+        self._queues: Dict[str, _WaitQueue] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, name: str, capacity: float, refill_per_second: float):
+        with self._lock:
+            self._specs[name] = BucketSpec(capacity, refill_per_second)
+            self._queues.setdefault(name, _WaitQueue())
+
+    def is_configured(self, name: str) -> bool:
+        return name in self._specs
+
+    def _prepare(self, name: str, amount: float) -> Tuple[BucketSpec, float]:
+        spec = self._specs[name]
+        return spec, min(amount, spec.capacity)
+
+    def _record_wait(self, name: str, waited: float):
+        if waited > 0:
+            metrics.inc("rate_limit_waits_total", bucket=name)
+            metrics.inc("rate_limit_wait_seconds_total", waited, bucket=name)
+
+    def _deadline(self, timeout: Optional[float]) -> Optional[float]:
+        timeout = self.max_wait if timeout is None else timeout
+        return time.monotonic() + timeout if timeout else None
+
+    def _check_deadline(self, name: str, deadline: Optional[float], wait: float) -> float:
+        if deadline is None:
+            return wait
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RateLimitTimeout(f"'{name}' 한도 때문에 {self.max_wait:g}초 넘게 기다렸습니다.")
+        return min(wait, remaining)
+
+    def acquire(self, name: str, amount: float = 1, timeout: Optional[float] = None) -> float:
+        """name 버킷에서 amount만큼 꺼냅니다. 기다린 시간(초)을 반환합니다."""
+        if not self.enabled or amount <= 0:
+            return 0.0
+        spec, amount = self._prepare(name, amount)
+        started = time.monotonic()
+        deadline = self._deadline(timeout)
+        queue = self._queues[name]
+        if not queue.acquire(None if deadline is None else max(0.0, deadline - started)):
+            raise RateLimitTimeout(f"'{name}' 한도 대기열에서 {self.max_wait:g}초 넘게 기다렸습니다.")
+        try:
+            while True:
+                wait = self.store.take(name, spec, amount)
+                if wait == 0:
+                    break
+                time.sleep(min(self._check_deadline(name, deadline, wait), MAX_POLL_SECONDS))
+        finally:
+            queue.release()
+        waited = time.monotonic() - started
+        self._record_wait(name, waited if waited > 0.001 else 0.0)
+        return waited
+
+    async def aacquire(self, name: str, amount: float = 1, timeout: Optional[float] = None) -> float:
+        """acquire의 비동기 버전입니다. 같은 줄에 서되, 기다리는 동안 이벤트 루프를 막지 않습니다."""
+        import asyncio
+
+        if not self.enabled or amount <= 0:
+            return 0.0
+        spec, amount = self._prepare(name, amount)
+        started = time.monotonic()
+        deadline = self._deadline(timeout)
+        queue = self._queues[name]
+        if not await queue.aacquire(None if deadline is None else max(0.0, deadline - started)):
+            raise RateLimitTimeout(f"'{name}' 한도 대기열에서 {self.max_wait:g}초 넘게 기다렸습니다.")
+        try:
+            while True:
+                wait = self.store.take(name, spec, amount)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(self._check_deadline(name, deadline, wait), MAX_POLL_SECONDS))
+        finally:
+            queue.release()
+        waited = time.monotonic() - started
+        self._record_wait(name, waited if waited > 0.001 else 0.0)
+        return waited
+
+    def release(self, name: str, amount: float):
+        """미리 잡아 둔 양을 돌려줍니다. (음수면 추가로 사용한 양을 차감)"""
+        if self.enabled and amount and name in self._specs:
+            self.store.give(name, self._specs[name], amount)
+
+    def headroom(self) -> Dict[str, dict]:
+        """버킷별 남은 양/용량/사용률을 반환합니다."""
+        result = {}
+        for name, spec in list(self._specs.items()):
+            available = self.store.available(name, spec)
+            result[name] = {
+                "available": available,
+                "capacity": spec.capacity,
+                "utilization": 1 - max(available, 0.0) / spec.capacity if spec.capacity else 0.0,
+            }
+        return result
+
+    def _collect(self) -> list:
+        if not self.enabled:
+            return []
+        samples = []
+        for name, row in self.headroom().items():
+            samples.append(("rate_limit_available", {"bucket": name}, row["available"]))
+            samples.append(("rate_limit_capacity", {"bucket": name}, row["capacity"]))
+        return samples
+
+
+# %%
+rate_limiter = RateLimiter()
+rate_limiter.configure("youtube.quota", YOUTUBE_QUOTA_BURST, YOUTUBE_DAILY_QUOTA / 86400)
+metrics.register_collector(rate_limiter._collect)
+
+
+def youtube_quota_cost(method: str) -> int:
+    return YOUTUBE_QUOTA_COSTS.get(method, 1)
+
+
+def acquire_youtube(method: str) -> float:
+    """YouTube Data API 호출 전에 호출합니다. 할당량이 모자라면 찰 때까지 기다립니다."""
+    return rate_limiter.acquire("youtube.quota", youtube_quota_cost(method))
+
+
+async def aacquire_youtube(method: str) -> float:
+    return await rate_limiter.aacquire("youtube.quota", youtube_quota_cost(method))
+
+
+def _parse_openai_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        model, values = item.split("=", 1)
+        rpm, tpm = values.split(":")
+        limits[model.strip()] = (int(rpm), int(tpm))
+    return limits
+
+
+_openai_limits = _parse_openai_limits(OPENAI_RATE_LIMITS)
+
+
+def openai_buckets(model: str) -> Tuple[str, str]:
+    """모델의 (요청 수 버킷, 토큰 버킷) 이름을 반환합니다. 처음 쓰는 모델이면 버킷을 만듭니다."""
+    requests_bucket, tokens_bucket = f"openai.{model}.requests", f"openai.{model}.tokens"
+    rpm, tpm = _openai_limits.get(model, OPENAI_DEFAULT_RATE_LIMIT)
+    if not rate_limiter.is_configured(requests_bucket):
+        rate_limiter.configure(requests_bucket, rpm, rpm / 60)
+    if not rate_limiter.is_configured(tokens_bucket):
+        rate_limiter.configure(tokens_bucket, tpm, tpm / 60)
+    return requests_bucket, tokens_bucket
+
+
+def acquire_openai(model: str, tokens: int, requests: int = 1) -> float:
+    """콜백을 쓰지 않는 OpenAI 호출(임베딩 등) 전에 호출합니다. 요청 수와 토큰 수를 함께 꺼냅니다."""
+    requests_bucket, tokens_bucket = openai_buckets(model)
+    return rate_limiter.acquire(requests_bucket, requests) + rate_limiter.acquire(tokens_bucket, tokens)
+
+
+async def aacquire_openai(model: str, tokens: int, requests: int = 1) -> float:
+    requests_bucket, tokens_bucket = openai_buckets(model)
+    return await rate_limiter.aacquire(requests_bucket, requests) + await rate_limiter.aacquire(tokens_bucket, tokens)
+
+
+# %%
+_rate_limit_handlers: Optional[tuple] = None
+
+
+def _in_event_loop() -> bool:
+    import asyncio
+
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _rate_limit_handler_pair() -> tuple:
+    """
+    (동기 핸들러, 비동기 핸들러)를 반환합니다. 두 핸들러는 잡아 둔 토큰 기록을 함께 쓰고,
+    이벤트 루프 안에서 온 호출(ainvoke/astream)은 비동기 핸들러가, 그 밖의 호출은 동기 핸들러가 맡습니다.
+    (LangChain은 동기 핸들러를 비동기 호출에서 기본 스레드 풀로 실행하므로, 거기서 acquire로 기다리면
+    asyncio.to_thread를 쓰는 자막 받기 같은 작업이 스레드를 얻지 못합니다.)
+    """
+    global _rate_limit_handlers
+    if _rate_limit_handlers is None:
+        from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+
+        reserved: Dict[object, Tuple[str, int]] = {}
+
+        def reserve(messages, run_id, invocation_params, metadata) -> Tuple[str, str, int]:
+            from token_budget import count_tokens
+
+            params = invocation_params or {}
+            model = (metadata or {}).get("ls_model_name") or params.get("model") or params.get("model_name") or "default"
+            requests_bucket, tokens_bucket = openai_buckets(model)
+            prompt_tokens = sum(
+                count_tokens(m.content if isinstance(m.content, str) else str(m.content), model)
+                for batch in messages for m in batch
+            )
+            amount = prompt_tokens + (params.get("max_tokens") or OPENAI_EXPECTED_COMPLETION_TOKENS)
+            reserved[run_id] = (tokens_bucket, amount)
+            return requests_bucket, tokens_bucket, amount
+
+        def settle(response, run_id):
+            entry = reserved.pop(run_id, None)
+            if entry is None:
+                return
+            tokens_bucket, amount = entry
+            used = 0
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        used += usage.get("total_tokens", 0)
+            if used:
+                rate_limiter.release(tokens_bucket, amount - used)
+
+        def refund(run_id):
+            entry = reserved.pop(run_id, None)
+            if entry is not None:
+                rate_limiter.release(*entry)
+
+        class RateLimitHandler(BaseCallbackHandler):
+            raise_error = True  # 대기 시간 초과(RateLimitTimeout)를 호출한 쪽으로 전달
+
+            @property
+            def ignore_chat_model(self) -> bool:
+                return _in_event_loop()
+
+            @property
+            def ignore_llm(self) -> bool:
+                return _in_event_loop()
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, metadata=None, **kwargs):
+                requests_bucket, tokens_bucket, amount = reserve(messages, run_id, invocation_params, metadata)
+                try:
+                    rate_limiter.acquire(requests_bucket)
+                    rate_limiter.acquire(tokens_bucket, amount)
+                except BaseException:
+                    reserved.pop(run_id, None)
+                    raise
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                settle(response, run_id)
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                refund(run_id)
+
+        class AsyncRateLimitHandler(AsyncCallbackHandler):
+            raise_error = True
+
+            @property
+            def ignore_chat_model(self) -> bool:
+                return not _in_event_loop()
+
+            @property
+            def ignore_llm(self) -> bool:
+                return not _in_event_loop()
+
+            async def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, metadata=None, **kwargs):
+                requests_bucket, tokens_bucket, amount = reserve(messages, run_id, invocation_params, metadata)
+                try:
+                    await rate_limiter.aacquire(requests_bucket)
+                    await rate_limiter.aacquire(tokens_bucket, amount)
+                except BaseException:
+                    reserved.pop(run_id, None)
+                    raise
+
+            async def on_llm_end(self, response, *, run_id, **kwargs):
+                settle(response, run_id)
+
+            async def on_llm_error(self, error, *, run_id, **kwargs):
+                refund(run_id)
+
+        _rate_limit_handlers = (RateLimitHandler(), AsyncRateLimitHandler())
+    return _rate_limit_handlers
+
+
+def rate_limit_callback():
+    """
+    LLM 요청 직전에 모델별 RPM/TPM 버킷에서 (프롬프트 토큰 + 예상 응답 토큰)을 꺼내고,
+    응답을 받으면 실제 사용량으로 정산하는 동기 호출용 콜백 핸들러를 반환합니다.
+    """
+    return _rate_limit_handler_pair()[0]
+
+
+def async_rate_limit_callback():
+    """rate_limit_callback의 비동기 호출용 핸들러입니다. 이벤트 루프에서 aacquire로 기다립니다."""
+    return _rate_limit_handler_pair()[1]
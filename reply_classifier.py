@@ -0,0 +1,173 @@
+# %%
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+# %%
+# 라우팅 결과 (youtube_agent.router의 반환값과 동일한 이름을 사용)
+SCRIPT = "summarize_script"
+COMMENT = "summarize_comment"
+DECLINE = "decline"
+
+# "영상에 대한 댓글 반응도 궁금하시다면 알려드릴게요!" 질문에 대한 긍정/부정 응답 사전
+AFFIRMATIVE_WORDS = {
+    "응", "웅", "엉", "네", "넵", "넹", "예", "옙", "그래", "그래요", "좋아", "좋아요", "좋지",
+    "ㅇㅇ", "ㅇㅋ", "오케이", "콜", "당연", "당연하지", "물론", "yes", "y", "yeah", "yep", "yup",
+    "sure", "ok", "okay", "please", "plz",
+}
+# 한글 어간은 띄어쓰기를 무시하고 부분 문자열로, 영어 어간은 단어 단위로 비교합니다. ("hotel"이 "tell"로 잡히지 않도록)
+AFFIRMATIVE_STEMS = ("보여줘", "보여주", "알려줘", "알려주", "궁금", "부탁", "해줘", "해주세요", "듣고싶", "보고싶", "show", "tell")
+
+NEGATIVE_WORDS = {
+    "아니", "아니요", "아니오", "아뇨", "노", "ㄴㄴ", "ㄴ", "됐어", "됐어요", "됐다", "싫어", "싫어요",
+    "no", "n", "nope", "nah",
+}
+NEGATIVE_STEMS = ("괜찮", "글쎄", "필요없", "다음에", "나중에", "그만", "nothanks")
+# 긍정 어간 앞에 붙으면 부정이 되는 접두어 ("안 보여줘", "안 궁금해")
+NEGATION_PREFIXES = ("안", "못", "not", "dont")
+
+# 이 길이를 넘는 답변은 규칙으로 판단하지 않고 LLM에 맡깁니다.
+MAX_RULE_REPLY_LENGTH = 20
+
+_APOSTROPHE_RE = re.compile(r"['’]")  # "don't" -> "dont"
+_REPEAT_RE = re.compile(r"(.)\1+")
+_STRIP_RE = re.compile(r"[^0-9a-z가-힣ㄱ-ㅎㅏ-ㅣ\u1100-\u11ff ]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+# %%
+def normalize_reply(reply: Optional[str]) -> str:
+    """
+    답변을 비교하기 쉬운 형태로 정규화합니다.
+    (NFKC 정규화, 소문자화, 구두점/이모지 제거, 반복 문자 축약: "응응응!!" -> "응")
+    """
+    if not reply:
+        return ""
+    text = unicodedata.normalize("NFKC", reply).lower()
+    text = _APOSTROPHE_RE.sub("", text)
+    text = _STRIP_RE.sub(" ", text)
+    text = _REPEAT_RE.sub(r"\1", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+# 사전도 답변과 같은 방식으로 정규화해 둡니다. (NFKC는 "ㅇㅇ" 같은 호환 자모도 변환하기 때문)
+_AFFIRMATIVE_WORDS = {normalize_reply(word) for word in AFFIRMATIVE_WORDS}
+_NEGATIVE_WORDS = {normalize_reply(word) for word in NEGATIVE_WORDS}
+
+
+def _split_stems(stems) -> tuple:
+    """정규화한 어간을 (한글 어간, 영어 어간)으로 나눕니다."""
+    normalized = [normalize_reply(stem).replace(" ", "") for stem in stems]
+    return (
+        tuple(stem for stem in normalized if not stem.isascii()),
+        frozenset(stem for stem in normalized if stem.isascii()),
+    )
+
+
+_AFFIRMATIVE_STEMS, _AFFIRMATIVE_EN_STEMS = _split_stems(AFFIRMATIVE_STEMS)
+_NEGATIVE_STEMS, _NEGATIVE_EN_STEMS = _split_stems(NEGATIVE_STEMS)
+_NEGATION_PREFIXES, _NEGATION_EN_PREFIXES = _split_stems(NEGATION_PREFIXES)
+
+
+def _negated(compact: str, tokens: list) -> bool:
+    """"안 보여줘", "dont show"처럼 부정 접두어 바로 뒤에 긍정 어간이 오는지 확인합니다."""
+    if any(prefix + stem in compact for prefix in _NEGATION_PREFIXES for stem in _AFFIRMATIVE_STEMS):
+        return True
+    return any(
+        prefix in _NEGATION_EN_PREFIXES and word in _AFFIRMATIVE_EN_STEMS
+        for prefix, word in zip(tokens, tokens[1:])
+    )
+
+
+def classify_reply(url: Optional[str], reply: Optional[str]) -> Optional[str]:
+    """
+    규칙만으로 라우팅을 결정합니다.
+
+    Returns:
+        SCRIPT / COMMENT / DECLINE 중 하나, 판단이 애매하면 None (LLM 라우터로 넘김)
+    """
+    if reply is None or not reply.strip():
+        # 답변이 비어 있으면 URL 입력 턴이므로 스크립트 요약으로 보냅니다.
+        return SCRIPT
+    normalized = normalize_reply(reply)
+    if not normalized or len(normalized) > MAX_RULE_REPLY_LENGTH:
+        return None
+
+    compact = normalized.replace(" ", "")
+    tokens = normalized.split()
+    words = set(tokens)
+
+    if _negated(compact, tokens):
+        return DECLINE
+    is_negative = (
+        bool(words & _NEGATIVE_WORDS) or bool(words & _NEGATIVE_EN_STEMS)
+        or any(stem in compact for stem in _NEGATIVE_STEMS)
+    )
+    is_affirmative = (
+        bool(words & _AFFIRMATIVE_WORDS) or bool(words & _AFFIRMATIVE_EN_STEMS)
+        or any(stem in compact for stem in _AFFIRMATIVE_STEMS)
+    )
+
+    if is_negative and not is_affirmative:
+        return DECLINE
+    if is_affirmative and not is_negative:
+        return COMMENT
+    return None
+
+
+# %%
+class RouteDecisionMemo:
+    """
+    최근 라우팅 결정을 기억하고, LLM 호출을 몇 번 건너뛰었는지 집계합니다.
+    키는 (URL 유무, 정규화된 답변)이므로 "응!"과 "응응"은 같은 결정으로 취급됩니다.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._memo: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rule_hits = 0
+        self.memo_hits = 0
+        self.llm_calls = 0
+
+    @staticmethod
+    def _key(url: Optional[str], reply: Optional[str]) -> tuple:
+        return bool(url), normalize_reply(reply)
+
+    def lookup(self, url: Optional[str], reply: Optional[str]) -> Optional[str]:
+        """규칙 -> 메모 순서로 결정을 찾고, 없으면 None을 반환합니다."""
+        decision = classify_reply(url, reply)
+        with self._lock:
+            if decision is not None:
+                self.rule_hits += 1
+                return decision
+            key = self._key(url, reply)
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return self._memo[key]
+            return None
+
+    def remember(self, url: Optional[str], reply: Optional[str], decision: str):
+        """LLM이 내린 결정을 기록합니다."""
+        key = self._key(url, reply)
+        with self._lock:
+            self.llm_calls += 1
+            self._memo[key] = decision
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.max_size:
+                self._memo.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.rule_hits + self.memo_hits + self.llm_calls
+            skipped = self.rule_hits + self.memo_hits
+            return {
+                "rule_hits": self.rule_hits,
+                "memo_hits": self.memo_hits,
+                "llm_calls": self.llm_calls,
+                "skipped_llm_calls": skipped,
+                "skip_rate": skipped / total if total else 0.0,
+            }
@@ -0,0 +1,473 @@
+# %%
+# LLM 호출 복원력 계층: 재시도(지터 지수 백오프), 헤지 요청, 모델별 서킷 브레이커, 종단 간 마감 시간
+#
+# - 일시적 오류(타임아웃/연결 끊김/429/5xx)만 재시도하고, 잘못된 요청 같은 오류는 바로 올립니다.
+# - 호출이 같은 종류 호출의 최근 p95 지연보다 오래 걸리면 같은 요청을 하나 더 보내(헤지) 먼저 끝난 쪽을 씁니다.
+#   헤지 요청은 화면 토큰 스트리밍(LangGraph 콜백)에 섞이지 않도록 부모 실행의 config 없이 보냅니다.
+# - 모델별로 일시적 오류가 연달아 쌓이면 서킷을 열어 한동안 바로 실패시키고, 쿨다운 뒤 시험 호출 하나로 닫을지 정합니다.
+# - 마감 시각은 진입점(app2 / batch_runner)에서 with_deadline(config)로 config["configurable"]["deadline"]에 넣습니다.
+#   노드 안에서는 LangChain이 context로 넘겨주는 현재 config에서 읽으므로, 하위 그래프 노드까지 따로 넘길 필요가 없습니다.
+#   남은 시간이 없으면 기다리던 호출을 버리고 DeadlineExceeded를 올리며, 재시도/헤지도 하지 않습니다.
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, Optional, TypeVar
+
+from instrumentation import metrics
+
+T = TypeVar("T")
+
+# %%
+RESILIENCE_ENABLED = os.getenv("LLM_RESILIENCE", "1") != "0"
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") != "0"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # 지연 표본이 이만큼 쌓이기 전에는 헤지하지 않음
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))  # 헤지 요청은 전체 호출의 이 비율까지만
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))  # 연속 일시적 오류가 이만큼이면 서킷을 엶
+LLM_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", "30"))
+LLM_CALL_WORKERS = int(os.getenv("LLM_CALL_WORKERS", "128"))
+# 진입점에서 요청 하나(한 턴 / 배치 작업 하나)에 주는 시간 (0이면 마감 없음)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "180"))
+LATENCY_WINDOW = 200  # 호출 종류별로 기억할 최근 지연 표본 수
+
+# 이름으로 판별하는 일시적 오류 (openai / httpx 예외를 import하지 않고 구분)
+_TRANSIENT_ERRORS = {
+    "APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+    "ServiceUnavailableError", "ReadTimeout", "ConnectTimeout", "ConnectError", "RemoteProtocolError",
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """요청의 마감 시각이 지났을 때 발생합니다. (재시도하지 않음)"""
+
+
+class CircuitOpenError(RuntimeError):
+    """모델의 서킷이 열려 있어 호출하지 않고 바로 실패할 때 발생합니다."""
+
+
+class CallCancelled(Exception):
+    """헤지 경쟁에서 진 호출(또는 마감 시각이 지나 버린 호출)을 멈출 때 스트림 안에서 발생합니다."""
+
+
+@dataclass(frozen=True)
+class ResiliencePolicy:
+    enabled: bool = RESILIENCE_ENABLED
+    max_attempts: int = LLM_MAX_ATTEMPTS
+    backoff_base: float = LLM_BACKOFF_BASE_SECONDS
+    backoff_max: float = LLM_BACKOFF_MAX_SECONDS
+    hedge: bool = LLM_HEDGE
+    hedge_quantile: float = LLM_HEDGE_QUANTILE
+    hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES
+    hedge_budget: float = LLM_HEDGE_BUDGET
+    circuit_failures: int = LLM_CIRCUIT_FAILURES
+    circuit_cooldown: float = LLM_CIRCUIT_COOLDOWN_SECONDS
+
+
+policy = ResiliencePolicy()
+
+
+def set_policy(new_policy: Optional[ResiliencePolicy] = None) -> ResiliencePolicy:
+    """정책을 바꾸고(None이면 환경 변수 기본값) 지연 표본/서킷 상태를 초기화합니다. (벤치마크/비교 실행용)"""
+    global policy
+    policy = new_policy or ResiliencePolicy()
+    latency_tracker.clear()
+    with _breakers_lock:
+        _breakers.clear()
+    return policy
+
+
+def is_transient(error: BaseException) -> bool:
+    """다시 보내면 성공할 수 있는 오류인지 판단합니다."""
+    if isinstance(error, (DeadlineExceeded, CircuitOpenError, CallCancelled)):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in _TRANSIENT_ERRORS:
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in (408, 409, 429) or status >= 500)
+
+
+# %%
+# 마감 시각 (epoch 초)
+def with_deadline(config: Optional[dict] = None, seconds: float = REQUEST_DEADLINE_SECONDS) -> dict:
+    """
+    config 복사본의 configurable["deadline"]에 지금부터 seconds 뒤의 시각을 넣어 반환합니다.
+    이미 마감 시각이 있으면 더 이른 쪽을 유지하고, seconds가 0 이하면 마감 시각을 넣지 않습니다.
+    """
+    config = dict(config or {})
+    configurable = dict(config.get("configurable") or {})
+    if seconds and seconds > 0:
+        deadline = time.time() + seconds
+        configurable["deadline"] = min(configurable.get("deadline") or deadline, deadline)
+    config["configurable"] = configurable
+    return config
+
+
+def current_deadline() -> Optional[float]:
+    """지금 실행 중인 노드/체인의 config에 들어 있는 마감 시각을 반환합니다. 없으면 None입니다."""
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    config = var_child_runnable_config.get() or {}
+    return (config.get("configurable") or {}).get("deadline")
+
+
+def remaining_seconds(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline(deadline: Optional[float], what: str = "요청"):
+    """마감 시각이 지났으면 DeadlineExceeded를 발생시킵니다."""
+    remaining = remaining_seconds(deadline)
+    if remaining is not None and remaining <= 0:
+        metrics.inc("deadline_exceeded_total", call=what)
+        raise DeadlineExceeded(f"{what}: 요청 마감 시각이 {-remaining:.1f}초 지났습니다.")
+
+
+# %%
+class LatencyTracker:
+    """
+    호출 종류("모델:이름")별 최근 성공 지연을 모아 헤지 지연(분위수)을 계산하고,
+    헤지 요청이 전체 시도의 일정 비율을 넘지 않도록 시도/헤지 수를 셉니다.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, list] = {}  # [시도 수, 헤지 수]
+        self._lock = threading.Lock()
+
+    def count_attempt(self, key: str):
+        with self._lock:
+            self._counts.setdefault(key, [0, 0])[0] += 1
+
+    def try_hedge(self, key: str, budget: float) -> bool:
+        """헤지 수가 시도 수 * budget (+1)보다 적으면 헤지 하나를 세고 True를 반환합니다. (모델 전체가 느려질 때 부하가 두 배가 되지 않도록)"""
+        with self._lock:
+            counts = self._counts.setdefault(key, [0, 0])
+            if counts[1] >= budget * counts[0] + 1:
+                return False
+            counts[1] += 1
+            return True
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, key: str, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+class CircuitBreaker:
+    """
+    모델 하나의 서킷 브레이커입니다.
+    closed(정상) -> 연속 일시적 오류 N번 -> open(바로 실패) -> 쿨다운 후 half_open(시험 호출 1개만 허용)
+    -> 시험 호출이 성공하면 closed, 실패하면 다시 open
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, model: str):
+        self.model = model
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < policy.circuit_cooldown:
+                    return False
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._trial_running:
+                    return False
+                self._trial_running = True
+            return True
+
+    def success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"✅ {self.model} 서킷을 닫습니다. (시험 호출 성공)")
+            self.state, self.failures, self._trial_running = "closed", 0, False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= policy.circuit_failures:
+                if self.state != "open":
+                    metrics.inc("llm_circuit_opened_total", model=self.model)
+                    print(f"⛔ {self.model} 서킷을 엽니다. (연속 오류 {self.failures}회, {policy.circuit_cooldown:g}초 동안 바로 실패)")
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def abandon(self):
+        """일시적 오류가 아닌 이유로 끝난 시험 호출은 판단에 쓰지 않고 다음 호출이 다시 시험하게 합니다."""
+        with self._lock:
+            self._trial_running = False
+
+
+latency_tracker = LatencyTracker()
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = _breakers[model] = CircuitBreaker(model)
+        return breaker
+
+
+def _collect() -> list:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [("llm_circuit_state", {"model": b.model}, CircuitBreaker.STATES[b.state]) for b in breakers]
+
+
+metrics.register_collector(_collect)
+
+
+# %%
+# 헤지에서 진 호출을 멈추기 위한 취소 신호 (시도마다 따로 가짐)
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("llm_call_cancel", default=None)
+
+
+def cancellable(chunks: Iterable[T]) -> Iterable[T]:
+    """
+    스트림을 call_llm 안에서 소비할 때 감쌉니다. 이 시도가 헤지 경쟁에서 졌거나 버려지면
+    다음 조각에서 CallCancelled를 발생시켜 스트림을 닫습니다. (모델도 생성을 멈춤)
+    """
+    cancel = _cancel_event.get()
+    for chunk in chunks:
+        if cancel is not None and cancel.is_set():
+            raise CallCancelled("헤지 경쟁에서 진 호출을 멈춥니다.")
+        yield chunk
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=LLM_CALL_WORKERS, thread_name_prefix="llm-call")
+    return _executor
+
+
+def _detach_callbacks():
+    """헤지 요청은 부모 실행의 config(콜백/태그) 없이 보내 화면 토큰 스트리밍에 섞이지 않게 합니다."""
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    var_child_runnable_config.set(None)
+
+
+class _Call:
+    """call_llm / acall_llm 한 번의 재시도/헤지/서킷 판단을 모아 둔 상태입니다."""
+
+    def __init__(self, model: str, name: str, deadline: Optional[float]):
+        self.model, self.name = model, name
+        self.key = f"{model}:{name}"
+        self.policy = policy
+        self.deadline = current_deadline() if deadline is None else deadline
+        self.breaker = circuit_breaker(model)
+
+    def before_attempt(self):
+        check_deadline(self.deadline, self.name)
+        if not self.breaker.allow():
+            metrics.inc("llm_circuit_rejections_total", model=self.model, call=self.name)
+            raise CircuitOpenError(f"{self.model} 서킷이 열려 있어 호출하지 않습니다. (최근 연속 오류)")
+        latency_tracker.count_attempt(self.key)
+        metrics.inc("llm_attempts_total", model=self.model, call=self.name)
+
+    def hedge_delay(self) -> Optional[float]:
+        p = self.policy
+        if not p.hedge:
+            return None
+        return latency_tracker.quantile(self.key, p.hedge_quantile, p.hedge_min_samples)
+
+    def may_hedge(self) -> bool:
+        if latency_tracker.try_hedge(self.key, self.policy.hedge_budget):
+            return True
+        metrics.inc("llm_hedges_skipped_total", model=self.model, call=self.name)
+        return False
+
+    def wait_timeout(self, hedge_at: Optional[float]) -> Optional[float]:
+        """다음에 깨어날 때까지의 시간 (헤지 시각과 마감 시각 중 이른 쪽)"""
+        timeouts = [t for t in (remaining_seconds(self.deadline), None if hedge_at is None else hedge_at - time.monotonic()) if t is not None]
+        return max(0.0, min(timeouts)) if timeouts else None
+
+    def deadline_passed(self) -> bool:
+        remaining = remaining_seconds(self.deadline)
+        return remaining is not None and remaining <= 0
+
+    def succeeded(self, started: float, winner: Optional[str]):
+        latency_tracker.record(self.key, time.monotonic() - started)
+        self.breaker.success()
+        if winner is not None:
+            metrics.inc("llm_hedges_total", model=self.model, call=self.name, winner=winner)
+
+    def failed(self, error: BaseException, attempt: int) -> float:
+        """실패한 시도를 기록하고 재시도 전 기다릴 초를 반환합니다. 재시도하지 않을 오류면 그대로 다시 발생시킵니다."""
+        if not is_transient(error):
+            self.breaker.abandon()
+            raise error
+        self.breaker.failure()
+        if attempt >= self.policy.max_attempts:
+            raise error
+        # full jitter: 0 ~ min(최대, 기본 * 2^(시도-1)) 사이에서 고르게 뽑아 재시도가 한꺼번에 몰리지 않게 합니다.
+        delay = random.uniform(0, min(self.policy.backoff_max, self.policy.backoff_base * 2 ** (attempt - 1)))
+        remaining = remaining_seconds(self.deadline)
+        if remaining is not None and delay >= remaining:
+            raise error
+        metrics.inc("llm_retries_total", model=self.model, call=self.name, error=type(error).__name__)
+        print(f"🔁 {self.model} {self.name} 일시적 오류로 {delay:.2f}초 뒤 다시 요청합니다. ({attempt}/{self.policy.max_attempts}) - {type(error).__name__}: {error}")
+        return delay
+
+    def timed_out(self) -> DeadlineExceeded:
+        metrics.inc("deadline_exceeded_total", call=self.name)
+        return DeadlineExceeded(f"{self.name}: 요청 마감 시각까지 {self.model} 응답을 받지 못했습니다.")
+
+
+# %%
+def _submit(fn: Callable[[], T], hedge: bool):
+    cancel = threading.Event()
+    context = contextvars.copy_context()  # 노드 span / 실행 config를 작업 스레드로 넘김
+
+    def run():
+        _cancel_event.set(cancel)
+        if hedge:
+            _detach_callbacks()
+        return fn()
+
+    return _get_executor().submit(context.run, run), cancel
+
+
+def _race(call: _Call, fn: Callable[[], T]) -> T:
+    """시도 한 번: 원래 요청을 보내고, 헤지 지연이 지나도 끝나지 않으면 같은 요청을 하나 더 보내 먼저 성공한 쪽을 씁니다."""
+    started = time.monotonic()
+    future, cancel = _submit(fn, hedge=False)
+    running = {future: ("primary", cancel)}
+    hedge_delay = call.hedge_delay()
+    hedge_at = None if hedge_delay is None else started + hedge_delay
+    hedged = False  # 헤지 요청을 실제로 보냈는지
+    try:
+        while True:
+            done, _ = wait(list(running), timeout=call.wait_timeout(hedge_at), return_when=FIRST_COMPLETED)
+            for finished in done:
+                label, _ = running.pop(finished)
+                error = finished.exception()
+                if error is None:
+                    call.succeeded(started, label if hedged else None)
+                    return finished.result()
+                if not running:
+                    if hedged:
+                        metrics.inc("llm_hedges_total", model=call.model, call=call.name, winner="none")
+                    raise error
+            if done:
+                continue
+            if call.deadline_passed():
+                raise call.timed_out()
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if call.may_hedge():
+                    hedge_future, hedge_cancel = _submit(fn, hedge=True)
+                    running[hedge_future] = ("hedge", hedge_cancel)
+                    hedged = True
+    finally:
+        for _, cancel_other in running.values():
+            cancel_other.set()
+
+
+def call_llm(model: str, fn: Callable[[], T], name: str = "llm", deadline: Optional[float] = None) -> T:
+    """
+    fn()(LLM 호출 하나)을 재시도/헤지/서킷 브레이커/마감 시각 아래에서 실행하고 결과를 반환합니다.
+    스트림을 소비하는 fn이면 스트림을 cancellable()로 감싸 헤지에서 진 호출이 바로 멈추게 합니다.
+    deadline을 주지 않으면 현재 실행 config의 마감 시각을 씁니다.
+    """
+    if not policy.enabled:
+        return fn()
+    call = _Call(model, name, deadline)
+    attempt = 0
+    while True:
+        attempt += 1
+        call.before_attempt()
+        try:
+            return _race(call, fn)
+        except Exception as e:
+            time.sleep(call.failed(e, attempt))
+
+
+async def _arace(call: _Call, afn: Callable[[], Awaitable[T]]) -> T:
+    """_race의 비동기 버전입니다. 진 쪽 태스크는 cancel()로 멈춥니다."""
+    async def hedge_run():
+        _detach_callbacks()
+        return await afn()
+
+    started = time.monotonic()
+    running = {asyncio.ensure_future(afn()): "primary"}
+    hedge_delay = call.hedge_delay()
+    hedge_at = None if hedge_delay is None else started + hedge_delay
+    hedged = False  # 헤지 요청을 실제로 보냈는지
+    try:
+        while True:
+            done, _ = await asyncio.wait(list(running), timeout=call.wait_timeout(hedge_at), return_when=asyncio.FIRST_COMPLETED)
+            for finished in done:
+                label = running.pop(finished)
+                error = finished.exception()
+                if error is None:
+                    call.succeeded(started, label if hedged else None)
+                    return finished.result()
+                if not running:
+                    if hedged:
+                        metrics.inc("llm_hedges_total", model=call.model, call=call.name, winner="none")
+                    raise error
+            if done:
+                continue
+            if call.deadline_passed():
+                raise call.timed_out()
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if call.may_hedge():
+                    running[asyncio.ensure_future(hedge_run())] = "hedge"
+                    hedged = True
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def acall_llm(model: str, afn: Callable[[], Awaitable[T]], name: str = "llm", deadline: Optional[float] = None) -> T:
+    """call_llm의 비동기 버전입니다. afn()은 LLM 호출 코루틴을 만들어 반환해야 합니다."""
+    if not policy.enabled:
+        return await afn()
+    call = _Call(model, name, deadline)
+    attempt = 0
+    while True:
+        attempt += 1
+        call.before_attempt()
+        try:
+            return await _arace(call, afn)
+        except Exception as e:
+            await asyncio.sleep(call.failed(e, attempt))
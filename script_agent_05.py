@@ -1,19 +1,43 @@
 # %%
-from typing import TypedDict
+from typing import TypedDict, List
 from urllib.parse import urlparse
+import os
 import re
 import json
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+from instrumentation import instrument_node
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langgraph.graph import StateGraph, START, END
-from youtube_transcript_api import YouTubeTranscriptApi
+from transcript_cache import fetch_transcript, afetch_transcript
+from summary_cache import summary_cache
+from token_budget import count_tokens, plan_transcript, transcript_token_budget
+from llm_factory import get_chat_model
+from json_stream import JsonStreamError, loads_llm_json, stream_json_with_retry, astream_json_with_retry
+from resilience import acall_llm, call_llm, cancellable
+from single_flight import single_flight
+from model_cascade import model_cascade
 
 # %%
 load_dotenv()
 
 # %%
-llm = ChatOpenAI(model="gpt-4o", streaming=True)
+# 토큰 예산/구간 나누기의 기준 모델입니다. 실제 요약 모델은 model_cascade의 단계(작은 모델 -> 큰 모델)를 따릅니다.
+SUMMARY_MODEL = "gpt-4o"
+
+def get_llm(model: str = SUMMARY_MODEL):
+    """요약 모델을 반환합니다. (처음 호출될 때 만들어 재사용, llm_factory.set_chat_model_factory로 바꿀 수 있음)"""
+    return get_chat_model(model, streaming=True)
+
+# %%
+# 자막이 모델의 토큰 예산(token_budget.MODEL_TRANSCRIPT_TOKEN_BUDGETS)을 넘을 때의 처리 방식
+# - "map_reduce": 자르지 않고 구간별로 나눠 요약(map)한 뒤 하나로 합칩니다(reduce).
+# - "sample": 영상 전체에서 균등하게 구간을 골라 예산 안으로 줄인 뒤 한 번에 요약합니다.
+LONG_TRANSCRIPT_STRATEGY = os.getenv("LONG_TRANSCRIPT_STRATEGY", "map_reduce")
+CHUNK_SIZE_TOKENS = int(os.getenv("MAP_REDUCE_CHUNK_SIZE_TOKENS", "3000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("MAP_REDUCE_CHUNK_OVERLAP_TOKENS", "100"))
+MAP_MAX_CONCURRENCY = int(os.getenv("MAP_REDUCE_MAX_CONCURRENCY", "4"))  # 동시에 요약할 구간 수
+MAP_MAX_ROUNDS = 3  # 메모가 줄어들지 않는 경우를 대비한 최대 map 반복 횟수
 
 # %%
 class AgentState(TypedDict):
@@ -22,12 +46,18 @@ class AgentState(TypedDict):
 
     Attributes:
         url (str): 사용자가 입력한 유튜브 URL
-        transcript (str): 추출된 영상 자막 텍스트
+        video_id (str): URL에서 추출한 영상 ID (상위 그래프가 이미 구해 두었으면 그대로 사용)
+        transcript (str): 추출된 영상 자막 텍스트 (토큰 예산 단계 이후에는 요약에 넘길 텍스트)
+        transcript_segments (List[str]): 시간 순서대로 정렬된 자막 조각 목록
+        token_budget (dict): 토큰 예산 단계의 계산 내역 (전체/유지 토큰 수, 예산, 처리 방식 등)
         summary (str): LLM이 생성한 최종 요약 (JSON 형식)
         error (str): 처리 과정에서 발생한 오류 메시지
     """
     url: str
+    video_id: str
     transcript: str
+    transcript_segments: List[str]
+    token_budget: dict
     script_summary: str
     error: str
 
@@ -47,37 +77,71 @@ def extract_video_id(url):
     return None
 
 # %%
+def _require_video_id(user_url: str) -> str:
+    video_id = extract_video_id(user_url)
+    if not video_id:
+        raise ValueError("유효한 유튜브 URL에서 Video ID를 추출할 수 없습니다.")
+    print(f"✅ 영상 ID 추출 성공: {video_id}")
+    return video_id
+
+def _state_video_id(state: AgentState) -> str:
+    """상위 그래프(youtube_agent)가 넘겨준 영상 ID가 있으면 재사용하고, 없으면 URL에서 추출합니다."""
+    return state.get("video_id") or _require_video_id(state["url"])
+
+def _transcript_result(video_id: str, transcript_list: List[dict]) -> dict:
+    """자막 목록을 하나의 텍스트로 합치고 검증해 state 업데이트를 만듭니다."""
+    segments = [item['text'] for item in transcript_list]
+    transcript_text = " ".join(segments)
+
+    if len(transcript_text) < 100:
+        raise ValueError("자막 내용이 너무 짧아 요약할 수 없습니다.")
+
+    print("✅ 1. 자막 추출 성공")
+    return {"video_id": video_id, "transcript": transcript_text, "transcript_segments": segments, "error": None}
+
+def _transcript_error(e: Exception) -> dict:
+    error_message = f"ERROR: 자막 추출 중 오류 발생 - {e}"
+    print(f"🚨 {error_message}")
+    return {"transcript": "", "transcript_segments": [], "error": error_message}
+
 def get_youtube_transcript(state: AgentState) -> dict:
     """
     state에서 URL을 받아 자막을 추출하고, 
     결과를 state의 'transcript' 또는 'error' 필드에 저장합니다.
     """
     print("🚀 [Tool] get_youtube_transcript 호출됨")
-    user_url = state["url"]
-    
     try:
-        video_id = extract_video_id(user_url)
-        if not video_id:
-            raise ValueError("유효한 유튜브 URL에서 Video ID를 추출할 수 없습니다.")
-
-        print(f"✅ 영상 ID 추출 성공: {video_id}")
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['ko', 'en'])
-        transcript_text = " ".join([item['text'] for item in transcript_list])
-
-        if len(transcript_text) < 100:
-            raise ValueError("자막 내용이 너무 짧아 요약할 수 없습니다.")
-        
-        if len(transcript_text) > 15000:
-            print(f"⚠️ 자막 크기 초과. 일부만 사용 (최대 15000자)")
-            transcript_text = transcript_text[:15000]
-
-        print("✅ 1. 자막 추출 성공")
-        return {"transcript": transcript_text, "error": None}
+        video_id = _state_video_id(state)
+        transcript_list = fetch_transcript(video_id, languages=['ko', 'en'])
+        return _transcript_result(video_id, transcript_list)
+    except Exception as e:
+        return _transcript_error(e)
 
+async def aget_youtube_transcript(state: AgentState) -> dict:
+    """get_youtube_transcript의 비동기 버전입니다. (graph.ainvoke / astream에서 사용)"""
+    print("🚀 [Tool] get_youtube_transcript 호출됨 (async)")
+    try:
+        video_id = _state_video_id(state)
+        transcript_list = await afetch_transcript(video_id, languages=['ko', 'en'])
+        return _transcript_result(video_id, transcript_list)
     except Exception as e:
-        error_message = f"ERROR: 자막 추출 중 오류 발생 - {e}"
-        print(f"🚨 {error_message}")
-        return {"transcript": "", "error": error_message}
+        return _transcript_error(e)
+
+# %%
+def budget_transcript(state: AgentState) -> dict:
+    """
+    자막의 토큰 수를 세어 요약 모델의 토큰 예산에 맞춥니다.
+    예산을 넘으면 LONG_TRANSCRIPT_STRATEGY에 따라 map-reduce로 넘기거나,
+    영상 전체에서 균등하게 구간을 골라 예산 안으로 줄입니다. (글자 수로 자르지 않음)
+    """
+    segments = state.get("transcript_segments") or [state["transcript"]]
+    plan = plan_transcript(segments, SUMMARY_MODEL, LONG_TRANSCRIPT_STRATEGY)
+    accounting = plan["token_budget"]
+    print(
+        f"🧮 토큰 예산: 전체 {accounting['total_tokens']} / 예산 {accounting['budget_tokens']} 토큰 "
+        f"→ {accounting['strategy']} (유지 {accounting['kept_tokens']} 토큰, {accounting['tokenizer']})"
+    )
+    return plan
 
 # %%
 summarize_prompt = (
@@ -95,8 +159,8 @@ summarize_prompt = (
     '    "2. 🤲 동작 이름 - 간단한 설명",\n'
     "    ...\n"
     "  ],\n"
-    '  "자극 신체 부위": "쉼표로 구분된 부위 목록 (ex. 어깨, 종아리, 허리)"\n\n'
-    '  "영상에 대한 댓글 반응도 궁금하시다면 알려드릴게요!"\n'
+    '  "자극 신체 부위": "쉼표로 구분된 부위 목록 (ex. 어깨, 종아리, 허리)",\n'
+    '  "질문": "영상에 대한 댓글 반응도 궁금하시다면 알려드릴게요!"\n'
     "}"
 
     "🔹 **작성 규칙**\n"
@@ -108,27 +172,190 @@ summarize_prompt = (
 )
 
 # %%
+map_prompt = (
+    "너는 긴 유튜브 영상 스크립트의 한 구간을 읽고, 나중에 전체 요약을 만들 수 있도록 핵심 메모를 작성하는 AI 전문가입니다.\n\n"
+    "🔹 **메모에 포함할 내용**\n"
+    "- 이 구간의 핵심 내용 (2~3문장)\n"
+    "- 등장하는 운동 동작: '동작 이름 - 간단한 설명' 형식의 목록 (등장 순서대로, 빠짐없이)\n"
+    "- 운동 강도나 난이도에 대한 언급\n"
+    "- 자극되는 신체 부위\n\n"
+    "🔹 **작성 규칙**\n"
+    "- JSON이 아닌 간결한 글머리표 메모로 작성하세요.\n"
+    "- 스크립트에 없는 내용은 추측하지 마세요.\n"
+)
+
+def split_transcript(transcript: str) -> List[str]:
+    """자막을 문장/공백 경계에서 CHUNK_SIZE_TOKENS 토큰 크기의 구간으로 나눕니다."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE_TOKENS,
+        chunk_overlap=CHUNK_OVERLAP_TOKENS,
+        length_function=lambda text: count_tokens(text, SUMMARY_MODEL),
+        separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""],
+    )
+    return splitter.split_text(transcript)
+
+def _map_messages(chunks: List[str]) -> list:
+    return [
+        [
+            SystemMessage(content=map_prompt),
+            HumanMessage(content=f"[스크립트 구간 {i}/{len(chunks)}]\n---\n{chunk}\n---\n\n이 구간의 핵심 메모를 작성해주세요.")
+        ]
+        for i, chunk in enumerate(chunks, 1)
+    ]
+
+# 각 구간은 동시에 최대 MAP_MAX_CONCURRENCY개까지만 요약합니다.
+_map_config = {"max_concurrency": MAP_MAX_CONCURRENCY, "tags": ["map_step"]}
+
+def _join_notes(chunk_notes: List[str]) -> str:
+    return "\n\n".join(
+        f"[구간 {i}/{len(chunk_notes)}]\n{note}" for i, note in enumerate(chunk_notes, 1)
+    )
+
+def _reduce_messages(notes: str) -> list:
+    print("🧩 reduce 단계: 구간별 메모를 최종 JSON 요약으로 합칩니다.")
+    return [
+        SystemMessage(content=summarize_prompt),
+        HumanMessage(content=f"[구간별 요약 메모]\n---\n{notes}\n---\n\n위 메모는 긴 영상을 시간 순서대로 나눈 구간별 요약입니다. 영상 전체 내용을 분석하여 필수 JSON 형식에 맞춰 요약해주세요.")
+    ]
+
+def _single_pass_messages(transcript: str) -> list:
+    return [
+        SystemMessage(content=summarize_prompt),
+        HumanMessage(content=f"[분석할 스크립트]\n---\n{transcript}\n---\n\n이 영상의 내용을 분석하여 필수 JSON 형식에 맞춰 요약해주세요.")
+    ]
+
+def _next_map_round(notes: str, round_no: int):
+    """메모가 아직 길면 다음 map 단계에서 요약할 구간 목록을, 충분히 짧아졌으면 None을 반환합니다."""
+    if round_no > MAP_MAX_ROUNDS or count_tokens(notes, SUMMARY_MODEL) <= transcript_token_budget(SUMMARY_MODEL):
+        return None
+    chunks = split_transcript(notes)
+    print(f"🧩 map 단계 {round_no}: {len(chunks)}개 구간을 동시 요약 (최대 동시 {MAP_MAX_CONCURRENCY}개)")
+    return chunks
+
+def _use_map_reduce(state: AgentState) -> bool:
+    """토큰 예산 단계에서 map-reduce로 결정했는지 확인합니다."""
+    accounting = state.get("token_budget")
+    if accounting:
+        return accounting["strategy"] == "map_reduce"
+    return count_tokens(state["transcript"], SUMMARY_MODEL) > transcript_token_budget(SUMMARY_MODEL)
+
+def _prompt_tokens(messages: list) -> int:
+    return sum(count_tokens(message.content, SUMMARY_MODEL) for message in messages)
+
+def _json_completion(messages: list) -> str:
+    """
+    최종 JSON 요약을 스트리밍으로 받으며, JSON이 깨진 것이 보이면 생성을 멈추고 다시 요청합니다.
+    일시적 오류 재시도 / 느린 응답 헤지 / 마감 시각은 resilience.call_llm이,
+    작은 모델 결과가 스키마 검증을 통과하지 못할 때 큰 모델로 다시 요약하는 것은 model_cascade가 맡습니다.
+    """
+    def complete(model: str) -> str:
+        return call_llm(model, lambda: stream_json_with_retry(
+            lambda: cancellable(chunk.content for chunk in get_llm(model).stream(messages))
+        ), name="script.summary")
+    return model_cascade.run("script", complete, _prompt_tokens(messages))
+
+async def _ajson_completion(messages: list) -> str:
+    """_json_completion의 비동기 버전입니다."""
+    async def complete(model: str) -> str:
+        return await acall_llm(model, lambda: astream_json_with_retry(
+            lambda: (chunk.content async for chunk in get_llm(model).astream(messages))
+        ), name="script.summary")
+    return await model_cascade.arun("script", complete, _prompt_tokens(messages))
+
+# 구간 메모(map)는 검증할 JSON이 없으므로 첫 단계(작은) 모델로 만듭니다. (최종 reduce 요약만 승격 대상)
+def _map_note(messages: list) -> str:
+    model = model_cascade.first_model
+    return call_llm(model, lambda: get_llm(model).invoke(messages), name="script.map").content
+
+async def _amap_note(messages: list) -> str:
+    model = model_cascade.first_model
+    return (await acall_llm(model, lambda: get_llm(model).ainvoke(messages), name="script.map")).content
+
+# 구간 요약(map)도 구간마다 재시도/헤지하도록 RunnableLambda로 감싸 batch합니다. (동시 실행 수/태그는 _map_config)
+_map_runnable = None
+
+def _get_map_runnable():
+    global _map_runnable
+    if _map_runnable is None:
+        from langchain_core.runnables import RunnableLambda
+        _map_runnable = RunnableLambda(_map_note, afunc=_amap_note, name="map_note")
+    return _map_runnable
+
+def _summarize(transcript: str, map_reduce: bool) -> str:
+    """
+    짧은 자막은 한 번의 호출로 요약하고, 긴 자막은 구간별로 요약(map)한 뒤 메모를 모아 최종 JSON 요약(reduce)을 생성합니다.
+    메모를 합친 길이도 길면, 메모를 다시 나눠 요약하는 과정을 반복합니다.
+    """
+    if not map_reduce:
+        return _json_completion(_single_pass_messages(transcript))
+    notes, round_no = transcript, 1
+    while (chunks := _next_map_round(notes, round_no)) is not None:
+        notes, round_no = _join_notes(_get_map_runnable().batch(_map_messages(chunks), config=_map_config)), round_no + 1
+    return _json_completion(_reduce_messages(notes))
+
+async def _asummarize(transcript: str, map_reduce: bool) -> str:
+    """_summarize의 비동기 버전입니다."""
+    if not map_reduce:
+        return await _ajson_completion(_single_pass_messages(transcript))
+    notes, round_no = transcript, 1
+    while (chunks := _next_map_round(notes, round_no)) is not None:
+        notes, round_no = _join_notes(await _get_map_runnable().abatch(_map_messages(chunks), config=_map_config)), round_no + 1
+    return await _ajson_completion(_reduce_messages(notes))
+
+# %%
+def _script_cache_args(state: AgentState) -> tuple:
+    # 같은 영상 + 같은 스크립트 + 같은 프롬프트 + 같은 모델 단계면 캐시된 요약을 그대로 사용
+    video_id = state.get("video_id") or extract_video_id(state.get("url", ""))
+    return ("script", video_id, state["transcript"], summarize_prompt + map_prompt, model_cascade.label())
+
+def _summary_success(cache_args: tuple, script_summary: str) -> dict:
+    summary_cache.put(*cache_args, script_summary)
+    print("✅ 2. 요약 생성 성공")
+    return {"script_summary": script_summary}
+
+def _summary_error(e: Exception) -> dict:
+    error_message = f"ERROR: 요약 생성 중 오류 발생 - {e}"
+    print(f"🚨 {error_message}")
+    return {"script_summary": "", "error": error_message}
+
 def summarize_transcript(state: AgentState) -> dict:
     """
     state의 'transcript' 필드 내용을 바탕으로 요약을 생성하고, 
     'summary' 필드를 업데이트합니다.
+    토큰 예산 단계에서 map-reduce로 결정된 긴 자막은 구간별 요약 후 합치는 방식으로 요약합니다.
     """
     print("🚀 [Tool] summarize_transcript 호출됨")
-    transcript = state["transcript"]
-    
-    prompt_messages = [
-        SystemMessage(content=summarize_prompt),
-        HumanMessage(content=f"[분석할 스크립트]\n---\n{transcript}\n---\n\n이 영상의 내용을 분석하여 필수 JSON 형식에 맞춰 요약해주세요.")
-    ]
+    cache_args = _script_cache_args(state)
+    cached_summary = summary_cache.get(*cache_args)
+    if cached_summary is not None:
+        print("⚡ 요약 캐시 적중. LLM 호출을 건너뜁니다.")
+        return {"script_summary": cached_summary}
+
     try:
-        response = llm.invoke(prompt_messages)
-        script_summary = response.content
-        print("✅ 2. 요약 생성 성공")
-        return {"script_summary": script_summary}
+        # 같은 입력의 요약을 다른 요청이 이미 만들고 있으면 새로 호출하지 않고 그 결과를 함께 씁니다.
+        script_summary = single_flight.do("script_summary", summary_cache.make_key(*cache_args)[0], lambda: _summarize(
+            state["transcript"], _use_map_reduce(state)
+        ))
+        return _summary_success(cache_args, script_summary)
     except Exception as e:
-        error_message = f"ERROR: 요약 생성 중 오류 발생 - {e}"
-        print(f"🚨 {error_message}")
-        return {"script_summary": "", "error": error_message}
+        return _summary_error(e)
+
+async def asummarize_transcript(state: AgentState) -> dict:
+    """summarize_transcript의 비동기 버전입니다. (astream / abatch 사용)"""
+    print("🚀 [Tool] summarize_transcript 호출됨 (async)")
+    cache_args = _script_cache_args(state)
+    cached_summary = summary_cache.get(*cache_args)
+    if cached_summary is not None:
+        print("⚡ 요약 캐시 적중. LLM 호출을 건너뜁니다.")
+        return {"script_summary": cached_summary}
+
+    try:
+        script_summary = await single_flight.ado("script_summary", summary_cache.make_key(*cache_args)[0], lambda: _asummarize(
+            state["transcript"], _use_map_reduce(state)
+        ))
+        return _summary_success(cache_args, script_summary)
+    except Exception as e:
+        return _summary_error(e)
 
 # %%
 def route_after_transcript(state: AgentState) -> str:
@@ -139,12 +366,21 @@ def route_after_transcript(state: AgentState) -> str:
         print("🚨 오류가 감지되어 프로세스를 종료합니다.")
         return END
     else:
-        print("✅ 스크립트 추출 성공. 요약 단계로 이동합니다.")
-        return "summarize_transcript"
+        print("✅ 스크립트 추출 성공. 토큰 예산 단계로 이동합니다.")
+        return "budget_transcript"
 
 # %%
-graph_builder.add_node("summarize_transcript", summarize_transcript)
-graph_builder.add_node("get_youtube_transcript", get_youtube_transcript)
+# 동기(graph.invoke)와 비동기(graph.ainvoke / astream) 실행 모두 지원하도록 두 구현을 함께 등록
+# 노드마다 실행 시간/LLM 토큰/API 호출/캐시 적중을 기록합니다. (instrumentation.py)
+graph_builder.add_node(
+    "summarize_transcript",
+    instrument_node("script", "summarize_transcript", summarize_transcript, asummarize_transcript),
+)
+graph_builder.add_node(
+    "get_youtube_transcript",
+    instrument_node("script", "get_youtube_transcript", get_youtube_transcript, aget_youtube_transcript),
+)
+graph_builder.add_node("budget_transcript", instrument_node("script", "budget_transcript", budget_transcript))
 
 # %%
 graph_builder.add_edge(START, "get_youtube_transcript")
@@ -152,10 +388,11 @@ graph_builder.add_conditional_edges(
     "get_youtube_transcript",
     route_after_transcript,
     {
-        "summarize_transcript": "summarize_transcript",
+        "budget_transcript": "budget_transcript",
         END: END
     }
 )
+graph_builder.add_edge("budget_transcript", "summarize_transcript")
 graph_builder.add_edge("summarize_transcript", END)
 
 # %%
@@ -163,16 +400,7 @@ graph = graph_builder.compile()
 # graph
 
 # %%
-def run_agent(url: str):
-    """
-    에이전트를 실행하고 최종 결과를 출력합니다.
-    - 초기 입력을 'url' 필드에 담아 전달합니다.
-    - 최종 결과는 'comment_summary' 필드에서 가져옵니다.
-    - 'error' 필드를 확인하여 오류를 처리합니다.
-    """
-    inputs = {"url": url}
-    final_state = graph.invoke(inputs)
-
+def _print_final_state(final_state: dict):
     if final_state.get("error"):
         print("\n" + "="*30)
         print("❌ 최종 실행 중 오류 발생:")
@@ -190,20 +418,26 @@ def run_agent(url: str):
         print("⚠️ 요약 결과가 비어 있습니다. content 값:", repr(content))
         return
 
-    # LLM 응답에서 마크다운 코드 블록 제거
-    if content.strip().startswith("```json"):
-        start_index = content.find('{')
-        end_index = content.rfind('}')
-        if start_index != -1 and end_index != -1:
-            content = content[start_index : end_index + 1]
-
     try:
-        parsed_json = json.loads(content)
+        parsed_json = loads_llm_json(content)
         print(json.dumps(parsed_json, indent=2, ensure_ascii=False))
-    except json.JSONDecodeError:
+    except JsonStreamError:
         print("⚠️ JSON 파싱 실패. 원본 content 출력:")
         print(content)
 
+def run_agent(url: str):
+    """
+    에이전트를 실행하고 최종 결과를 출력합니다.
+    - 초기 입력을 'url' 필드에 담아 전달합니다.
+    - 최종 결과는 'script_summary' 필드에서 가져옵니다.
+    - 'error' 필드를 확인하여 오류를 처리합니다.
+    """
+    _print_final_state(graph.invoke({"url": url}))
+
+async def arun_agent(url: str):
+    """run_agent의 비동기 버전입니다. 하나의 이벤트 루프에서 여러 영상을 동시에 요약할 수 있습니다."""
+    _print_final_state(await graph.ainvoke({"url": url}))
+
 # # %%
 # test_url = "https://youtu.be/sLe6jgHoYtk?si=BP39AJQL1PvIoWBe"
 # print(f"입력 URL: {test_url}\n---")
@@ -0,0 +1,152 @@
+# %%
+# 같은 영상에 대한 동시 요청 합치기 (single-flight)
+#
+# 인기 영상은 여러 세션이 몇 초 안에 같은 URL을 보냅니다. (영상 ID, 작업) 키로 지금 진행 중인 호출이 있으면
+# 새로 시작하지 않고 그 호출이 끝나기를 기다렸다가 같은 결과(또는 같은 예외)를 받습니다.
+# - 스레드(동기 노드)와 asyncio 태스크(비동기 노드)가 같은 진행 중 호출을 함께 기다릴 수 있도록
+#   진행 상태를 concurrent.futures.Future 하나로 공유합니다.
+# - 기다리는 쪽은 자기 요청의 마감 시각(resilience)까지만 기다립니다. 먼저 시작한 호출은 취소하지 않습니다.
+# - 먼저 시작한 호출이 자기 마감 시각 초과나 취소로 끝나면 그 실패는 나누지 않습니다. 진행 중 호출을 지우고,
+#   기다리던 호출이 (자기 마감 시각 안에서) 새로 시작하거나 새로 시작한 호출에 합류합니다.
+# - 합쳐서 아낀 호출 수는 single_flight_shared_total, 지금 진행 중인 키 수는 single_flight_inflight 지표로 내보냅니다.
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from instrumentation import metrics
+from resilience import CallCancelled, DeadlineExceeded, current_deadline, remaining_seconds
+
+T = TypeVar("T")
+
+
+class _LeaderGaveUp(Exception):
+    """먼저 시작한 호출이 그 호출만의 사정(마감 시각 초과, 취소)으로 끝났음을 기다리는 쪽에 알립니다."""
+
+
+def _shareable(error: BaseException) -> bool:
+    """기다리는 호출에도 그대로 전할 실패인지 판단합니다. (마감 시각/취소는 먼저 시작한 요청만의 사정)"""
+    return isinstance(error, Exception) and not isinstance(
+        error, (DeadlineExceeded, CancelledError, asyncio.CancelledError, CallCancelled)
+    )
+
+
+# %%
+class SingleFlight:
+    """키별로 진행 중인 호출을 하나만 유지하고, 같은 키의 동시 호출자에게 결과를 나눠 줍니다."""
+
+    def __init__(self):
+        self._flights: Dict[Tuple[str, Hashable], Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def _join(self, op: str, key: Hashable) -> Tuple[Future, bool]:
+        """(진행 중 호출, 직접 실행해야 하는지)를 반환합니다."""
+        with self._lock:
+            flight = self._flights.get((op, key))
+            if flight is not None:
+                self.shared += 1
+                metrics.inc("single_flight_shared_total", op=op)
+                return flight, False
+            flight = Future()
+            flight.set_running_or_notify_cancel()  # 기다리는 쪽이 cancel()로 결과를 지우지 못하게 함
+            self._flights[(op, key)] = flight
+            self.leaders += 1
+            metrics.inc("single_flight_leaders_total", op=op)
+            return flight, True
+
+    def _land(self, op: str, key: Hashable, flight: Future, result=None, error: BaseException = None):
+        """진행 중 목록에서 지운 뒤 결과를 알립니다. (결과를 받은 쪽이 다시 합류할 때 끝난 호출을 만나지 않도록)"""
+        with self._lock:
+            if self._flights.get((op, key)) is flight:
+                del self._flights[(op, key)]
+        if error is None:
+            flight.set_result(result)
+        elif _shareable(error):
+            flight.set_exception(error)
+        else:
+            flight.set_exception(_LeaderGaveUp(f"{type(error).__name__}: {error}"))
+
+    @staticmethod
+    def _retry(op: str, key: Hashable, error: _LeaderGaveUp):
+        metrics.inc("single_flight_retries_total", op=op)
+        print(f"🔁 먼저 시작한 '{op}' 요청이 끝나지 못해({error}) 다시 시도합니다: {key}")
+
+    @staticmethod
+    def _timeout_error(op: str) -> DeadlineExceeded:
+        metrics.inc("deadline_exceeded_total", call=f"single_flight.{op}")
+        return DeadlineExceeded(f"{op}: 같은 영상의 진행 중인 요청을 기다리다 마감 시각이 지났습니다.")
+
+    def do(self, op: str, key: Hashable, fn: Callable[[], T]) -> T:
+        """op/key로 진행 중인 호출이 있으면 그 결과를 기다리고, 없으면 fn()을 실행해 결과를 나눠 줍니다."""
+        while True:
+            flight, leader = self._join(op, key)
+            if leader:
+                try:
+                    result = fn()
+                except BaseException as e:
+                    self._land(op, key, flight, error=e)
+                    raise
+                self._land(op, key, flight, result)
+                return result
+            print(f"🤝 같은 영상의 진행 중인 '{op}' 요청에 합류합니다: {key}")
+            timeout = remaining_seconds(current_deadline())
+            try:
+                return flight.result(timeout=None if timeout is None else max(timeout, 0.0))
+            except _LeaderGaveUp as e:
+                self._retry(op, key, e)
+            except TimeoutError:
+                if flight.done():
+                    raise  # 먼저 시작한 호출 자체가 시간 초과로 실패한 경우
+                raise self._timeout_error(op) from None
+
+    async def ado(self, op: str, key: Hashable, afn: Callable[[], Awaitable[T]]) -> T:
+        """do의 비동기 버전입니다. 다른 스레드의 동기 호출이 먼저 시작했어도 이벤트 루프를 막지 않고 기다립니다."""
+        while True:
+            flight, leader = self._join(op, key)
+            if leader:
+                try:
+                    result = await afn()
+                except BaseException as e:
+                    self._land(op, key, flight, error=e)
+                    raise
+                self._land(op, key, flight, result)
+                return result
+            print(f"🤝 같은 영상의 진행 중인 '{op}' 요청에 합류합니다: {key}")
+            timeout = remaining_seconds(current_deadline())
+            waiter = asyncio.shield(asyncio.wrap_future(flight))  # 기다리다 그만둬도 먼저 시작한 호출은 계속 진행
+            try:
+                return await asyncio.wait_for(waiter, None if timeout is None else max(timeout, 0.0))
+            except _LeaderGaveUp as e:
+                self._retry(op, key, e)
+            except TimeoutError:
+                if flight.done():
+                    raise
+                raise self._timeout_error(op) from None
+
+    def inflight(self) -> Dict[str, int]:
+        """작업별로 지금 진행 중인 키 수를 반환합니다."""
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for op, _ in self._flights:
+                counts[op] = counts.get(op, 0) + 1
+        return counts
+
+    def stats(self) -> dict:
+        """직접 실행한 호출 수와 합류해서 아낀 호출 수를 반환합니다."""
+        total = self.leaders + self.shared
+        return {
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "shared_rate": self.shared / total if total else 0.0,
+            "inflight": sum(self.inflight().values()),
+        }
+
+    def _collect(self) -> list:
+        return [("single_flight_inflight", {"op": op}, count) for op, count in self.inflight().items()]
+
+
+# %%
+single_flight = SingleFlight()
+metrics.register_collector(single_flight._collect)
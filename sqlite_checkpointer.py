@@ -0,0 +1,471 @@
+# %%
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+# %%
+# 체크포인트 저장소 설정 (환경 변수로 덮어쓸 수 있음)
+DEFAULT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(".cache", "checkpoints.sqlite3"))
+DEFAULT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 60 * 60)))  # 이 시간 동안 쓰지 않은 thread 삭제
+DEFAULT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))  # 넘으면 가장 오래 쓰지 않은 thread부터 삭제
+DEFAULT_MAX_THREAD_BYTES = int(os.getenv("CHECKPOINT_MAX_THREAD_BYTES", str(5 * 1024 * 1024)))  # thread당 최대 용량
+DEFAULT_KEEP_CHECKPOINTS = int(os.getenv("CHECKPOINT_KEEP_PER_NAMESPACE", "4"))  # namespace마다 남길 최근 체크포인트 수
+SWEEP_INTERVAL_SECONDS = 60.0  # 만료/초과 thread 정리 주기
+
+
+# %%
+class BoundedSqliteSaver(BaseCheckpointSaver[str]):
+    """
+    SQLite에 저장하는 LangGraph 체크포인터입니다. (MemorySaver 대체)
+
+    - 프로세스를 재시작해도 thread_id별 대화 상태가 유지됩니다.
+    - 체크포인트를 저장할 때 namespace마다 최근 keep_checkpoints개만 남기고 오래된 것은 지웁니다(압축).
+    - thread 하나의 용량이 max_thread_bytes를 넘으면 오래된 체크포인트부터 지웁니다.
+      (최상위 그래프와 아직 실행 중인 하위 그래프의 최신 체크포인트는 남김)
+    - ttl_seconds 동안 쓰지 않은 thread와, max_threads를 넘는 가장 오래된 thread를 주기적으로 삭제합니다.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_DB_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_threads: int = DEFAULT_MAX_THREADS,
+        max_thread_bytes: int = DEFAULT_MAX_THREAD_BYTES,
+        keep_checkpoints: int = DEFAULT_KEEP_CHECKPOINTS,
+        *,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_threads = max_threads
+        self.max_thread_bytes = max_thread_bytes
+        # 실행 중인 단계의 부모 체크포인트(pending sends 조회용)는 항상 남아 있어야 하므로 최소 2개
+        self.keep_checkpoints = max(2, keep_checkpoints)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_sweep = 0.0
+        self.compacted = 0
+        self.evicted_threads = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # 삭제한 공간을 incremental_vacuum으로 돌려받을 수 있도록 (새 DB 파일에서만 적용됨)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT,
+                    checkpoint BLOB NOT NULL,
+                    metadata_type TEXT,
+                    metadata BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                );
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT,
+                    value BLOB,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+                CREATE TABLE IF NOT EXISTS threads (
+                    thread_id TEXT PRIMARY KEY,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_threads_accessed ON threads (accessed_at);"""
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    # ------------------------------------------------------------------
+    # 조회
+    def _touch(self, conn: sqlite3.Connection, thread_id: str):
+        conn.execute(
+            "INSERT INTO threads (thread_id, accessed_at) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET accessed_at = excluded.accessed_at",
+            (thread_id, time.time()),
+        )
+
+    def _load_tuple(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        sends = []
+        if parent_checkpoint_id:
+            sends = conn.execute(
+                "SELECT type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND checkpoint_id = ? AND channel = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+            ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **self.serde.loads_typed((type_, checkpoint)),
+                "pending_sends": [self.serde.loads_typed(send) for send in sends],
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_checkpoint_id,
+                }
+            }
+            if parent_checkpoint_id
+            else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((w_type, value)))
+                for task_id, channel, w_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            conn = self._connect()
+            if checkpoint_id := get_checkpoint_id(config):
+                row = conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            self._touch(conn, thread_id)
+            conn.commit()
+            return self._load_tuple(conn, thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints WHERE 1 = 1"
+        )
+        params: List[Any] = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                if filter:
+                    metadata = self.serde.loads_typed((row[4], row[5]))
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                results.append(self._load_tuple(conn, thread_id, checkpoint_ns, tuple(row)))
+        yield from results
+
+    # ------------------------------------------------------------------
+    # 저장
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized = self.serde.dumps_typed(c)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+                "type, checkpoint, metadata_type, metadata, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                    type_, serialized, metadata_type, serialized_metadata, len(serialized) + len(serialized_metadata),
+                ),
+            )
+            self._touch(conn, thread_id)
+            self._compact(conn, thread_id, checkpoint_ns, config["configurable"].get("checkpoint_id"))
+            self._enforce_thread_size(conn, thread_id)
+            conn.commit()
+            self._maybe_sweep(conn)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        replace_rows, insert_rows = [], []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            row = (
+                thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                channel, type_, serialized, len(serialized),
+            )
+            # 특수 채널(에러/인터럽트 등)은 덮어쓰고, 일반 쓰기는 이미 있으면 유지합니다. (MemorySaver와 같은 규칙)
+            (replace_rows if channel in WRITES_IDX_MAP else insert_rows).append(row)
+        columns = "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(f"INSERT OR REPLACE INTO writes {columns}", replace_rows)
+            conn.executemany(f"INSERT OR IGNORE INTO writes {columns}", insert_rows)
+            conn.commit()
+
+    # ------------------------------------------------------------------
+    # 압축 / 용량 제한 / 만료
+    def _delete_checkpoints(self, conn: sqlite3.Connection, thread_id: str, keys: Sequence[Tuple[str, str]]):
+        for checkpoint_ns, checkpoint_id in keys:
+            conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+            conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        self.compacted += len(keys)
+
+    def _compact(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str, parent_checkpoint_id: Optional[str]):
+        """
+        이전 단계의 전체 상태 사본이 쌓이지 않도록 오래된 체크포인트를 지웁니다.
+        - 같은 namespace에서는 최근 keep_checkpoints개만 남깁니다.
+        - 최상위 그래프가 새 체크포인트를 저장하면, 그 이전 단계에서 끝난 하위 그래프(namespace)의 체크포인트를 지웁니다.
+          (하위 그래프 실행마다 namespace가 새로 생기므로 개수 제한만으로는 줄지 않음)
+        """
+        old = conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_checkpoints),
+        ).fetchall()
+        if checkpoint_ns == "" and parent_checkpoint_id:
+            old += conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns IN ("
+                "  SELECT checkpoint_ns FROM checkpoints WHERE thread_id = ? AND checkpoint_ns != '' "
+                "  GROUP BY checkpoint_ns HAVING MAX(checkpoint_id) < ?"
+                ")",
+                (thread_id, thread_id, parent_checkpoint_id),
+            ).fetchall()
+        self._delete_checkpoints(conn, thread_id, old)
+
+    def _thread_bytes(self, conn: sqlite3.Connection, thread_id: str) -> int:
+        checkpoint_bytes = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM checkpoints WHERE thread_id = ?", (thread_id,)
+        ).fetchone()[0]
+        write_bytes = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM writes WHERE thread_id = ?", (thread_id,)
+        ).fetchone()[0]
+        return checkpoint_bytes + write_bytes
+
+    def _running_checkpoints(self, conn: sqlite3.Connection, thread_id: str) -> set:
+        """
+        지울 수 없는 체크포인트 (namespace, checkpoint_id) 집합을 반환합니다.
+        최상위 그래프와, 최상위 그래프의 최신 체크포인트보다 나중에 저장된(아직 실행 중인) 하위 그래프 namespace의
+        최신 체크포인트와 그 부모입니다. (이어서 실행하거나 pending sends를 읽을 때 필요)
+        """
+        latest_root = conn.execute(
+            "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''", (thread_id,)
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT c.checkpoint_ns, c.checkpoint_id, c.parent_checkpoint_id FROM checkpoints c JOIN ("
+            "  SELECT checkpoint_ns, MAX(checkpoint_id) AS latest FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns"
+            ") m ON c.checkpoint_ns = m.checkpoint_ns AND c.checkpoint_id = m.latest WHERE c.thread_id = ?",
+            (thread_id, thread_id),
+        ).fetchall()
+        running = set()
+        for checkpoint_ns, checkpoint_id, parent_checkpoint_id in rows:
+            if checkpoint_ns == "" or latest_root is None or checkpoint_id > latest_root:
+                running.add((checkpoint_ns, checkpoint_id))
+                if parent_checkpoint_id:
+                    running.add((checkpoint_ns, parent_checkpoint_id))
+        return running
+
+    def _enforce_thread_size(self, conn: sqlite3.Connection, thread_id: str):
+        """
+        thread 용량이 넘으면 오래된 체크포인트부터 지웁니다.
+        최상위 그래프와 실행 중인 하위 그래프의 최신 체크포인트(와 그 부모)는 용량이 넘어도 남깁니다.
+        """
+        total = self._thread_bytes(conn, thread_id)
+        if total <= self.max_thread_bytes:
+            return
+        running = self._running_checkpoints(conn, thread_id)
+        rows = conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id, size FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id",
+            (thread_id,),
+        ).fetchall()
+        victims = []
+        for checkpoint_ns, checkpoint_id, size in rows:
+            if total <= self.max_thread_bytes:
+                break
+            if (checkpoint_ns, checkpoint_id) in running:
+                continue
+            victims.append((checkpoint_ns, checkpoint_id))
+            total -= size
+        self._delete_checkpoints(conn, thread_id, victims)
+        # 체크포인트와 함께 지워지지 않은 쓰기 기록이 남아 있으면 정리
+        conn.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND NOT EXISTS (SELECT 1 FROM checkpoints c WHERE "
+            "c.thread_id = writes.thread_id AND c.checkpoint_ns = writes.checkpoint_ns "
+            "AND c.checkpoint_id = writes.checkpoint_id)",
+            (thread_id,),
+        )
+
+    def delete_thread(self, thread_id: str):
+        """thread의 모든 체크포인트와 쓰기 기록을 삭제합니다."""
+        with self._lock:
+            conn = self._connect()
+            self._delete_thread(conn, thread_id)
+            conn.commit()
+
+    def _delete_thread(self, conn: sqlite3.Connection, thread_id: str):
+        conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+        conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+        conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+        self.evicted_threads += 1
+
+    def _maybe_sweep(self, conn: sqlite3.Connection):
+        if time.monotonic() - self._last_sweep >= SWEEP_INTERVAL_SECONDS:
+            self._sweep(conn)
+
+    def sweep(self) -> int:
+        """만료된 thread와 max_threads를 넘는 오래된 thread를 지금 바로 삭제하고, 삭제한 thread 수를 반환합니다."""
+        with self._lock:
+            return self._sweep(self._connect())
+
+    def _sweep(self, conn: sqlite3.Connection) -> int:
+        self._last_sweep = time.monotonic()
+        expired = [row[0] for row in conn.execute(
+            "SELECT thread_id FROM threads WHERE accessed_at < ?", (time.time() - self.ttl_seconds,)
+        )]
+        overflow = [row[0] for row in conn.execute(
+            "SELECT thread_id FROM threads WHERE accessed_at >= ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?",
+            (time.time() - self.ttl_seconds, self.max_threads),
+        )]
+        for thread_id in expired + overflow:
+            self._delete_thread(conn, thread_id)
+        conn.commit()
+        if expired or overflow:
+            conn.execute("PRAGMA incremental_vacuum")
+            print(f"🧹 체크포인트 정리: thread {len(expired)}개 만료, {len(overflow)}개 용량 초과로 삭제")
+        return len(expired) + len(overflow)
+
+    def stats(self) -> dict:
+        """저장된 thread/체크포인트 수와 용량, 압축/삭제 횟수를 반환합니다."""
+        with self._lock:
+            conn = self._connect()
+            threads = conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+            checkpoints, checkpoint_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM checkpoints"
+            ).fetchone()
+            write_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM writes").fetchone()[0]
+            return {
+                "threads": threads,
+                "checkpoints": checkpoints,
+                "bytes": checkpoint_bytes + write_bytes,
+                "compacted_checkpoints": self.compacted,
+                "evicted_threads": self.evicted_threads,
+            }
+
+    # ------------------------------------------------------------------
+    # 비동기 버전 (SQLite 작업이 짧으므로 MemorySaver처럼 동기 구현을 그대로 사용)
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        return self.put_writes(config, writes, task_id)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
@@ -0,0 +1,175 @@
+# %%
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from instrumentation import record_cache
+
+# %%
+# 캐시 설정 (환경 변수로 덮어쓸 수 있음)
+DEFAULT_DB_PATH = os.getenv("SUMMARY_CACHE_PATH", os.path.join(".cache", "summaries.sqlite3"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "5000"))
+DEFAULT_TTL_SECONDS = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+# %%
+class SummaryCache:
+    """
+    LLM 요약 결과를 SQLite에 저장하는 캐시입니다.
+
+    키는 (namespace, video_id, 입력 텍스트 해시, 프롬프트 해시, 모델 이름)입니다.
+    - namespace: "script" / "comment" 처럼 요약 종류를 구분합니다.
+    - 프롬프트가 바뀌면 키가 달라지므로 이전 프롬프트 결과는 더 이상 적중하지 않고, TTL이나 LRU로 정리됩니다.
+      (다른 프롬프트 버전을 쓰는 프로세스가 같은 DB를 함께 써도 서로의 항목을 지우지 않음)
+    - 항목 수가 max_entries를 넘으면 가장 오래 사용되지 않은 항목부터 삭제합니다.
+    - SQLite 오류(잠김, 손상 등)는 경고만 남기고 캐시 미스/저장 생략으로 처리합니다. (캐시 때문에 요약이 실패하지 않도록)
+    """
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_DB_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    ):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS summaries (
+                    cache_key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    video_id TEXT,
+                    input_hash TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_accessed ON summaries (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_prompt ON summaries (namespace, prompt_hash)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(namespace: str, video_id: str, input_text: str, prompt: str, model: str) -> tuple:
+        """(캐시 키, 입력 해시, 프롬프트 해시)를 반환합니다."""
+        input_hash = _sha256(input_text)
+        prompt_hash = _sha256(prompt)
+        cache_key = _sha256("|".join([namespace, video_id or "", input_hash, prompt_hash, model]))
+        return cache_key, input_hash, prompt_hash
+
+    def _error(self, action: str, e: Exception):
+        self.errors += 1
+        print(f"⚠️ 요약 캐시 {action} 실패, 캐시 없이 진행합니다: {e}")
+
+    def get(self, namespace: str, video_id: str, input_text: str, prompt: str, model: str) -> Optional[str]:
+        """캐시된 요약을 반환합니다. 없거나 만료되었거나 DB를 읽을 수 없으면 None을 반환합니다."""
+        cache_key, _, _ = self.make_key(namespace, video_id, input_text, prompt, model)
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT summary, created_at FROM summaries WHERE cache_key = ?", (cache_key,)
+                ).fetchone()
+                if row is not None and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM summaries WHERE cache_key = ?", (cache_key,))
+                    conn.commit()
+                    row = None
+                if row is not None:
+                    conn.execute("UPDATE summaries SET accessed_at = ? WHERE cache_key = ?", (now, cache_key))
+                    conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                self._error("조회", e)
+                row = None
+            if row is None:
+                self.misses += 1
+                record_cache("summary", misses=1)
+                return None
+            self.hits += 1
+            record_cache("summary", hits=1)
+            return row[0]
+
+    def put(self, namespace: str, video_id: str, input_text: str, prompt: str, model: str, summary: str):
+        """
+        요약 결과를 저장하고, TTL이 지난 항목과 max_entries를 넘는 오래된 항목을 삭제합니다.
+        DB에 쓸 수 없으면 경고만 남깁니다. (이미 만든 요약은 그대로 사용)
+        """
+        cache_key, input_hash, prompt_hash = self.make_key(namespace, video_id, input_text, prompt, model)
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    """INSERT OR REPLACE INTO summaries
+                       (cache_key, namespace, video_id, input_hash, prompt_hash, model, summary, created_at, accessed_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (cache_key, namespace, video_id, input_hash, prompt_hash, model, summary, now, now),
+                )
+                conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,))
+                conn.execute(
+                    """DELETE FROM summaries WHERE cache_key IN (
+                           SELECT cache_key FROM summaries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                       )""",
+                    (self.max_entries,),
+                )
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                self._error("저장", e)
+
+    def invalidate(self, namespace: Optional[str] = None, video_id: Optional[str] = None) -> int:
+        """namespace / video_id 조건에 맞는 항목을 삭제하고 삭제된 개수를 반환합니다."""
+        query, params = "DELETE FROM summaries WHERE 1 = 1", []
+        if namespace is not None:
+            query += " AND namespace = ?"
+            params.append(namespace)
+        if video_id is not None:
+            query += " AND video_id = ?"
+            params.append(video_id)
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(query, params)
+            conn.commit()
+            self.invalidated += cur.rowcount
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        """hit/miss 카운터와 현재 저장된 항목 수를 반환합니다."""
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidated": self.invalidated,
+                "errors": self.errors,
+                "entries": entries,
+            }
+
+
+# %%
+summary_cache = SummaryCache()
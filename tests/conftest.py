@@ -0,0 +1,15 @@
+# %%
+# 테스트 공용 설정: 저장소 루트의 모듈을 바로 import할 수 있게 하고, 캐시/DB가 작업 폴더에 쌓이지 않도록 임시 폴더를 씁니다.
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_cache_root = tempfile.mkdtemp(prefix="youtube-agent-tests-")
+os.environ.setdefault("TRANSCRIPT_CACHE_DIR", os.path.join(_cache_root, "transcripts"))
+os.environ.setdefault("SUMMARY_CACHE_PATH", os.path.join(_cache_root, "summaries.sqlite3"))
+os.environ.setdefault("CHECKPOINT_DB_PATH", os.path.join(_cache_root, "checkpoints.sqlite3"))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(_cache_root, "embeddings.sqlite3"))
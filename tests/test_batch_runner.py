@@ -0,0 +1,92 @@
+# %%
+import json
+
+import pytest
+
+import batch_runner
+
+
+class StubGraph:
+    """url별로 정해진 결과를 돌려주는 가짜 그래프. 'boom'이 들어간 URL은 예외를 던집니다."""
+
+    def __init__(self, errors=()):
+        self.errors = set(errors)
+        self.calls = []
+
+    def invoke(self, state, config=None):
+        url = state["url"]
+        self.calls.append(url)
+        if "boom" in url:
+            raise RuntimeError("그래프 폭발")
+        if url in self.errors:
+            return {"error": "자막 없음"}
+        return {"script_summary": f"요약:{url}", "comment_summary": f"댓글:{url}"}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    graph = StubGraph()
+    monkeypatch.setattr(batch_runner, "_load_graph", lambda task: graph)
+    return graph
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_truncated_last_line_is_ignored_and_not_glued(tmp_path, stub):
+    output = tmp_path / "results.jsonl"
+    done = {"url": "u1", "task": "script", "status": "ok"}
+    output.write_text(json.dumps(done) + "\n" + '{"url": "u2", "task": "scr', encoding="utf-8")
+
+    assert batch_runner.load_completed(str(output)) == {("u1", "script")}
+
+    batch_runner.run_batch(["u1", "u2"], str(output), ["script"], workers=1, progress_interval=0)
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines[1] == '{"url": "u2", "task": "scr'  # 잘린 줄은 그대로 두고
+    record = json.loads(lines[2])  # 새 레코드는 다음 줄에서 시작
+    assert (record["url"], record["status"]) == ("u2", "ok")
+    assert stub.calls == ["u2"]
+
+
+def test_rerun_skips_ok_and_retries_error(tmp_path, stub):
+    output = tmp_path / "results.jsonl"
+    stub.errors = {"u2"}
+    first = batch_runner.run_batch(["u1", "u2"], str(output), ["script"], workers=2, progress_interval=0)
+    assert first == {"done": 2, "ok": 1, "failed": 1, "skipped": 0}
+
+    stub.errors = set()
+    stub.calls.clear()
+    second = batch_runner.run_batch(["u1", "u2"], str(output), ["script"], workers=2, progress_interval=0)
+    assert stub.calls == ["u2"]  # 성공한 u1은 건너뛰고 실패한 u2만 다시 실행
+    assert second == {"done": 1, "ok": 1, "failed": 0, "skipped": 1}
+    assert batch_runner.load_completed(str(output)) == {("u1", "script"), ("u2", "script")}
+
+
+def test_graph_exception_becomes_error_record(tmp_path, stub):
+    output = tmp_path / "results.jsonl"
+    batch_runner.run_batch(["boom"], str(output), ["comment"], workers=1, progress_interval=0)
+    [record] = read_records(output)
+    assert record["status"] == "error"
+    assert record["task"] == "comment"
+    assert "그래프 폭발" in record["error"]
+    assert record["result"] == ""
+
+
+def test_main_exit_code_and_unknown_task(tmp_path, stub, capsys):
+    url_file = tmp_path / "urls.txt"
+    url_file.write_text("# 주석\nu1\nboom\nu1\n", encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+
+    assert batch_runner.main([str(url_file), "-o", str(output), "--progress-interval", "0"]) == 1
+    assert [r["url"] for r in read_records(output)].count("u1") == 1  # 중복 URL은 한 번만
+
+    ok_file = tmp_path / "ok.txt"
+    ok_file.write_text("u3\n", encoding="utf-8")
+    assert batch_runner.main([str(ok_file), "-o", str(output), "--progress-interval", "0"]) == 0
+
+    with pytest.raises(SystemExit) as exc:
+        batch_runner.main([str(url_file), "--tasks", "script,video"])
+    assert exc.value.code == 2
+    assert "video" in capsys.readouterr().err
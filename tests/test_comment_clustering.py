@@ -0,0 +1,119 @@
+# %%
+import re
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import llm_factory
+import resilience
+from comment_clustering import (
+    OPENAI_EMBEDDING_MODEL,
+    HashingEmbeddings,
+    _normalize_rows,
+    get_comment_embeddings,
+    kmeans,
+    representative_comments,
+)
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from rate_limiter import openai_buckets, rate_limiter
+
+
+class FlakyEmbeddings(Embeddings):
+    """첫 요청은 일시적 오류로 실패하고, 그다음부터 고정 벡터를 돌려주는 가짜 임베딩입니다."""
+
+    def __init__(self, failures: int = 1):
+        self.failures = failures
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("연결 끊김")
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    fake = FlakyEmbeddings()
+    llm_factory.set_embeddings_factory(lambda model, **kwargs: fake)
+    resilience.set_policy(resilience.ResiliencePolicy(backoff_base=0.0, backoff_max=0.0, hedge=False))
+    yield fake
+    llm_factory.set_embeddings_factory(None)
+    resilience.set_policy()
+
+
+def test_openai_embedder_goes_through_factory(flaky):
+    embeddings = get_comment_embeddings("openai")
+    assert embeddings.embeddings is llm_factory.get_embeddings(OPENAI_EMBEDDING_MODEL)
+
+
+def test_embeddings_retry_transient_errors(flaky):
+    guarded = llm_factory.get_embeddings(OPENAI_EMBEDDING_MODEL)
+    assert guarded.embed_documents(["가나", "다"]) == [[2.0, 1.0], [1.0, 1.0]]
+    assert flaky.calls == 2
+
+
+def test_embeddings_take_from_rate_limit_buckets(flaky, tmp_path, monkeypatch):
+    taken = []
+    monkeypatch.setattr(rate_limiter, "acquire", lambda name, amount=1, timeout=None: taken.append((name, amount)) or 0.0)
+    requests_bucket, tokens_bucket = openai_buckets(OPENAI_EMBEDDING_MODEL)
+    cached = CachedEmbeddings(llm_factory.get_embeddings(OPENAI_EMBEDDING_MODEL), OPENAI_EMBEDDING_MODEL,
+                              EmbeddingCache(str(tmp_path / "embeddings.sqlite3")))
+    cached.embed_array(["스쿼트 자세 알려주세요"] * 3)
+    # 재시도한 요청도 버킷을 거치므로 두 번 꺼냅니다. (중복 텍스트는 한 번만 임베딩)
+    assert [name for name, _ in taken] == [requests_bucket, tokens_bucket] * 2
+    assert all(amount > 0 for _, amount in taken)
+
+
+# %%
+def _topic_comments():
+    topics = {
+        "스쿼트": ["스쿼트 무릎 통증", "스쿼트 무릎 통증 심해요", "스쿼트 무릎 통증 있어요"],
+        "식단": ["식단 닭가슴살 추천", "식단 닭가슴살 추천해요", "식단 닭가슴살 좋아요"],
+        "음악": ["배경 음악 제목", "배경 음악 제목 궁금", "배경 음악 제목 알려줘"],
+    }
+    return [comment for comments in topics.values() for comment in comments]
+
+
+def test_kmeans_separates_clear_groups():
+    vectors = np.asarray([[1, 0], [0.99, 0.1], [0, 1], [0.1, 0.99]], dtype=np.float32)
+    labels, centers = kmeans(_normalize_rows(vectors), 2)
+    assert labels[0] == labels[1] and labels[2] == labels[3] and labels[0] != labels[2]
+    assert centers.shape == (2, 2)
+
+
+def test_representatives_keep_small_inputs_and_counts():
+    assert representative_comments(["좋아요", "최고"], counts=[3, 1], k=5) == ["좋아요 (×3)", "최고"]
+
+
+def _count(text):
+    match = re.search(r" \(×(\d+)\)$", text)
+    return (text[:match.start()], int(match.group(1))) if match else (text, 1)
+
+
+def test_representatives_summarize_all_comments(tmp_path):
+    comments = _topic_comments()
+    embeddings = CachedEmbeddings(HashingEmbeddings(), "local-test", EmbeddingCache(str(tmp_path / "e.sqlite3")))
+    counts = [5, 1, 1, 1, 1, 1, 1, 1, 1]
+    representatives = representative_comments(comments, counts=counts, embeddings=embeddings, k=3)
+    parsed = [_count(text) for text in representatives]
+    assert len(parsed) == 3
+    assert all(text in comments for text, _ in parsed)  # 대표는 실제 댓글(medoid)
+    assert sum(size for _, size in parsed) == sum(counts)  # 군집 크기는 묶인 댓글 수의 합
+    assert [size for _, size in parsed] == sorted((size for _, size in parsed), reverse=True)  # 큰 군집부터
+    assert representative_comments(comments, counts=counts, embeddings=embeddings, k=3) == representatives
+
+
+def test_embedding_failure_falls_back_to_first_comments():
+    class Broken(Embeddings):
+        def embed_documents(self, texts):
+            raise ConnectionError("임베딩 API 실패")
+
+        def embed_query(self, text):
+            raise ConnectionError("임베딩 API 실패")
+
+    assert representative_comments(_topic_comments(), embeddings=Broken(), k=2) == _topic_comments()[:2]
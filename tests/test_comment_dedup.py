@@ -0,0 +1,50 @@
+# %%
+import numpy as np
+
+import comment_dedup
+from comment_dedup import _close_pairs, cluster_comments, collapse_comments, normalize_comment
+
+
+def test_normalize_comment():
+    assert normalize_comment("3:15 여기 자세!! 대박이다아아아") == "<ts> 여기 자세 대박이다아아"
+
+
+def test_exact_and_near_duplicates_collapse():
+    comments = [
+        "스쿼트 자세 설명이 정말 자세해서 따라 하기 쉬웠어요 매일 아침마다 하고 있습니다",
+        "스쿼트 자세 설명이 정말 자세해서 따라 하기 쉬웠어요 매일 아침마다 하고 있습니다!!",
+        "스쿼트 자세 설명이 정말 자세해서 따라 하기 쉬웠어요 매일 아침마다 하고 있습니당",
+        "런지할 때 무릎이 아픈데 어떻게 하나요?",
+    ]
+    clusters = cluster_comments(comments)
+    assert clusters[0]["count"] == 3
+    assert clusters[0]["text"] == comments[0]
+    assert clusters[1]["members"] == [3]
+
+
+def test_emoji_only_comments_are_kept():
+    lines = collapse_comments(["👍", "👍👍👍", "❤️", "   ", "좋아요 최고"])
+    assert "👍 (×2)" in lines
+    assert "❤️" in lines
+    assert len(lines) == 3  # 공백뿐인 댓글만 빠짐
+
+
+def test_close_pairs_chunked_matches_full_matrix(monkeypatch):
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 2**63, size=40, dtype=np.uint64)
+    flips = np.uint64(1) << rng.integers(0, 64, size=40).astype(np.uint64)
+    fingerprints = np.concatenate([base, base ^ flips])  # 40쌍은 거리 1
+    full = set(_close_pairs(fingerprints, 3))
+    monkeypatch.setattr(comment_dedup, "_PAIR_CHUNK", 7)  # 행 묶음을 아주 작게
+    assert set(_close_pairs(fingerprints, 3)) == full
+    assert {(i, i + 40) for i in range(40)} <= full
+
+
+def test_huge_bucket_is_compared_in_windows(monkeypatch):
+    monkeypatch.setattr(comment_dedup, "MAX_BUCKET_COMPARE", 16)
+    monkeypatch.setattr(comment_dedup, "_PAIR_CHUNK", 64)
+    comments = [f"도배 광고 문구 입니다 {i % 3}" for i in range(300)]  # 정규화 후 3종류
+    comments += [f"똑같은 광고 링크 클릭하세요 번호{i:04d}" for i in range(200)]  # 비슷한 댓글 폭주
+    clusters = cluster_comments(comments)
+    assert sum(cluster["count"] for cluster in clusters) == len(comments)
+    assert len(clusters) < 100
@@ -0,0 +1,86 @@
+# %%
+import threading
+import time
+
+from comment_fetcher import clean_comment, iter_comment_batches
+
+
+class SlowClient:
+    """페이지마다 delay초가 걸리고, 보낸 요청 수를 세는 commentThreads 클라이언트입니다."""
+
+    def __init__(self, pages: int = 5, delay: float = 0.0):
+        self.pages = pages
+        self.delay = delay
+        self.requests = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def commentThreads(self):
+        return self
+
+    def list(self, pageToken=None, maxResults=100, **_):
+        self.kwargs = {"pageToken": pageToken, "maxResults": maxResults}
+        return self
+
+    def execute(self):
+        page_no = int(self.kwargs["pageToken"] or 0)
+        with self._lock:
+            self.requests += 1
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        time.sleep(self.delay)
+        with self._lock:
+            self.concurrent -= 1
+        items = [
+            {"snippet": {"topLevelComment": {"snippet": {"textDisplay": f"댓글 {page_no}-{i}<br>좋아요"}}}}
+            for i in range(self.kwargs["maxResults"])
+        ]
+        response = {"items": items}
+        if page_no + 1 < self.pages:
+            response["nextPageToken"] = str(page_no + 1)
+        return response
+
+
+def test_clean_comment():
+    assert clean_comment("<b>좋아요</b>&amp;<br>감사") == "좋아요 & 감사"
+
+
+def test_pages_until_max_comments():
+    client = SlowClient(pages=10)
+    batches = list(iter_comment_batches(client, "vid", max_comments=250, max_bytes=None, time_budget=None))
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+    assert client.requests == 3
+
+
+def test_early_stop_does_not_wait_for_inflight_page():
+    client = SlowClient(pages=10, delay=0.3)
+    batches = iter_comment_batches(client, "vid", max_bytes=None, time_budget=None)
+    next(batches)
+    time.sleep(0.05)  # 두 번째 페이지 요청이 백그라운드에서 진행 중
+    started = time.monotonic()
+    batches.close()
+    assert time.monotonic() - started < 0.2
+    time.sleep(0.4)
+    assert client.requests == 2  # 멈춘 뒤로는 새 페이지를 요청하지 않음
+
+
+def test_stop_event_skips_next_request():
+    client = SlowClient(pages=10)
+    stop = threading.Event()
+    collected = []
+    for batch in iter_comment_batches(client, "vid", max_bytes=None, time_budget=None, stop=stop):
+        collected.append(batch)
+        stop.set()
+    assert len(collected) <= 2
+    assert client.requests <= 2
+
+
+def test_same_client_requests_do_not_overlap():
+    client = SlowClient(pages=10, delay=0.1)
+    first = iter_comment_batches(client, "vid", max_bytes=None, time_budget=None)
+    next(first)
+    first.close()  # 진행 중인 요청은 기다리지 않고 반환
+    second = list(iter_comment_batches(client, "vid", max_comments=100, max_bytes=None, time_budget=None))
+    assert len(second) == 1
+    assert client.max_concurrent == 1
@@ -0,0 +1,64 @@
+# %%
+import threading
+import time
+from typing import TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from comment_prefetch import CommentPrefetcher, current_session
+
+
+def _blocking_job(started: threading.Event):
+    def job(cancelled: threading.Event):
+        started.set()
+        cancelled.wait(5)
+        return None if cancelled.is_set() else ["댓글"]
+    return job
+
+
+def test_cancel_waits_for_last_session():
+    prefetcher = CommentPrefetcher(max_workers=1)
+    started = threading.Event()
+    assert prefetcher.start("v1", _blocking_job(started), session="a")
+    assert not prefetcher.start("v1", _blocking_job(started), session="b")
+    started.wait(1)
+
+    # 다른 세션(b)이 아직 기다리므로 a가 거절해도 작업은 계속됩니다.
+    assert not prefetcher.cancel("v1", session="a")
+    assert prefetcher.stats()["pending"] == 1
+    assert prefetcher.cancel("v1", session="b")
+    assert prefetcher.stats()["entries"] == 0
+
+
+def test_taken_result_survives_other_session_decline():
+    prefetcher = CommentPrefetcher(max_workers=1)
+    prefetcher.start("v1", lambda cancelled: ["댓글"], session="a")
+    prefetcher.start("v1", lambda cancelled: ["댓글"], session="b")
+    assert prefetcher.take("v1", session="a") == ["댓글"]
+    # a는 결과를 가져갔으므로 관심 목록에서 빠지고, 마지막 세션 b의 거절로 정리됩니다.
+    assert prefetcher.cancel("v1", session="b")
+
+
+def test_ttl_expires_even_with_waiting_sessions():
+    prefetcher = CommentPrefetcher(ttl_seconds=0.05, max_workers=1)
+    prefetcher.start("v1", lambda cancelled: ["댓글"], session="a")
+    time.sleep(0.1)
+    assert prefetcher.take("v1", session="a") is None
+    assert prefetcher.stats()["expired"] == 1
+
+
+class _State(TypedDict, total=False):
+    session: str
+
+
+def test_current_session_reads_thread_id_in_routers():
+    builder = StateGraph(_State)
+    builder.add_node("node", lambda state: {"session": current_session()})
+    builder.add_node("done", lambda state: {"session": state["session"] + "!"})
+    builder.add_edge(START, "node")
+    builder.add_conditional_edges("node", lambda state: "done" if current_session() == state["session"] else END)
+    builder.add_edge("done", END)
+    graph = builder.compile()
+    # 노드와 조건부 엣지(router) 모두에서 같은 thread_id를 읽어야 "done"으로 갑니다.
+    assert graph.invoke({"session": ""}, {"configurable": {"thread_id": "t1"}})["session"] == "t1!"
+    assert current_session() == ""
@@ -0,0 +1,28 @@
+# %%
+import json
+
+from comment_sentiment import SentimentTally, inject_sentiment, score_comments
+
+COMMENTS = ["좋아요 최고", "별로예요", "그냥 봤어요", "안 좋아요", "not good but 👍", "도움이 안 돼요"] * 7
+
+
+def test_score_comments():
+    result = score_comments(["좋아요", "최악", "안 좋아요", "그냥"])
+    assert result["positive_hits"] == 1
+    assert result["negative_hits"] == 2
+    assert result["positive_percentage"] == 33
+    assert result["neutral_comments"] == 1
+    assert score_comments([])["positive_percentage"] is None
+
+
+def test_tally_matches_score_comments_for_any_batching():
+    tally = SentimentTally()
+    for i in range(0, len(COMMENTS), 5):
+        tally.add(COMMENTS[i:i + 5])
+    assert tally.result() == score_comments(COMMENTS)
+
+
+def test_inject_sentiment():
+    summary = inject_sentiment('{"overall_sentiment": {"description": "좋음"}}', {"positive_percentage": 80})
+    assert json.loads(summary)["overall_sentiment"] == {"description": "좋음", "positive_percentage": 80}
+    assert inject_sentiment("JSON 아님", {"positive_percentage": 80}) == "JSON 아님"
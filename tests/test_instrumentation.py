@@ -0,0 +1,151 @@
+# %%
+import json
+import re
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+
+import instrumentation
+from instrumentation import Metrics, instrument_node, llm_usage_callback, span
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(instrumentation, "INSTRUMENTATION_ENABLED", True)
+    monkeypatch.setattr(instrumentation, "metrics", Metrics())
+    monkeypatch.setattr(instrumentation, "_trace_writer", None)  # set_trace_file로 바꾼 값도 테스트 뒤 복원
+    return instrumentation.metrics
+
+
+def node_runs(metrics, graph, node, status):
+    return metrics.total("node_runs_total", graph=graph, node=node, status=status)
+
+
+def test_plain_function_records_latency_and_error_result(fresh_metrics):
+    def fetch(state):
+        if not state.get("url"):
+            return {"error": "URL 없음"}
+        return {"transcript": "자막"}
+
+    node = instrument_node("script", "fetch", fetch)
+    assert node.invoke({"url": "u"}) == {"transcript": "자막"}
+    assert node.invoke({}) == {"error": "URL 없음"}  # 노드 결과는 그대로 돌려줌
+
+    assert node_runs(fresh_metrics, "script", "fetch", "ok") == 1
+    assert node_runs(fresh_metrics, "script", "fetch", "error") == 1
+    [row] = fresh_metrics.node_summary()
+    assert (row["graph"], row["node"], row["runs"]) == ("script", "fetch", 2)
+
+
+def test_runnable_with_config_inside_graph(fresh_metrics):
+    @tool
+    def add(a: int, b: int) -> int:
+        """두 수를 더합니다."""
+        return a + b
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("tools", instrument_node("agent", "tools", ToolNode([add])))
+    builder.add_edge(START, "tools")
+    builder.add_edge("tools", END)
+    call = AIMessage(content="", tool_calls=[{"name": "add", "args": {"a": 2, "b": 3}, "id": "call-1"}])
+
+    result = builder.compile().invoke({"messages": [call]})
+    assert result["messages"][-1].content == "5"
+    assert node_runs(fresh_metrics, "agent", "tools", "ok") == 1
+
+
+def test_nested_spans_share_trace_and_write_otlp(tmp_path):
+    trace_path = tmp_path / "traces" / "trace.jsonl"
+    instrumentation.set_trace_file(str(trace_path))
+
+    with span("turn", graph="app") as outer:
+        with span("script.fetch", graph="script", node="fetch", video="abc") as inner:
+            inner.add("api.youtube.calls", 1)
+    with pytest.raises(ValueError):
+        with span("script.summarize", graph="script", node="summarize"):
+            raise ValueError("실패")
+
+    records = [json.loads(line) for line in trace_path.read_text(encoding="utf-8").splitlines()]
+    spans = [r["resourceSpans"][0]["scopeSpans"][0]["spans"][0] for r in records]
+    child, parent, failed = spans  # 안쪽 span이 먼저 끝나므로 먼저 기록됨
+
+    assert child["traceId"] == parent["traceId"] == outer.trace_id
+    assert child["parentSpanId"] == parent["spanId"] == outer.span_id
+    assert "parentSpanId" not in parent
+    assert failed["traceId"] != outer.trace_id  # 최상위 span은 새 트레이스
+    assert re.fullmatch(r"[0-9a-f]{32}", child["traceId"]) and re.fullmatch(r"[0-9a-f]{16}", child["spanId"])
+    assert int(child["endTimeUnixNano"]) >= int(child["startTimeUnixNano"])
+
+    attributes = {a["key"]: a["value"] for a in child["attributes"]}
+    assert attributes["video"] == {"stringValue": "abc"}
+    assert attributes["api.youtube.calls"] == {"intValue": "1"}
+    assert attributes["node"] == {"stringValue": "fetch"}
+    assert parent["status"] == {"code": 1}
+    assert failed["status"] == {"code": 2, "message": "ValueError: 실패"}
+    resource = records[0]["resourceSpans"][0]["resource"]["attributes"][0]
+    assert resource["key"] == "service.name"
+
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+
+def test_render_prometheus_exposition_format(fresh_metrics):
+    fresh_metrics.inc("api_calls_total", 2, api="youtube", graph="comment", node='say "hi"')
+    fresh_metrics.register_collector(lambda: [("rate_limit_available", {"bucket": "openai"}, 3.5)])
+    for value in (0.003, 0.2, 100.0):
+        fresh_metrics.observe("node_duration_seconds", value, graph="script", node="fetch")
+
+    text = instrumentation.render_prometheus()
+    assert text.endswith("\n")
+    declared = {}
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            declared[name] = kind
+            continue
+        if line.startswith("# HELP "):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in declared else name
+        assert family in declared, line  # 샘플보다 TYPE 선언이 먼저 나옴
+        samples[name + (labels or "")] = float(value)
+
+    assert declared["youtube_agent_api_calls_total"] == "counter"
+    assert declared["youtube_agent_rate_limit_available"] == "gauge"
+    assert declared["youtube_agent_node_duration_seconds"] == "histogram"
+    assert samples['youtube_agent_api_calls_total{api="youtube",graph="comment",node="say \\"hi\\""}'] == 2
+    assert samples['youtube_agent_rate_limit_available{bucket="openai"}'] == 3.5
+
+    labels = 'graph="script",node="fetch"'
+    buckets = [
+        (float(le), samples[key]) for key in samples
+        for le in re.findall(r'^youtube_agent_node_duration_seconds_bucket\{' + labels + r',le="([^"]+)"\}$', key)
+    ]
+    counts = [count for _, count in sorted(buckets)]
+    assert counts == sorted(counts)  # 누적 버킷
+    assert dict(buckets)[0.005] == 1 and dict(buckets)[0.25] == 2 and dict(buckets)[60.0] == 2
+    assert dict(buckets)[float("inf")] == samples[f"youtube_agent_node_duration_seconds_count{{{labels}}}"] == 3
+    assert samples[f"youtube_agent_node_duration_seconds_sum{{{labels}}}"] == pytest.approx(100.203)
+
+
+def test_llm_usage_callback_credits_active_span(fresh_metrics):
+    reply = AIMessage(content="요약", usage_metadata={"input_tokens": 12, "output_tokens": 5, "total_tokens": 17})
+    model = GenericFakeChatModel(messages=iter([reply]))
+
+    with span("script.summarize", graph="script", node="summarize") as current:
+        model.invoke([HumanMessage("자막")], config={"callbacks": [llm_usage_callback()]})
+
+    labels = {"graph": "script", "node": "summarize"}
+    assert fresh_metrics.total("llm_calls_total", **labels) == 1
+    assert fresh_metrics.total("llm_tokens_total", type="prompt", **labels) == 12
+    assert fresh_metrics.total("llm_tokens_total", type="completion", **labels) == 5
+    assert current.attributes["llm.prompt_tokens"] == 12
+    assert current.attributes["llm.completion_tokens"] == 5
+    assert fresh_metrics.total("llm_tokens_total", graph="", node="") == 0
@@ -0,0 +1,120 @@
+# %%
+import asyncio
+import json
+
+import pytest
+
+from json_stream import (
+    JsonStreamError,
+    JsonStreamParser,
+    astream_json_with_retry,
+    loads_llm_json,
+    stream_json_with_retry,
+)
+
+DOCUMENT = {
+    "요약": "하체 \"루틴\" 영상\n입니다",
+    "운동 루틴": ["1. 스쿼트", "2. 런지"],
+    "세트": [3, -1.5e2, 0],
+    "옵션": {"휴식": None, "유산소": True, "빈 목록": [], "빈 객체": {}},
+}
+
+
+def _feed_by(text: str, size: int):
+    parser, completed = JsonStreamParser(), []
+    for i in range(0, len(text), size):
+        completed += parser.feed(text[i:i + size])
+    return parser, completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 1000])
+def test_any_chunking_matches_json_loads(size):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=2)
+    parser, completed = _feed_by(text, size)
+    assert parser.close() == DOCUMENT
+    assert completed[-1] == ((), DOCUMENT)
+
+
+def test_reports_values_as_they_complete():
+    parser = JsonStreamParser()
+    assert parser.feed('{"요약": "짧') == []
+    assert parser.partial() == {}
+    assert parser.feed('은 요약", "운동 루틴": ["스쿼트"') == [(("요약",), "짧은 요약"), (("운동 루틴", 0), "스쿼트")]
+    assert parser.partial() == {"요약": "짧은 요약", "운동 루틴": ["스쿼트"]}
+    assert parser.feed("]}") == [(("운동 루틴",), ["스쿼트"]), ((), {"요약": "짧은 요약", "운동 루틴": ["스쿼트"]})]
+    assert parser.done
+
+
+def test_numbers_and_literals_split_across_tokens():
+    parser = JsonStreamParser()
+    assert parser.feed('[12') == []
+    assert parser.feed('34, tr') == [((0,), 1234)]
+    assert parser.feed('ue, nu') == [((1,), True)]
+    assert parser.feed('ll]') == [((2,), None), ((), [1234, True, None])]
+
+
+def test_code_fence_and_trailing_text_are_ignored():
+    assert loads_llm_json('```json\n{"a": 1}\n```\n설명입니다.') == {"a": 1}
+
+
+@pytest.mark.parametrize("text", ["요약: 하체 운동", '{"a" 1}', '{"a": 1 "b": 2}', "[1, 2}", '{a: 1}', "```" + "x" * 30])
+def test_invalid_json_fails_early(text):
+    with pytest.raises(JsonStreamError):
+        JsonStreamParser().feed(text)
+
+
+def test_truncated_output_fails_on_close():
+    with pytest.raises(JsonStreamError):
+        loads_llm_json('{"요약": "끊긴')
+    with pytest.raises(ValueError):  # JsonStreamError는 ValueError이므로 기존 except ValueError도 잡힘
+        loads_llm_json("")
+
+
+# %%
+class _Stream:
+    """시도마다 다른 토큰 목록을 내보내고, 몇 개를 내보냈는지/닫혔는지 기록하는 가짜 스트림입니다."""
+
+    def __init__(self, *attempts):
+        self.attempts = list(attempts)
+        self.sent = []
+        self.closed = []
+
+    def __call__(self):
+        tokens = self.attempts.pop(0)
+        index = len(self.sent)
+        self.sent.append(0)
+        self.closed.append(False)
+
+        def generate():
+            try:
+                for token in tokens:
+                    self.sent[index] += 1
+                    yield token
+            finally:
+                self.closed[index] = True
+
+        return generate()
+
+
+def test_retry_stops_broken_stream_early():
+    stream = _Stream(["요약", "은", "다음과", "같습니다"], ['{"a"', ": 1}"])
+    assert stream_json_with_retry(stream) == '{"a": 1}'
+    assert stream.sent == [1, 2]  # 첫 토큰에서 깨진 것을 보고 바로 멈춤
+    assert stream.closed == [True, True]
+
+
+def test_last_attempt_returns_raw_output():
+    stream = _Stream(["오류"], ["그래도", " 끝까지"])
+    assert stream_json_with_retry(stream, max_attempts=2) == "그래도 끝까지"
+
+
+def test_async_retry():
+    stream = _Stream(["x"], ['{"a": ', "[1]}"])
+
+    def astream():
+        async def generate():
+            for token in stream():
+                yield token
+        return generate()
+
+    assert asyncio.run(astream_json_with_retry(astream)) == '{"a": [1]}'
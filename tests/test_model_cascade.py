@@ -0,0 +1,91 @@
+# %%
+import json
+
+import pytest
+
+import token_budget
+from model_cascade import ModelCascade, validate_summary
+from resilience import DeadlineExceeded
+
+SCRIPT = {
+    "요약": "스쿼트와 런지로 하체 근력을 기르는 20분 루틴을 소개합니다.",
+    "운동 강도": "언급되지 않음",
+    "운동 루틴": ["1. 스쿼트 15회 3세트", "2. 런지 12회 3세트"],
+    "자극 신체 부위": "허벅지, 엉덩이",
+}
+COMMENT = {
+    "overall_sentiment": {"positive": "80%", "negative": "20%", "description": "대체로 따라 하기 쉽다는 반응입니다."},
+    "key_topics": ["자세 설명", "운동 강도"],
+    "user_tips": [],
+    "faq": [],
+}
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    monkeypatch.setattr(token_budget, "_get_encoding", lambda model: None)
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def test_valid_summaries_pass():
+    assert validate_summary("script", _dump(SCRIPT)) is None
+    assert validate_summary("comment", _dump(COMMENT)) is None
+
+
+def test_comment_tips_and_faq_only_need_keys_and_types():
+    assert validate_summary("comment", _dump({**COMMENT, "user_tips": "없음"})) == "'user_tips' 형식 오류"
+    missing_faq = {key: value for key, value in COMMENT.items() if key != "faq"}
+    assert validate_summary("comment", _dump(missing_faq)) == "'faq' 없음"
+
+
+def test_markers_only_apply_to_core_text():
+    # 영상에 정말 없는 정보를 알려 주는 항목은 확신 낮음이 아닙니다.
+    assert validate_summary("script", _dump({**SCRIPT, "자극 신체 부위": "정보 없음"})) is None
+    vague = {**SCRIPT, "요약": "영상 내용만으로는 운동 목적을 알 수 없는 루틴 영상입니다."}
+    assert validate_summary("script", _dump(vague)) == "확신 낮음: '요약'"
+    unsure = {**COMMENT, "overall_sentiment": {"description": "댓글 반응은 알 수 없습니다."}}
+    assert validate_summary("comment", _dump(unsure)) == "확신 낮음: 'overall_sentiment.description'"
+
+
+def test_schema_failures():
+    assert validate_summary("script", "요약입니다") == "JSON 아님"
+    assert validate_summary("script", _dump({**SCRIPT, "운동 루틴": []})) == "'운동 루틴' 비어 있음"
+    assert validate_summary("script", _dump({**SCRIPT, "요약": "짧은 요약"})) == "확신 낮음: '요약' 너무 짧음"
+    assert validate_summary("comment", _dump({**COMMENT, "key_topics": []})) == "'key_topics' 비어 있음"
+
+
+# %%
+def test_cascade_escalates_only_when_needed():
+    cascade = ModelCascade(["small", "large"], enabled=True)
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        return "형식이 깨진 응답" if model == "small" else _dump(SCRIPT)
+
+    assert cascade.run("script", call, prompt_tokens=100) == _dump(SCRIPT)
+    assert calls == ["small", "large"]
+
+    calls.clear()
+    assert cascade.run("script", lambda model: calls.append(model) or _dump(SCRIPT), prompt_tokens=100) == _dump(SCRIPT)
+    assert calls == ["small"]
+
+
+def test_cascade_does_not_escalate_past_deadline():
+    cascade = ModelCascade(["small", "large"], enabled=True)
+
+    def call(model):
+        raise DeadlineExceeded("마감 시각 초과")
+
+    with pytest.raises(DeadlineExceeded):
+        cascade.run("script", call, prompt_tokens=100)
+
+
+def test_disabled_cascade_uses_largest_model_only():
+    cascade = ModelCascade(["small", "large"], enabled=False)
+    calls = []
+    assert cascade.run("comment", lambda model: calls.append(model) or "아무 출력", prompt_tokens=10) == "아무 출력"
+    assert calls == ["large"]
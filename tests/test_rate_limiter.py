@@ -0,0 +1,123 @@
+# %%
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from rate_limiter import (
+    MemoryBucketStore,
+    RateLimiter,
+    RateLimitTimeout,
+    async_rate_limit_callback,
+    rate_limit_callback,
+    rate_limiter,
+)
+
+
+def _limiter(capacity=1.0, refill=20.0, max_wait=0.0):
+    limiter = RateLimiter(store=MemoryBucketStore(), max_wait=max_wait, enabled=True)
+    limiter.configure("b", capacity, refill)
+    return limiter
+
+
+def test_acquire_waits_for_refill():
+    limiter = _limiter(capacity=1, refill=10)
+    assert limiter.acquire("b") < 0.01
+    assert limiter.acquire("b") >= 0.05
+
+
+def test_timeout_raises():
+    limiter = _limiter(capacity=1, refill=0.1, max_wait=0.05)
+    limiter.acquire("b")
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("b")
+    with pytest.raises(RateLimitTimeout):
+        asyncio.run(limiter.aacquire("b"))
+
+
+def test_sync_and_async_callers_share_one_fifo_line():
+    limiter = _limiter(capacity=1, refill=20)
+    limiter.acquire("b")  # 버킷을 비워 모두 줄을 서게 함
+    order = []
+
+    def thread_caller(label):
+        limiter.acquire("b")
+        order.append(label)
+
+    async def main():
+        threads = []
+        tasks = []
+        for i in range(6):
+            if i % 2:
+                tasks.append(asyncio.create_task(limiter.aacquire("b")))
+                tasks[-1].add_done_callback(lambda _, label=f"async{i}": order.append(label))
+                await asyncio.sleep(0.01)
+            else:
+                thread = threading.Thread(target=thread_caller, args=(f"sync{i}",))
+                thread.start()
+                threads.append(thread)
+                await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+        await asyncio.to_thread(lambda: [thread.join() for thread in threads])
+
+    asyncio.run(main())
+    assert order == ["sync0", "async1", "sync2", "async3", "sync4", "async5"]
+
+
+def test_cancelled_async_waiter_gives_up_its_turn():
+    limiter = _limiter(capacity=1, refill=20)
+    limiter.acquire("b")
+
+    async def main():
+        first = asyncio.create_task(limiter.aacquire("b"))
+        second = asyncio.create_task(limiter.aacquire("b"))
+        await asyncio.sleep(0)
+        second.cancel()
+        await first
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        # 취소된 대기자가 줄을 막지 않습니다.
+        await asyncio.wait_for(limiter.aacquire("b"), 1)
+
+    asyncio.run(main())
+
+
+# %%
+@pytest.fixture
+def throttled_model():
+    """요청 수 버킷이 초당 5개만 채워지는 가짜 모델입니다."""
+    name = "rate-limit-test-model"
+    rate_limiter.configure(f"openai.{name}.requests", 1, 5)
+    rate_limiter.configure(f"openai.{name}.tokens", 1_000_000, 1_000_000)
+    model = FakeListChatModel(responses=["ok"], callbacks=[rate_limit_callback(), async_rate_limit_callback()])
+    return model, {"metadata": {"ls_model_name": name}}
+
+
+def test_async_llm_calls_do_not_block_default_executor(throttled_model):
+    model, config = throttled_model
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        calls = [asyncio.create_task(model.ainvoke("안녕", config=config)) for _ in range(4)]
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await asyncio.to_thread(lambda: None)  # 자막 받기처럼 기본 스레드 풀을 쓰는 작업
+        to_thread_latency = time.monotonic() - started
+        call_started = time.monotonic()
+        await asyncio.gather(*calls)
+        return to_thread_latency, time.monotonic() - call_started
+
+    to_thread_latency, calls_latency = asyncio.run(main())
+    assert calls_latency > 0.3  # 한도 때문에 실제로 기다림
+    assert to_thread_latency < 0.1  # 그동안에도 스레드 풀은 비어 있음
+
+
+def test_sync_llm_calls_still_wait(throttled_model):
+    model, config = throttled_model
+    started = time.monotonic()
+    for _ in range(3):
+        model.invoke("안녕", config=config)
+    assert time.monotonic() - started >= 0.3
@@ -0,0 +1,39 @@
+# %%
+import pytest
+
+from reply_classifier import COMMENT, DECLINE, SCRIPT, RouteDecisionMemo, classify_reply, normalize_reply
+
+
+def test_normalize_reply():
+    assert normalize_reply("응응응!!") == "응"
+    assert normalize_reply("  Don't  SHOW ") == "dont show"
+
+
+@pytest.mark.parametrize("reply", ["응", "ㅇㅇ", "네!", "yes please", "tell me", "show me", "보여줘", "궁금해요"])
+def test_affirmative(reply):
+    assert classify_reply("https://youtu.be/x", reply) == COMMENT
+
+
+@pytest.mark.parametrize("reply", ["아니", "ㄴㄴ", "no thanks", "괜찮아요", "안 보여줘", "안궁금해", "don't show", "not tell"])
+def test_negative(reply):
+    assert classify_reply("https://youtu.be/x", reply) == DECLINE
+
+
+@pytest.mark.parametrize("reply", ["어", "hotel", "motel room", "댓글 말고 다른 영상에서 운동 강도를 비교해 줄 수 있어?"])
+def test_ambiguous_goes_to_llm(reply):
+    assert classify_reply("https://youtu.be/x", reply) is None
+
+
+def test_empty_reply_is_script_turn():
+    assert classify_reply("https://youtu.be/x", "") == SCRIPT
+
+
+def test_memo_counts_skipped_calls():
+    memo = RouteDecisionMemo(max_size=2)
+    assert memo.lookup("u", "응") == COMMENT
+    assert memo.lookup("u", "hotel") is None
+    memo.remember("u", "hotel", DECLINE)
+    assert memo.lookup("u", "hotel!!") == DECLINE
+    assert memo.stats() == {
+        "rule_hits": 1, "memo_hits": 1, "llm_calls": 1, "skipped_llm_calls": 2, "skip_rate": 2 / 3,
+    }
@@ -0,0 +1,169 @@
+# %%
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import resilience
+from resilience import (
+    CallCancelled,
+    CircuitOpenError,
+    DeadlineExceeded,
+    ResiliencePolicy,
+    acall_llm,
+    call_llm,
+    cancellable,
+    current_deadline,
+    is_transient,
+    with_deadline,
+)
+
+
+@pytest.fixture(autouse=True)
+def fast_policy():
+    resilience.set_policy(ResiliencePolicy(backoff_base=0.0, backoff_max=0.0, hedge=False,
+                                           circuit_failures=3, circuit_cooldown=0.1))
+    yield
+    resilience.set_policy()
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _flaky(failures, error=ConnectionError):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error("일시적 오류")
+        return "ok"
+    return fn, calls
+
+
+def test_transient_errors():
+    assert is_transient(ConnectionError())
+    assert is_transient(StatusError(429)) and is_transient(StatusError(503))
+    assert not is_transient(StatusError(400))
+    assert not is_transient(ValueError())
+    assert not is_transient(DeadlineExceeded())
+    assert is_transient(type("RateLimitError", (Exception,), {})())
+
+
+def test_retries_transient_errors_until_success():
+    fn, calls = _flaky(2)
+    assert call_llm("m-retry", fn) == "ok"
+    assert len(calls) == 3
+
+
+def test_does_not_retry_permanent_errors():
+    fn, calls = _flaky(1, error=ValueError)
+    with pytest.raises(ValueError):
+        call_llm("m-permanent", fn)
+    assert len(calls) == 1
+
+
+def test_gives_up_after_max_attempts():
+    resilience.set_policy(ResiliencePolicy(backoff_base=0.0, backoff_max=0.0, hedge=False, max_attempts=2, circuit_failures=99))
+    fn, calls = _flaky(5)
+    with pytest.raises(ConnectionError):
+        call_llm("m-attempts", fn)
+    assert len(calls) == 2
+
+
+def test_circuit_opens_and_recovers():
+    resilience.set_policy(ResiliencePolicy(backoff_base=0.0, backoff_max=0.0, hedge=False, max_attempts=1,
+                                           circuit_failures=2, circuit_cooldown=0.1))
+    fn, calls = _flaky(2)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call_llm("m-circuit", fn)
+    with pytest.raises(CircuitOpenError):
+        call_llm("m-circuit", fn)
+    assert len(calls) == 2  # 열린 동안에는 호출하지 않음
+    time.sleep(0.15)
+    assert call_llm("m-circuit", fn) == "ok"  # 쿨다운 뒤 시험 호출이 성공하면 닫힘
+    assert resilience.circuit_breaker("m-circuit").state == "closed"
+
+
+# %%
+def test_with_deadline_keeps_earlier_deadline():
+    config = with_deadline(None, 10)
+    tighter = with_deadline(config, 1)
+    assert tighter["configurable"]["deadline"] < config["configurable"]["deadline"]
+    assert with_deadline(tighter, 100)["configurable"]["deadline"] == tighter["configurable"]["deadline"]
+    assert "deadline" not in with_deadline(None, 0)["configurable"]
+
+
+def test_deadline_is_read_from_running_config():
+    config = with_deadline(None, 5)
+    seen = RunnableLambda(lambda _: current_deadline()).invoke(None, config)
+    assert seen == config["configurable"]["deadline"]
+    assert current_deadline() is None
+
+
+def test_slow_call_is_abandoned_at_deadline():
+    release = threading.Event()
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        call_llm("m-deadline", lambda: release.wait(5), deadline=time.time() + 0.2)
+    assert time.monotonic() - started < 1.0
+    release.set()
+
+
+def test_expired_deadline_skips_call():
+    fn, calls = _flaky(0)
+    with pytest.raises(DeadlineExceeded):
+        call_llm("m-expired", fn, deadline=time.time() - 1)
+    assert calls == []
+
+
+def test_hedge_wins_over_slow_primary_and_cancels_it():
+    resilience.set_policy(ResiliencePolicy(backoff_base=0.0, backoff_max=0.0, hedge=True, hedge_min_samples=1,
+                                           hedge_quantile=0.5, hedge_budget=1.0))
+    call_llm("m-hedge", lambda: "warm")  # 지연 표본 하나 (거의 0초)
+    stopped = []
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        delay = 1.0 if len(attempts) == 1 else 0.0  # 첫 요청만 느림
+        try:
+            for _ in cancellable(range(int(delay / 0.01) + 1)):
+                time.sleep(0.01)
+        except CallCancelled:
+            stopped.append(1)
+            raise
+        return "fast" if delay == 0 else "slow"
+
+    started = time.monotonic()
+    assert call_llm("m-hedge", fn) == "fast"
+    assert time.monotonic() - started < 0.5
+    time.sleep(0.05)
+    assert stopped == [1]  # 진 쪽 스트림은 다음 조각에서 멈춤
+
+
+# %%
+def test_async_retry_and_deadline():
+    fn, calls = _flaky(1)
+
+    async def afn():
+        return fn()
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def main():
+        assert await acall_llm("m-async", afn) == "ok"
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await acall_llm("m-async-deadline", slow, deadline=time.time() + 0.2)
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) < 1.0
+    assert len(calls) == 2
@@ -0,0 +1,101 @@
+# %%
+import asyncio
+import threading
+import time
+
+import pytest
+
+from resilience import DeadlineExceeded
+from single_flight import SingleFlight
+
+
+def _run_joiner(flights, op, key, fn, results):
+    def run():
+        try:
+            results.append(flights.do(op, key, fn))
+        except Exception as e:
+            results.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_concurrent_callers_share_one_call():
+    flights, calls, results = SingleFlight(), [], []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return "자막"
+
+    threads = [_run_joiner(flights, "transcript", "v1", fn, results) for _ in range(5)]
+    for thread in threads:
+        thread.join()
+    assert results == ["자막"] * 5
+    assert len(calls) == 1
+    assert flights.stats()["shared"] == 4
+    assert flights.inflight() == {}
+
+
+def test_ordinary_failure_is_shared():
+    flights, calls, results = SingleFlight(), [], []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        raise ValueError("자막 없음")
+
+    threads = [_run_joiner(flights, "transcript", "v1", fn, results) for _ in range(3)]
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_leader_deadline_is_not_shared():
+    flights, calls, results = SingleFlight(), [], []
+    joined = threading.Event()
+
+    def leader_fn():
+        calls.append("leader")
+        joined.wait(1)
+        raise DeadlineExceeded("먼저 시작한 요청의 마감 시각 초과")
+
+    def joiner_fn():
+        calls.append("joiner")
+        return "자막"
+
+    leader = _run_joiner(flights, "transcript", "v1", leader_fn, results)
+    time.sleep(0.05)
+    joiner = _run_joiner(flights, "transcript", "v1", joiner_fn, results)
+    time.sleep(0.05)
+    joined.set()
+    leader.join()
+    joiner.join()
+    # 먼저 시작한 쪽만 마감 시각 초과로 실패하고, 기다리던 쪽은 새로 시작해 결과를 받습니다.
+    assert calls == ["leader", "joiner"]
+    assert isinstance(results[0], DeadlineExceeded)
+    assert results[1] == "자막"
+    assert flights.inflight() == {}
+
+
+def test_cancelled_async_leader_hands_over_to_joiner():
+    flights, calls = SingleFlight(), []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "댓글"
+
+    async def main():
+        leader = asyncio.create_task(flights.ado("comments", "v1", fn))
+        await asyncio.sleep(0.05)
+        joiner = asyncio.create_task(flights.ado("comments", "v1", fn))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await joiner
+
+    assert asyncio.run(main()) == "댓글"
+    assert len(calls) == 2
@@ -0,0 +1,143 @@
+# %%
+import operator
+import time
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, interrupt
+
+from sqlite_checkpointer import BoundedSqliteSaver
+
+
+@pytest.fixture
+def saver(tmp_path):
+    return BoundedSqliteSaver(str(tmp_path / "checkpoints.sqlite3"), keep_checkpoints=2)
+
+
+def _put(saver, thread_id, checkpoint_ns="", parent=None, payload="", step=0):
+    checkpoint = empty_checkpoint()
+    checkpoint["id"] = str(uuid6(clock_seq=step))
+    checkpoint["channel_values"] = {"payload": payload}
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}}
+    if parent:
+        config["configurable"]["checkpoint_id"] = parent
+    saver.put(config, checkpoint, {"source": "loop", "step": step, "writes": None, "parents": {}}, {})
+    return checkpoint["id"]
+
+
+def _ids(saver, thread_id, checkpoint_ns=None):
+    config = {"configurable": {"thread_id": thread_id}}
+    if checkpoint_ns is not None:
+        config["configurable"]["checkpoint_ns"] = checkpoint_ns
+    return [item.config["configurable"]["checkpoint_id"] for item in saver.list(config)]
+
+
+def test_put_get_list_round_trip(saver):
+    first = _put(saver, "t1", payload="a", step=0)
+    second = _put(saver, "t1", parent=first, payload="b", step=1)
+    saver.put_writes({"configurable": {"thread_id": "t1", "checkpoint_ns": "", "checkpoint_id": second}},
+                     [("payload", "c")], "task-1")
+
+    latest = saver.get_tuple({"configurable": {"thread_id": "t1", "checkpoint_ns": ""}})
+    assert latest.checkpoint["channel_values"] == {"payload": "b"}
+    assert latest.parent_config["configurable"]["checkpoint_id"] == first
+    assert latest.pending_writes == [("task-1", "payload", "c")]
+    assert _ids(saver, "t1") == [second, first]
+    assert [item.metadata["step"] for item in saver.list(None, filter={"step": 0})] == [0]
+    assert saver.get_tuple({"configurable": {"thread_id": "없음", "checkpoint_ns": ""}}) is None
+
+
+def test_compaction_keeps_recent_checkpoints(saver):
+    parent = None
+    ids = []
+    for step in range(5):
+        parent = _put(saver, "t1", parent=parent, step=step)
+        ids.append(parent)
+    assert _ids(saver, "t1") == ids[::-1][:2]
+    assert saver.stats()["compacted_checkpoints"] == 3
+
+
+def test_root_put_drops_finished_subgraphs(saver):
+    root = _put(saver, "t1", step=0)
+    finished = _put(saver, "t1", checkpoint_ns="child:1", step=0)
+    # 하위 그래프를 실행한 단계의 최상위 체크포인트가 저장될 때까지는 남아 있습니다.
+    next_root = _put(saver, "t1", parent=root, step=1)
+    assert _ids(saver, "t1", "child:1") == [finished]
+    _put(saver, "t1", parent=next_root, step=2)
+    assert _ids(saver, "t1", "child:1") == []
+
+
+def test_size_eviction_keeps_running_subgraph(tmp_path):
+    saver = BoundedSqliteSaver(str(tmp_path / "checkpoints.sqlite3"), max_thread_bytes=1, keep_checkpoints=4)
+    big = "x" * 2000
+    root_first = _put(saver, "t1", payload=big, step=0)
+    root = _put(saver, "t1", parent=root_first, payload=big, step=1)
+    sub_first = _put(saver, "t1", checkpoint_ns="child:1", payload=big, step=0)
+    sub_second = _put(saver, "t1", checkpoint_ns="child:1", parent=sub_first, payload=big, step=1)
+    sub_third = _put(saver, "t1", checkpoint_ns="child:1", parent=sub_second, payload=big, step=2)
+
+    # 용량 제한(1바이트)을 넘어도 최상위 그래프와 실행 중인 하위 그래프의 최신 체크포인트+부모는 남습니다.
+    assert _ids(saver, "t1", "") == [root, root_first]
+    assert _ids(saver, "t1", "child:1") == [sub_third, sub_second]
+    latest = saver.get_tuple({"configurable": {"thread_id": "t1", "checkpoint_ns": "child:1"}})
+    assert latest.checkpoint["channel_values"] == {"payload": big}
+
+
+def test_sweep_evicts_expired_and_overflow_threads(tmp_path):
+    saver = BoundedSqliteSaver(str(tmp_path / "checkpoints.sqlite3"), max_threads=2)
+    for i in range(4):
+        _put(saver, f"t{i}", step=0)
+        time.sleep(0.01)
+    assert saver.sweep() == 2
+    assert _ids(saver, "t0") == [] and _ids(saver, "t1") == []
+    assert len(_ids(saver, "t3")) == 1
+
+    saver.ttl_seconds = 0
+    assert saver.sweep() == 2
+    assert saver.stats()["threads"] == 0
+
+
+# %%
+class ChildState(TypedDict):
+    steps: Annotated[list, operator.add]
+
+
+def _graph(saver):
+    def first(state):
+        return {"steps": ["first" + "!" * 4000]}
+
+    def ask(state):
+        return {"steps": [interrupt("계속할까요?")]}
+
+    def last(state):
+        return {"steps": ["last"]}
+
+    child = StateGraph(ChildState)
+    child.add_node("first", first)
+    child.add_node("ask", ask)
+    child.add_node("last", last)
+    child.add_edge(START, "first")
+    child.add_edge("first", "ask")
+    child.add_edge("ask", "last")
+    child.add_edge("last", END)
+
+    parent = StateGraph(ChildState)
+    parent.add_node("child", child.compile())
+    parent.add_edge(START, "child")
+    parent.add_edge("child", END)
+    return parent.compile(checkpointer=saver)
+
+
+def test_subgraph_resumes_after_size_eviction(tmp_path):
+    saver = BoundedSqliteSaver(str(tmp_path / "checkpoints.sqlite3"), max_thread_bytes=1)
+    graph = _graph(saver)
+    config = {"configurable": {"thread_id": "t1"}}
+    graph.invoke({"steps": []}, config)
+    assert graph.get_state(config).next == ("child",)
+
+    result = graph.invoke(Command(resume="네"), config)
+    # 하위 그래프가 처음부터 다시 돌지 않고 멈춘 곳(ask)에서 이어집니다.
+    assert result["steps"] == ["first" + "!" * 4000, "네", "last"]
@@ -0,0 +1,52 @@
+# %%
+import sqlite3
+
+import pytest
+
+from summary_cache import SummaryCache
+
+ARGS = ("script", "vid", "자막 내용", "프롬프트 v1", "gpt-4o-mini")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SummaryCache(db_path=str(tmp_path / "summaries.sqlite3"), max_entries=3, ttl_seconds=60)
+
+
+def test_put_then_get(cache):
+    assert cache.get(*ARGS) is None
+    cache.put(*ARGS, "요약")
+    assert cache.get(*ARGS) == "요약"
+    assert cache.stats()["hits"] == 1
+
+
+def test_other_prompt_version_keeps_entries(cache):
+    cache.put(*ARGS, "v1 요약")
+    other = ARGS[:3] + ("프롬프트 v2", ARGS[4])
+    cache.put(*other, "v2 요약")
+    assert cache.get(*other) == "v2 요약"
+    assert cache.get(*ARGS) == "v1 요약"  # 다른 프롬프트 버전의 저장이 기존 항목을 지우지 않음
+
+
+def test_lru_and_ttl_eviction(cache, monkeypatch):
+    for i in range(5):
+        cache.put("script", f"vid{i}", "자막", "프롬프트", "m", f"요약{i}")
+    assert cache.stats()["entries"] == 3
+    assert cache.get("script", "vid0", "자막", "프롬프트", "m") is None
+
+    import summary_cache as module
+    now = module.time.time()
+    monkeypatch.setattr(module.time, "time", lambda: now + 120)
+    assert cache.get("script", "vid4", "자막", "프롬프트", "m") is None
+
+
+class BrokenConnection:
+    def execute(self, *args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_sqlite_errors_fail_open(cache):
+    cache._conn = BrokenConnection()
+    assert cache.get(*ARGS) is None
+    cache.put(*ARGS, "요약")  # 예외 없이 저장만 생략
+    assert cache.errors == 2
@@ -0,0 +1,68 @@
+# %%
+import sys
+import types
+
+import pytest
+
+import token_budget
+from token_budget import SAMPLE_GAP_MARKER, count_tokens, plan_transcript, truncate_to_tokens
+
+_get_encoding_uncached = token_budget._get_encoding.__wrapped__  # lru_cache 없이 호출
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    """BPE 파일 없이도 같은 결과가 나오도록 추정치 토큰 수를 씁니다."""
+    monkeypatch.setattr(token_budget, "_get_encoding", lambda model: None)
+
+
+def test_unknown_strategy_raises():
+    with pytest.raises(ValueError):
+        plan_transcript(["짧은 자막"], "gpt-4o", strategy="truncate")
+
+
+def test_within_budget_keeps_everything():
+    plan = plan_transcript(["하나", "둘"], "gpt-4o", budget=100)
+    assert plan["transcript"] == "하나 둘"
+    assert plan["token_budget"]["strategy"] == "single"
+
+
+def test_map_reduce_keeps_full_transcript():
+    segments = ["스쿼트 열 번 하세요"] * 50
+    plan = plan_transcript(segments, "gpt-4o", strategy="map_reduce", budget=100)
+    assert plan["token_budget"]["strategy"] == "map_reduce"
+    assert plan["transcript"] == " ".join(segments)
+
+
+def test_sample_spreads_over_whole_video():
+    segments = [f"구간{i:03d} 운동 설명" for i in range(240)]
+    plan = plan_transcript(segments, "gpt-4o", strategy="sample", budget=300)
+    accounting = plan["token_budget"]
+    assert accounting["strategy"] == "sample"
+    assert accounting["kept_tokens"] <= 300
+    assert "구간000" in plan["transcript"] and "구간220" in plan["transcript"]
+    assert SAMPLE_GAP_MARKER in plan["transcript"]
+
+
+def test_sample_truncates_oversized_segment_instead_of_dropping_it():
+    plan = plan_transcript(["아주 긴 자막 한 덩어리 " * 500], "gpt-4o", strategy="sample", budget=200)
+    assert plan["transcript"]
+    assert count_tokens(plan["transcript"]) <= 200
+    assert plan["token_budget"]["kept_segments"] == 1
+
+
+def test_truncate_to_tokens_with_estimate():
+    text = "가나다라마바사" * 10
+    assert truncate_to_tokens(text, 1000) == text
+    assert count_tokens(truncate_to_tokens(text, 12)) <= 12
+
+
+def test_get_encoding_falls_back_when_bpe_download_fails(monkeypatch):
+    def unknown_model(model):
+        raise KeyError(model)
+
+    def offline(name):
+        raise ConnectionError("BPE 파일을 받을 수 없음")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(encoding_for_model=unknown_model, get_encoding=offline))
+    assert _get_encoding_uncached("my-model") is None
@@ -0,0 +1,40 @@
+# %%
+import os
+
+import pytest
+
+from transcript_cache import TranscriptCache
+
+TRANSCRIPT = [{"text": "안녕하세요", "start": 0.0, "duration": 1.0}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TranscriptCache(cache_dir=str(tmp_path / "transcripts"), max_bytes=10_000, ttl_seconds=60)
+
+
+def test_put_then_get(cache):
+    assert cache.get("abc", ("ko",)) is None
+    cache.put("abc", ("ko",), TRANSCRIPT)
+    assert cache.get("abc", ("ko",)) == TRANSCRIPT
+    assert cache.get("abc", ("en",)) is None  # 언어 우선순위가 다르면 다른 키
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = TranscriptCache(cache_dir=str(tmp_path), max_bytes=400, ttl_seconds=60)
+    for video_id in ("a", "b", "c", "d"):
+        cache.put(video_id, ("ko",), TRANSCRIPT)
+    assert cache.stats()["evictions"] > 0
+    assert cache.get("d", ("ko",)) == TRANSCRIPT
+    assert cache.get("a", ("ko",)) is None
+
+
+def test_put_failure_keeps_fetched_transcript(cache, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise OSError(30, "Read-only file system")
+
+    monkeypatch.setattr(os, "makedirs", read_only)
+    assert cache.get_or_fetch("abc", ("ko",), lambda video_id, languages: TRANSCRIPT) == TRANSCRIPT
+    assert cache.stats()["write_errors"] == 1
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,71 @@
+# %%
+import asyncio
+from types import SimpleNamespace
+from typing import Optional, TypedDict
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+import youtube_agent
+from reply_classifier import RouteDecisionMemo
+from youtube_agent import continue_with_memory, reply_turn, resume_turn
+
+
+class TurnState(TypedDict, total=False):
+    url: str
+    reply: Optional[str]
+    seen: str
+
+
+def _graph(checkpointer=None):
+    builder = StateGraph(TurnState)
+    builder.add_node("echo", lambda state: {"seen": f"{state.get('url')}|{state.get('reply')}"})
+    builder.add_edge(START, "echo")
+    builder.add_edge("echo", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def test_continue_with_memory_keeps_old_signature_without_checkpointer():
+    result = continue_with_memory(_graph(), {"url": "u1"}, {}, reply_turn("응"))
+    assert result["seen"] == "u1|응"
+
+
+def test_continue_with_memory_resumes_from_checkpoint():
+    graph = _graph(MemorySaver())
+    config = {"configurable": {"thread_id": "t1"}}
+    graph.invoke({"url": "u1"}, config)
+    with pytest.warns(UserWarning):
+        result = continue_with_memory(graph, {"url": "다른 값"}, config, reply_turn("응"))
+    assert result["seen"] == "u1|응"
+
+
+def test_continue_with_memory_starts_empty_thread_from_initial_state():
+    graph = _graph(MemorySaver())
+    result = continue_with_memory(graph, {"url": "u1"}, {"configurable": {"thread_id": "new"}}, reply_turn("응"))
+    assert result["seen"] == "u1|응"
+
+
+def test_resume_turn_requires_checkpoint():
+    with pytest.raises(ValueError):
+        resume_turn(_graph(MemorySaver()), {"configurable": {"thread_id": "empty"}}, reply_turn("응"))
+
+
+class _FakeRouterChain:
+    def invoke(self, inputs):
+        return SimpleNamespace(target="summarize_comment")
+
+    async def ainvoke(self, inputs):
+        return self.invoke(inputs)
+
+
+def test_router_builds_chain_once(monkeypatch):
+    built = []
+    monkeypatch.setitem(youtube_agent._LAZY_ATTRIBUTES, "router_chain", lambda: built.append(1) or _FakeRouterChain())
+    monkeypatch.delitem(vars(youtube_agent), "router_chain", raising=False)
+    monkeypatch.setattr(youtube_agent, "route_memo", RouteDecisionMemo())
+    # 규칙으로 분류되지 않는 답변이라 매번 LLM 라우터로 갑니다. (URL을 바꿔 메모도 피함)
+    for i in range(3):
+        assert youtube_agent.router({"url": f"u{i}", "reply": "채널 주인 누구야?"}) == "summarize_comment"
+    assert asyncio.run(youtube_agent.arouter({"url": "u9", "reply": "채널 주인 누구야?"})) == "summarize_comment"
+    assert built == [1]
@@ -0,0 +1,176 @@
+# %%
+import math
+import os
+import re
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+# %%
+# 모델별로 자막(스크립트)에 쓸 수 있는 입력 토큰 예산
+# (시스템 프롬프트/출력 토큰 여유를 빼고 자막 본문에만 적용되는 값)
+MODEL_TRANSCRIPT_TOKEN_BUDGETS = {
+    "gpt-4o": 12000,
+    "gpt-4o-mini": 12000,
+}
+DEFAULT_TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "0")) or None
+SAMPLE_WINDOWS = int(os.getenv("TRANSCRIPT_SAMPLE_WINDOWS", "12"))  # 균등 샘플링 시 나눌 구간 수
+SAMPLE_GAP_MARKER = "[...]"
+STRATEGIES = ("map_reduce", "sample")  # 예산을 넘는 자막 처리 방식 (plan_transcript 참고)
+
+_HANGUL_RE = re.compile(r"[가-힣ㄱ-ㅎㅏ-ㅣ]")
+_CJK_RE = re.compile(r"[぀-ヿ一-鿿]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+# %%
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """모델에 맞는 tiktoken 인코딩을 반환합니다. tiktoken이 없거나 BPE 파일을 받을 수 없으면 None."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # 모르는 모델 이름이면 최신 OpenAI 모델의 인코딩을 씁니다. (이 경우에도 BPE 파일을 내려받아야 할 수 있음)
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken 인코딩을 불러오지 못해 추정치로 계산합니다 ({type(e).__name__})")
+        return None
+
+
+def tokenizer_name(model: str) -> str:
+    encoding = _get_encoding(model)
+    return f"tiktoken:{encoding.name}" if encoding is not None else "estimate"
+
+
+def _estimate_tokens(text: str) -> int:
+    """tiktoken을 쓸 수 없을 때의 보수적인 추정치 (한글/한자 1글자=1토큰, 나머지 약 4글자=1토큰)."""
+    wide = len(_HANGUL_RE.findall(text)) + len(_CJK_RE.findall(text))
+    rest = len(_SPACE_RE.sub("", text)) - wide
+    return wide + math.ceil(rest / 4)
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """텍스트의 토큰 수를 셉니다."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return _estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(texts: Sequence[str], model: str = "gpt-4o") -> List[int]:
+    """여러 텍스트의 토큰 수를 한 번에 셉니다. (tiktoken의 병렬 배치 인코딩 사용)"""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return [_estimate_tokens(text) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_batch(list(texts), disallowed_special=())]
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """텍스트를 앞에서부터 max_tokens 토큰까지만 남깁니다."""
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    # 추정치로 셀 때는 글자 수를 비율대로 줄여 가며 맞춥니다.
+    while text and _estimate_tokens(text) > max_tokens:
+        text = text[: int(len(text) * max_tokens / _estimate_tokens(text))]
+    return text
+
+
+def transcript_token_budget(model: str) -> int:
+    """모델별 자막 토큰 예산을 반환합니다. (TRANSCRIPT_TOKEN_BUDGET 환경 변수가 있으면 우선)"""
+    return DEFAULT_TRANSCRIPT_TOKEN_BUDGET or MODEL_TRANSCRIPT_TOKEN_BUDGETS.get(model, 12000)
+
+
+# %%
+def sample_segments_evenly(segments: Sequence[str], segment_tokens: Sequence[int], budget: int, windows: int = SAMPLE_WINDOWS) -> List[int]:
+    """
+    영상 전체에서 균등한 간격으로 구간(window)을 골라, 예산 안에 들어오는 자막 조각 인덱스를 반환합니다.
+    앞부분만 남기고 뒷부분을 버리는 대신, 영상의 처음/중간/끝이 고르게 포함되도록 합니다.
+    """
+    n = len(segments)
+    windows = max(1, min(windows, n))
+    per_window = budget // windows
+    selected = []
+    for w in range(windows):
+        # 각 구간의 시작 위치를 영상 전체에 균등하게 배치
+        start = (w * n) // windows
+        end = ((w + 1) * n) // windows
+        used = 0
+        for i in range(start, end):
+            if used + segment_tokens[i] > per_window:
+                if used == 0:
+                    # 구간의 첫 조각 하나가 구간 예산보다 크면 버리지 않고 넣습니다. (plan_transcript에서 예산만큼 자름)
+                    selected.append(i)
+                break
+            selected.append(i)
+            used += segment_tokens[i]
+    return selected
+
+
+def plan_transcript(segments: Sequence[str], model: str, strategy: str = "map_reduce", budget: Optional[int] = None) -> dict:
+    """
+    자막 조각 목록을 모델의 토큰 예산에 맞춰 정리합니다.
+
+    Args:
+        segments: 시간 순서대로 정렬된 자막 조각 텍스트 목록
+        model: 요약에 사용할 모델 이름
+        strategy: 예산을 넘을 때의 처리 방식
+            - "map_reduce": 자막 전체를 유지하고 요약 단계에서 구간별 요약 후 합침
+            - "sample": 영상 전체에서 균등하게 구간을 골라 예산 안으로 줄임
+
+    Returns:
+        {"transcript": 요약에 넘길 텍스트, "token_budget": 토큰 계산 내역}
+
+    Raises:
+        ValueError: strategy가 위 두 가지가 아닐 때
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"알 수 없는 자막 예산 전략입니다: {strategy!r} (사용 가능: {', '.join(STRATEGIES)})")
+    budget = budget or transcript_token_budget(model)
+    segment_tokens = count_tokens_batch(segments, model)
+    total_tokens = sum(segment_tokens)
+    accounting = {
+        "model": model,
+        "tokenizer": tokenizer_name(model),
+        "budget_tokens": budget,
+        "total_tokens": total_tokens,
+        "total_segments": len(segments),
+    }
+
+    if total_tokens <= budget:
+        text = " ".join(segments)
+        accounting.update(strategy="single", kept_tokens=total_tokens, kept_segments=len(segments), coverage=1.0)
+        return {"transcript": text, "token_budget": accounting}
+
+    if strategy == "map_reduce":
+        text = " ".join(segments)
+        accounting.update(strategy="map_reduce", kept_tokens=total_tokens, kept_segments=len(segments), coverage=1.0)
+        return {"transcript": text, "token_budget": accounting}
+
+    # 구분자([...])가 차지할 토큰만큼 예산을 남겨 둡니다.
+    sample_budget = max(1, budget - SAMPLE_WINDOWS * 2)
+    per_window = max(1, sample_budget // max(1, min(SAMPLE_WINDOWS, len(segments))))
+    selected = sample_segments_evenly(segments, segment_tokens, sample_budget)
+    parts, previous, kept_tokens = [], None, 0
+    for i in selected:
+        if previous is not None and i != previous + 1:
+            parts.append(SAMPLE_GAP_MARKER)
+        if segment_tokens[i] > per_window:
+            parts.append(truncate_to_tokens(segments[i], per_window, model))
+            kept_tokens += per_window
+        else:
+            parts.append(segments[i])
+            kept_tokens += segment_tokens[i]
+        previous = i
+    accounting.update(
+        strategy="sample",
+        kept_tokens=kept_tokens,
+        kept_segments=len(selected),
+        coverage=round(kept_tokens / total_tokens, 3) if total_tokens else 1.0,
+    )
+    return {"transcript": " ".join(parts), "token_budget": accounting}
@@ -0,0 +1,244 @@
+# %%
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence
+
+from instrumentation import record_api_call, record_cache
+from single_flight import single_flight
+
+# %%
+# 캐시 설정 (환경 변수로 덮어쓸 수 있음)
+DEFAULT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join(".cache", "transcripts"))
+DEFAULT_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+DEFAULT_TTL_SECONDS = float(os.getenv("TRANSCRIPT_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+DEFAULT_LANGUAGES = ("ko", "en")
+
+
+# %%
+class TranscriptCache:
+    """
+    video_id와 언어 우선순위를 키로 하는 디스크 기반 자막 캐시입니다.
+
+    - 키(video_id + 언어 목록)의 SHA-256 해시를 파일 이름으로 사용합니다.
+    - 전체 용량이 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 삭제합니다(LRU).
+    - ttl_seconds가 지난 항목은 만료된 것으로 보고 다시 가져옵니다.
+    - hit/miss/eviction 횟수를 stats()로 확인할 수 있습니다.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> 파일 크기 (LRU 순서)
+        self._total_bytes = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.write_errors = 0
+
+    @staticmethod
+    def make_key(video_id: str, languages: Sequence[str]) -> str:
+        """video_id와 언어 우선순위로 캐시 키(해시)를 만듭니다."""
+        raw = json.dumps([video_id, list(languages)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """디스크에 남아 있는 캐시 파일을 마지막 사용 시각 순서로 인덱싱합니다."""
+        if self._loaded:
+            return
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(".json"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        self._loaded = True
+
+    def _remove(self, key: str):
+        size = self._index.pop(key, 0)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            oldest_key = next(iter(self._index))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def get(self, video_id: str, languages: Sequence[str] = DEFAULT_LANGUAGES) -> Optional[List[dict]]:
+        """캐시된 자막 목록을 반환합니다. 없거나 만료되었으면 None을 반환합니다."""
+        key = self.make_key(video_id, languages)
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            # LRU 갱신: 메모리 인덱스와 파일 mtime을 함께 갱신해 재시작 후에도 순서를 유지합니다.
+            self._index.move_to_end(key)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            self.hits += 1
+            return entry["transcript"]
+
+    def put(self, video_id: str, languages: Sequence[str], transcript: List[dict]):
+        """
+        자막 목록을 캐시에 저장하고, 용량을 넘으면 오래된 항목을 삭제합니다.
+        디스크 쓰기에 실패하면(디스크 가득 참, 읽기 전용 등) 경고만 남기고 넘어갑니다. (캐시는 없어도 되는 부가 기능)
+        """
+        key = self.make_key(video_id, languages)
+        entry = {
+            "video_id": video_id,
+            "languages": list(languages),
+            "created_at": time.time(),
+            "transcript": transcript,
+        }
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            tmp_path = None
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # 쓰기 도중 중단되어도 깨진 파일이 남지 않도록 임시 파일에 쓴 뒤 교체합니다.
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ 자막 캐시 저장 실패 ({video_id}): {e}")
+                self.write_errors += 1
+                if tmp_path is not None:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                return
+
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def get_or_fetch(
+        self,
+        video_id: str,
+        languages: Sequence[str],
+        fetcher: Callable[[str, Sequence[str]], List[dict]],
+    ) -> List[dict]:
+        """캐시에 있으면 바로 반환하고, 없으면 fetcher로 가져와 저장합니다."""
+        cached = self.get(video_id, languages)
+        if cached is not None:
+            print(f"⚡ 자막 캐시 적중: {video_id}")
+            record_cache("transcript", hits=1)
+            return cached
+        record_cache("transcript", misses=1)
+        transcript = fetcher(video_id, languages)
+        record_api_call("youtube.transcript", sum(len(item.get("text", "").encode("utf-8")) for item in transcript))
+        self.put(video_id, languages, transcript)
+        return transcript
+
+    def clear(self):
+        """캐시 파일을 모두 삭제합니다."""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """hit/miss 카운터와 현재 캐시 크기를 반환합니다."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "write_errors": self.write_errors,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+            }
+
+
+# %%
+transcript_cache = TranscriptCache()
+
+
+def _fetch_from_youtube(video_id: str, languages: Sequence[str]) -> List[dict]:
+    from youtube_transcript_api import YouTubeTranscriptApi
+    return YouTubeTranscriptApi.get_transcript(video_id, languages=list(languages))
+
+
+_transcript_fetcher: Optional[Callable[[str, Sequence[str]], List[dict]]] = None
+
+
+def set_transcript_fetcher(fetcher: Optional[Callable[[str, Sequence[str]], List[dict]]] = None):
+    """자막을 가져오는 함수를 바꿉니다. (벤치마크/테스트에서 가짜 백엔드를 쓰는 용도, None이면 기본값으로 복원)"""
+    global _transcript_fetcher
+    _transcript_fetcher = fetcher
+
+
+def fetch_transcript(video_id: str, languages: Sequence[str] = DEFAULT_LANGUAGES) -> List[dict]:
+    """
+    공용 자막 캐시를 거쳐 자막 목록을 가져옵니다.
+    YouTubeTranscriptApi.get_transcript와 같은 형식([{"text": ..., "start": ..., "duration": ...}])을 반환합니다.
+    같은 영상의 자막을 다른 요청이 이미 받고 있으면 새로 요청하지 않고 그 결과를 함께 씁니다.
+    """
+    languages = tuple(languages)
+    return single_flight.do("transcript", (video_id, languages), lambda: transcript_cache.get_or_fetch(
+        video_id, languages, _transcript_fetcher or _fetch_from_youtube
+    ))
+
+
+async def afetch_transcript(video_id: str, languages: Sequence[str] = DEFAULT_LANGUAGES) -> List[dict]:
+    """
+    fetch_transcript의 비동기 버전입니다.
+    youtube_transcript_api는 동기 라이브러리이므로 캐시 조회와 요청을 워커 스레드에서 실행해 이벤트 루프를 막지 않습니다.
+    """
+    return await asyncio.to_thread(fetch_transcript, video_id, languages)
@@ -0,0 +1,77 @@
+import time
+from typing import Optional
+
+import streamlit as st
+
+from json_stream import JsonStreamError, JsonStreamParser
+
+# 토큰마다 화면을 다시 그리면 느려지므로, 최소 이 간격(초)마다 한 번씩만 갱신합니다.
+RENDER_INTERVAL_SECONDS = 0.05
+
+
+class StreamingPlaceholder:
+    """
+    st.empty() 자리에 도착하는 토큰을 이어 붙여 보여 주고,
+    첫 토큰까지 걸린 시간(TTFT)과 전체 소요 시간을 표시합니다.
+    응답이 JSON이면 완성된 필드("요약", "운동 루틴"의 각 항목 등)부터 구조화된 형태로 그립니다.
+    """
+
+    def __init__(self, title: Optional[str] = None, started: Optional[float] = None,
+                 waiting_text: str = "⏳ 응답을 기다리는 중입니다..."):
+        if title:
+            st.markdown(title)
+        self.status = st.empty()
+        self.body = st.empty()
+        self.body.caption(waiting_text)
+        self.started = started if started is not None else time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.text = ""
+        self._parser: Optional[JsonStreamParser] = JsonStreamParser()
+        self._last_render = 0.0
+
+    def append(self, token: str):
+        now = time.perf_counter()
+        if self.ttft is None:
+            self.ttft = now - self.started
+            self.status.caption(f"⚡ 첫 토큰 {self.ttft:.2f}초")
+        self.text += token
+        self._feed(token)
+        if now - self._last_render >= RENDER_INTERVAL_SECONDS:
+            self._last_render = now
+            self._render()
+
+    def _feed(self, token: str):
+        if self._parser is None:
+            return
+        try:
+            self._parser.feed(token)
+        except JsonStreamError:
+            self._parser = None  # JSON이 아니면 받은 텍스트를 그대로 보여 줍니다.
+
+    def _render(self):
+        partial = self._parser.partial() if self._parser is not None else None
+        if partial:
+            self.body.json(partial)
+        else:
+            self.body.code(self.text, language="json")
+
+    def reset(self):
+        """같은 노드에서 새 메시지가 시작되면 앞의 내용을 지우고 다시 받습니다."""
+        self.text = ""
+        self._parser = JsonStreamParser()
+
+    def finish(self, value=None):
+        """스트리밍이 끝나면 최종 결과(dict면 JSON 뷰, 문자열이면 텍스트)로 바꿔 그립니다."""
+        total = time.perf_counter() - self.started
+        if self.ttft is not None:
+            self.status.caption(f"⚡ 첫 토큰 {self.ttft:.2f}초 · 전체 {total:.2f}초")
+        else:
+            self.status.caption(f"⚡ 전체 {total:.2f}초 (캐시된 결과 또는 스트리밍 없음)")
+
+        value = self.text if value is None else value
+        if not value:
+            self.body.warning("결과가 없습니다.")
+        elif isinstance(value, (dict, list)):
+            self.body.json(value)
+        else:
+            self.body.write(value)
@@ -1,33 +1,34 @@
 # %%
-from typing_extensions import TypedDict
-from langgraph.graph import StateGraph, START, END
-from langchain_openai import ChatOpenAI
+# 이 모듈은 Streamlit 워커가 뜰 때마다 import되므로, 무거운 것(LLM 클라이언트, 하위 에이전트, 그래프 컴파일)은
+# 처음 사용할 때 만듭니다. graph / graph_memory / memory / llm / router_chain은 모듈 속성으로 접근하면
+# 그때 한 번 만들어집니다. (아래 __getattr__ 참고)
+import os
+import threading
+import warnings
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
-from pydantic import BaseModel, Field
-from typing import Literal
-from typing import TypedDict, List, Optional, Dict
+from typing import Literal, TypedDict, List, Optional, Dict
+from reply_classifier import RouteDecisionMemo, DECLINE
+from comment_prefetch import PREFETCH_ENABLED
+from llm_factory import get_chat_model
+from resilience import acall_llm, call_llm
 
 # %%
 load_dotenv()
-llm = ChatOpenAI(model="gpt-4o-mini", streaming=True)
+# 라우터는 답변을 두 갈래로 나누는 짧은 분류(구조화 출력)라 작은 모델로 충분합니다.
+# (대부분은 reply_classifier 규칙/메모로 끝나고, 애매한 답변만 LLM까지 옴)
+ROUTER_MODEL = "gpt-4o-mini"
+END = "__end__"  # langgraph.graph.END와 같은 값 (langgraph import를 그래프를 만들 때까지 미룸)
 
 # %%
 class AgentState(TypedDict, total=False):
     url: str
     reply: Optional[str]
+    video_id: Optional[str]  # 같은 thread의 다음 턴에서 다시 추출하지 않도록 체크포인트에 남겨 둡니다.
+    comments: Optional[List[str]]  # 이미 받아 둔 댓글 (다음 턴의 댓글 요약에서 재사용)
     script_summary: Optional[Dict[str, str | List[str]]]
     comment_summary: Optional[str]
 
-graph_builder = StateGraph(AgentState)
-
 # %%
-# 라우터 설정 
-class Route(BaseModel):
-    target: Literal['summarize_script', 'summarize_comment'] = Field(
-        description="The target for the query to answer"
-    )
-
 # 라우터 프롬프트 설정 
 router_system_prompt = """
 You are an expert at routing a user's message given these variables:
@@ -43,73 +44,238 @@ Classify a user's input into one of two categories: 'summarize_script' or 'summa
 - If the user does not respond or responds **negatively** (e.g., "괜찮아", "글쎄", "아니"), **do not route anywhere**. This means the flow should end silently.
 """
 
-# 라우터 프롬프트 템플릿 설정
-router_prompt = ChatPromptTemplate.from_messages([
-    ("system", router_system_prompt),
-    ("user", "URL: {url}\n사용자 답변: {reply}")
-])
+def _build_router_chain():
+    from langchain_core.prompts import ChatPromptTemplate
+    from pydantic import BaseModel, Field
+
+    # 라우터 설정
+    class Route(BaseModel):
+        target: Literal['summarize_script', 'summarize_comment'] = Field(
+            description="The target for the query to answer"
+        )
 
-# 라우터 형식으로 구조화한 llm 설정
-structured_router_llm = llm.with_structured_output(Route)
+    # 라우터 프롬프트 템플릿 설정
+    router_prompt = ChatPromptTemplate.from_messages([
+        ("system", router_system_prompt),
+        ("user", "URL: {url}\n사용자 답변: {reply}")
+    ])
+
+    # 라우터 형식으로 구조화한 llm 설정
+    structured_router_llm = get_chat_model(ROUTER_MODEL, streaming=True).with_structured_output(Route)
+    return router_prompt | structured_router_llm
 
 # %%
-def router(state: AgentState) -> Literal['summarize_script', 'commentsummarize_comment_summary']:
+# 규칙 기반 분류기 + 최근 결정 메모 (애매한 답변만 LLM 라우터로 넘김)
+route_memo = RouteDecisionMemo()
+
+def router(state: AgentState) -> Literal['summarize_script', 'summarize_comment', '__end__']:
     """
-    주어진 state에서 쿼리를 기반으로 적절한 경로를 결정합니다
+    주어진 state에서 쿼리를 기반으로 적절한 경로를 결정합니다.
+    규칙(긍정/부정 사전)이나 최근 결정 메모로 판단할 수 있으면 LLM을 호출하지 않습니다.
 
     Args:
         state (AgentState): 에이전트의 현재 상태를 나타내는 딕셔너리
 
     Returns:
-        AgentState: Literal['summarize_script', 'summarize_comment']: 쿼리에 따라 선택된 경로를 반환합니다.
+        Literal['summarize_script', 'summarize_comment', '__end__']: 쿼리에 따라 선택된 경로를 반환합니다.
+        부정 응답이면 END를 반환해 조용히 종료합니다.
     """
 
     url = state.get('url', '')
     reply = state.get('reply', '')
-    
-    router_chain = router_prompt | structured_router_llm
-    route = router_chain.invoke({"url": url, "reply": reply})
 
-    return route.target
+    decision = route_memo.lookup(url, reply)
+    if decision is None:
+        route = call_llm(ROUTER_MODEL, lambda: _lazy("router_chain").invoke({"url": url, "reply": reply}), name="router")
+        decision = route.target
+        route_memo.remember(url, reply, decision)
+    return _route_target(decision, state)
+
+async def arouter(state: AgentState) -> Literal['summarize_script', 'summarize_comment', '__end__']:
+    """router의 비동기 버전입니다. 애매한 답변일 때만 router_chain.ainvoke를 호출합니다."""
+    url = state.get('url', '')
+    reply = state.get('reply', '')
+
+    decision = route_memo.lookup(url, reply)
+    if decision is None:
+        route = await acall_llm(ROUTER_MODEL, lambda: _lazy("router_chain").ainvoke({"url": url, "reply": reply}), name="router")
+        decision = route.target
+        route_memo.remember(url, reply, decision)
+    return _route_target(decision, state)
+
+def _route_target(decision: str, state: AgentState) -> str:
+    if decision == DECLINE:
+        print("🙅 댓글 요약을 원하지 않는 답변입니다. 종료합니다.")
+        # 이 세션은 미리 받던 댓글이 필요 없습니다. (같은 영상을 기다리는 다른 세션이 없을 때만 멈추고 버림)
+        if state.get('video_id'):
+            from comment_agent_05 import cancel_comment_prefetch
+            cancel_comment_prefetch(state['video_id'])
+        return END
+    return decision
+
+def router_stats() -> dict:
+    """규칙/메모로 건너뛴 LLM 라우터 호출 수를 반환합니다."""
+    return route_memo.stats()
 
 # %%
-from script_agent_05 import graph as script_agent
-from comment_agent_05 import graph as comment_agent
+def prepare_turn(state: AgentState) -> dict:
+    """
+    턴마다 가장 먼저 실행됩니다.
+    체크포인트에 남아 있는 영상과 같은 URL이면 영상 ID와 받아 둔 댓글을 그대로 두고,
+    다른 영상이면 이전 영상의 결과를 비워서 섞이지 않게 합니다.
+    URL만 들어온 턴(스크립트 요약)에는 사용자가 댓글 요약을 요청할 것에 대비해 댓글을 미리 받기 시작합니다.
+    """
+    from script_agent_05 import extract_video_id
+    from comment_agent_05 import cancel_comment_prefetch, start_comment_prefetch
+
+    video_id = extract_video_id(state.get('url') or '')
+    same_video = bool(video_id) and video_id == state.get('video_id')
+    if PREFETCH_ENABLED and state.get('video_id') and not same_video:
+        # 다른 영상으로 넘어갔으므로 이전 영상의 미리 받기에서 이 세션을 뺍니다. (다른 세션이 기다리면 계속 진행)
+        cancel_comment_prefetch(state['video_id'])
+    if PREFETCH_ENABLED and video_id and not state.get('reply') and not (same_video and state.get('comments')):
+        start_comment_prefetch(state['url'], video_id)
+    if same_video:
+        return {}
+    return {'video_id': video_id, 'comments': None, 'script_summary': None, 'comment_summary': None}
 
 # %%
-graph_builder.add_node('summarize_script', script_agent)
-graph_builder.add_node('summarize_comment', comment_agent)
+def _build_graph_builder():
+    from langgraph.graph import StateGraph, START
+    from instrumentation import instrument_node
+    from script_agent_05 import graph as script_agent
+    from comment_agent_05 import graph as comment_agent
+
+    graph_builder = StateGraph(AgentState)
+
+    # 하위 그래프 노드는 감싸지 않습니다. (안쪽 노드가 각각 계측되고, stream_summary의 subgraphs 스트리밍이 유지되도록)
+    graph_builder.add_node('prepare_turn', instrument_node("youtube_agent", "prepare_turn", prepare_turn))
+    graph_builder.add_node('summarize_script', script_agent)
+    graph_builder.add_node('summarize_comment', comment_agent)
+
+    graph_builder.add_edge(START, 'prepare_turn')
+    graph_builder.add_conditional_edges(
+        'prepare_turn',
+        instrument_node("youtube_agent", "router", router, arouter),
+        {   # 리턴값 :  노드이름 
+            'summarize_script': 'summarize_script',
+            'summarize_comment': 'summarize_comment',
+            END: END,
+        }
+    )
+
+    graph_builder.add_edge('summarize_script', END)
+    graph_builder.add_edge('summarize_comment', END)
+    return graph_builder
 
 # %%
-graph_builder.add_conditional_edges(
-    START,
-    router,
-    {   # 리턴값 :  노드이름 
-        'summarize_script': 'summarize_script',
-        'summarize_comment': 'summarize_comment',
-    }
-)
-
-graph_builder.add_edge('summarize_script', END)
-graph_builder.add_edge('summarize_comment', END)
+# 체크포인터 선택: "sqlite"(기본, 재시작 후에도 유지 + 오래된 thread/체크포인트 자동 정리) 또는 "memory"(프로세스 메모리)
+CHECKPOINTER = os.getenv("CHECKPOINTER", "sqlite")
+
+def make_checkpointer(kind: str = CHECKPOINTER):
+    if kind == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+    if kind == "sqlite":
+        from sqlite_checkpointer import BoundedSqliteSaver
+        return BoundedSqliteSaver()
+    raise ValueError(f"알 수 없는 체크포인터: {kind} (사용 가능: sqlite, memory)")
 
 # %%
-graph = graph_builder.compile()
-graph
+# 처음 접근할 때 만드는 모듈 속성들 (import만 해서는 아무것도 만들지 않음)
+_LAZY_ATTRIBUTES = {
+    "llm": lambda: get_chat_model(ROUTER_MODEL, streaming=True),
+    "router_chain": _build_router_chain,
+    "graph_builder": _build_graph_builder,
+    "graph": lambda: _lazy("graph_builder").compile(),
+    "memory": make_checkpointer,
+    "graph_memory": lambda: _lazy("graph_builder").compile(checkpointer=_lazy("memory")),
+}
+_lazy_lock = threading.RLock()
+
+def _lazy(name: str):
+    value = globals().get(name)
+    if value is None:
+        with _lazy_lock:  # 여러 스레드가 동시에 접근해도 한 번만 만듭니다.
+            value = globals().get(name)
+            if value is None:
+                value = globals()[name] = _LAZY_ATTRIBUTES[name]()
+    return value
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _lazy(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # %%
-from langgraph.checkpoint.memory import MemorySaver
+# graph_memory로 여러 턴을 이어갈 때의 입력
+def video_turn(url: str) -> dict:
+    """새 URL 턴의 입력입니다. 이전 턴의 답변이 체크포인트에 남아 있으면 댓글 요약으로 라우팅되므로 비워 둡니다."""
+    return {"url": url, "reply": None}
 
-memory = MemorySaver()
+def reply_turn(reply: str, url: Optional[str] = None) -> dict:
+    """
+    답변 턴의 입력입니다. URL/영상 ID/받아 둔 댓글은 체크포인트에서 이어받으므로 답변만 넘깁니다.
+    thread에 아직 URL이 없을 때(스크립트 요약 없이 바로 댓글을 요청한 경우)만 url을 함께 넘기세요.
+    """
+    return {"reply": reply, "url": url} if url else {"reply": reply}
 
-graph_memory = graph_builder.compile(checkpointer=memory)
+def resume_turn(graph, config: dict, update: dict):
+    """
+    같은 thread의 체크포인트에서 이어서 실행합니다. (graph_memory처럼 체크포인터가 있는 그래프에 사용)
+    스크립트 요약은 다시 실행하지 않고 댓글 분기만 실행합니다.
+    """
+    if not graph.get_state(config).values:
+        raise ValueError("이어갈 대화가 없습니다. 먼저 URL로 스크립트 요약을 실행하세요.")
+    return graph.invoke(update, config=config)
 
+def continue_with_memory(graph, initial_state: Optional[dict], config: dict, update: dict):
+    """
+    이전 턴의 상태에 update를 더해 이어서 실행합니다.
+    체크포인터가 있는 그래프에서 thread에 체크포인트가 있으면 resume_turn과 같이 체크포인트에서 이어가며,
+    이때 initial_state는 쓰지 않습니다. 체크포인터가 없거나 thread가 비어 있으면 {**initial_state, **update}로 실행합니다.
+    """
+    if graph.checkpointer and graph.get_state(config).values:
+        if initial_state:
+            warnings.warn(
+                "체크포인트에서 이어가므로 initial_state는 무시됩니다. resume_turn(graph, config, update)를 쓰세요.",
+                stacklevel=2,
+            )
+        return resume_turn(graph, config, update)
+    return graph.invoke({**(initial_state or {}), **update}, config=config)
 
 # %%
-def continue_with_memory(graph, initial_state, config: dict, update: dict):
-    previous_state = initial_state
-    new_state = {**previous_state, **update}
-    return graph.invoke(new_state, config=config)
+# 토큰 스트리밍: 하위 그래프(스크립트/댓글)의 요약 노드에서 나오는 LLM 토큰만 골라 순서대로 내보냅니다.
+SUMMARY_NODES = {"summarize_transcript", "summarize_comments"}
+
+def stream_summary(graph, state: dict, config: Optional[dict] = None):
+    """
+    graph.stream(stream_mode="messages", subgraphs=True)로 요약 토큰을 도착하는 대로 내보냅니다.
+
+    Yields:
+        ("token", 텍스트 조각) - 요약 노드의 LLM 토큰 (map-reduce의 구간별 요약(map_step) 토큰은 제외)
+        ("reset", None)       - 새 응답이 시작됨 (깨진 JSON을 감지해 다시 생성하는 경우, 앞의 토큰은 버림)
+        ("final", 최종 상태)  - 실행이 끝난 뒤 마지막으로 한 번
+    """
+    final_state, message_id = {}, None
+    for namespace, mode, chunk in graph.stream(
+        state, config=config, stream_mode=["messages", "values"], subgraphs=True
+    ):
+        if mode == "values":
+            if not namespace:  # 최상위 그래프의 상태만 최종 결과로 사용
+                final_state = chunk
+            continue
+        message, metadata = chunk
+        if metadata.get("langgraph_node") not in SUMMARY_NODES or "map_step" in (metadata.get("tags") or []):
+            continue
+        if isinstance(message.content, str) and message.content:
+            if message.id != message_id:
+                if message_id is not None:
+                    yield "reset", None
+                message_id = message.id
+            yield "token", message.content
+    yield "final", final_state
 
 # %%
 # config = {"configurable": {"thread_id": "1"}}
@@ -118,12 +284,12 @@ def continue_with_memory(graph, initial_state, config: dict, update: dict):
 
 # # %%
 # initial_state = {'url': url}
-# step1_state = graph.invoke(initial_state, config=config)
+# step1_state = graph_memory.invoke(video_turn(url), config=config)
 # print("📄 스크립트 요약 결과:")
 # print(step1_state.get("script_summary", ""))
 
 # # %%
-# step2_state = continue_with_memory(graph, graph_memory, config, {"reply": "응", "url": step1_state.get("url")})
+# step2_state = resume_turn(graph_memory, config, reply_turn("응"))
 # print("\n💬 댓글 요약 결과:")
 # print(step2_state.get("comment_summary", ""))
 
@@ -0,0 +1,113 @@
+# %%
+import asyncio
+import os
+import threading
+import weakref
+from typing import Callable, Optional
+
+# %%
+HTTP_TIMEOUT_SECONDS = float(os.getenv("YOUTUBE_HTTP_TIMEOUT_SECONDS", "30"))
+ASYNC_CONNECTION_LIMIT = int(os.getenv("YOUTUBE_ASYNC_CONNECTION_LIMIT", "50"))
+
+
+# %%
+class YouTubeClientPool:
+    """
+    프로세스 전체에서 공유하는 YouTube Data API 클라이언트 풀입니다.
+
+    - 디스커버리 문서는 라이브러리에 포함된 정적 문서(static_discovery)를 사용해 네트워크 요청 없이 만듭니다.
+    - httplib2.Http와 클라이언트 객체는 스레드 안전하지 않으므로 스레드마다 하나씩 만들어 재사용합니다.
+    - 같은 스레드에서는 하나의 Http 객체를 계속 쓰므로 keep-alive 연결이 유지됩니다.
+    - factory를 지정하면 googleapiclient 대신 factory(api_key, api_endpoint)로 클라이언트를 만듭니다. (벤치마크/테스트용)
+    """
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.factory: Optional[Callable] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.reuses = 0
+
+    def get(self, api_key: Optional[str] = None, api_endpoint: Optional[str] = None):
+        """현재 스레드의 youtube v3 클라이언트를 반환합니다. 처음 호출될 때만 새로 만듭니다."""
+        api_key = api_key or os.getenv("YOUTUBE_API_KEY")
+        clients = getattr(self._local, "clients", None)
+        if clients is None:
+            clients = self._local.clients = {}
+
+        key = (api_key, api_endpoint, self.factory)
+        client = clients.get(key)
+        if client is not None:
+            with self._lock:
+                self.reuses += 1
+            return client
+
+        client = (self.factory or self._build)(api_key, api_endpoint)
+        clients[key] = client
+        with self._lock:
+            self.builds += 1
+        return client
+
+    def _build(self, api_key: Optional[str], api_endpoint: Optional[str]):
+        import googleapiclient.discovery
+        import httplib2
+
+        client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+        return googleapiclient.discovery.build(
+            "youtube",
+            "v3",
+            developerKey=api_key,
+            http=httplib2.Http(timeout=self.timeout),
+            static_discovery=True,
+            client_options=client_options,
+            cache_discovery=False,
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"builds": self.builds, "reuses": self.reuses}
+
+
+# %%
+youtube_pool = YouTubeClientPool()
+
+
+def get_youtube_client(api_key: Optional[str] = None, api_endpoint: Optional[str] = None):
+    """공용 풀에서 현재 스레드용 YouTube Data API 클라이언트를 가져옵니다."""
+    return youtube_pool.get(api_key, api_endpoint)
+
+
+def set_youtube_client_factory(factory: Optional[Callable] = None):
+    """
+    클라이언트를 만드는 함수를 바꿉니다. (벤치마크/테스트에서 가짜 YouTube 백엔드를 쓰는 용도, None이면 기본값으로 복원)
+    factory(api_key, api_endpoint)는 commentThreads().list(...).execute()를 지원하는 객체를 반환해야 합니다.
+    """
+    youtube_pool.factory = factory
+
+
+# %%
+# 비동기 경로용 aiohttp 세션 (이벤트 루프마다 하나씩 공유, keep-alive 연결 재사용)
+_async_sessions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+async def get_async_session():
+    """현재 이벤트 루프에서 공유하는 aiohttp.ClientSession을 반환합니다."""
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS),
+            connector=aiohttp.TCPConnector(limit=ASYNC_CONNECTION_LIMIT, keepalive_timeout=30),
+        )
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    """현재 이벤트 루프의 공유 세션을 닫습니다. (서버 종료 시 호출)"""
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()